@@ -0,0 +1,225 @@
+"""
+Local stand-in for the OpenWeather API, for load testing.
+
+Serves deterministic current weather, forecast and map tile responses with
+configurable latency, error rate and per-minute call limit, and counts every
+call so a load run can report upstream calls per request.
+
+    python -m benchmarks.fake_openweather [--port 8001] [--latency 80] [--jitter 20]
+        [--error-rate 0.01] [--rate-limit 600]
+
+Point the app at it with
+``OPENWEATHER_BASE_URL=http://127.0.0.1:8001/data/2.5`` and
+``OPENWEATHER_TILE_URL=http://127.0.0.1:8001/map``. Cities starting with
+``zz`` are reported as not found. ``GET /__stats`` returns the call counts
+and ``POST /__reset`` clears them.
+"""
+import argparse
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+# Transparent 1x1 PNG served for every map tile
+EMPTY_TILE = (
+    b'\x89PNG\r\n\x1a\n'
+    + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 6, 0, 0, 0))
+    + _png_chunk(b'IDAT', zlib.compress(b'\x00\x00\x00\x00\x00'))
+    + _png_chunk(b'IEND', b'')
+)
+
+CONDITIONS = [
+    ('clear sky', '01'),
+    ('few clouds', '02'),
+    ('broken clouds', '04'),
+    ('light rain', '10'),
+    ('snow', '13'),
+]
+
+class Stats:
+    """Thread-safe call counters and the per-minute call window."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.statuses = {}
+            self.window_start = time.time()
+            self.window_calls = 0
+
+    def record(self, endpoint, status):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    def take_call(self, limit):
+        """Count a call against the current minute; False once over ``limit``."""
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= 60:
+                self.window_start = now
+                self.window_calls = 0
+            self.window_calls += 1
+            return not limit or self.window_calls <= limit
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'calls': dict(self.calls),
+                'total': sum(self.calls.values()),
+                'statuses': dict(self.statuses),
+            }
+
+def _seed(*parts):
+    return int(hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:8], 16)
+
+def _place(query):
+    """Name and coordinates for a city query, or ``None`` if it is unknown."""
+    name = query.split(',')[0].strip()
+    if not name or name.lower().startswith('zz'):
+        return None
+    rng = random.Random(_seed(name.lower()))
+    return name.title(), round(rng.uniform(-60, 70), 4), round(rng.uniform(-180, 180), 4)
+
+def current_weather(name, lat, lon, now):
+    # Observations change every 10 minutes, like the real service
+    observed_at = int(now // 600 * 600)
+    rng = random.Random(_seed(name, lat, lon, observed_at))
+    description, icon = rng.choice(CONDITIONS)
+    temp = round(rng.uniform(-10, 35), 2)
+    return {
+        'coord': {'lon': lon, 'lat': lat},
+        'weather': [{'id': 800, 'main': description.title(), 'description': description, 'icon': f'{icon}d'}],
+        'main': {
+            'temp': temp, 'feels_like': round(temp - rng.uniform(0, 3), 2),
+            'temp_min': temp - 1, 'temp_max': temp + 1,
+            'pressure': rng.randint(990, 1030), 'humidity': rng.randint(20, 100),
+        },
+        'wind': {'speed': round(rng.uniform(0, 15), 2), 'deg': rng.randint(0, 359)},
+        'dt': observed_at,
+        'sys': {'country': 'XX'},
+        'timezone': 0,
+        'name': name,
+        'cod': 200,
+    }
+
+def forecast(name, lat, lon, now):
+    start = int(now // 10800 * 10800) + 10800
+    rng = random.Random(_seed(name, start))
+    items = []
+    for i in range(40):
+        description, icon = rng.choice(CONDITIONS)
+        temp = round(rng.uniform(-10, 35), 2)
+        item = {
+            'dt': start + i * 10800,
+            'main': {'temp': temp, 'temp_min': temp - 1, 'temp_max': temp + 1, 'humidity': rng.randint(20, 100)},
+            'weather': [{'description': description, 'icon': f'{icon}d'}],
+            'wind': {'speed': round(rng.uniform(0, 15), 2)},
+        }
+        if icon == '10':
+            item['rain'] = {'3h': round(rng.uniform(0, 5), 2)}
+        items.append(item)
+    return {
+        'cod': '200',
+        'cnt': len(items),
+        'list': items,
+        'city': {'name': name, 'coord': {'lat': lat, 'lon': lon}, 'country': 'XX', 'timezone': 0},
+    }
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    options = None
+    stats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='application/json'):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlsplit(self.path).path == '/__reset':
+            self.stats.reset()
+            return self.send_body(200, {'status': 'reset'})
+        self.send_body(404, {'cod': '404', 'message': 'Not found'})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/__stats':
+            return self.send_body(200, self.stats.snapshot())
+
+        endpoint = 'tile' if url.path.startswith('/map/') else url.path.rstrip('/').rsplit('/', 1)[-1]
+        options = self.options
+        time.sleep(max(0, random.gauss(options.latency, options.jitter)) / 1000)
+
+        if not self.stats.take_call(options.rate_limit):
+            self.stats.record(endpoint, 429)
+            return self.send_body(429, {'cod': 429, 'message': 'Your account is temporary blocked due to exceeding of requests limitation'})
+        if random.random() < options.error_rate:
+            status = random.choice([500, 502, 503])
+            self.stats.record(endpoint, status)
+            return self.send_body(status, {'cod': status, 'message': 'Internal error'})
+
+        if endpoint == 'tile':
+            self.stats.record(endpoint, 200)
+            return self.send_body(200, EMPTY_TILE, 'image/png')
+
+        query = parse_qs(url.query)
+        if 'lat' in query and 'lon' in query:
+            lat, lon = float(query['lat'][0]), float(query['lon'][0])
+            place = (f'Place {zlib.crc32(f"{lat:.2f},{lon:.2f}".encode()) % 1000}', lat, lon)
+        else:
+            place = _place(query.get('q', [''])[0])
+
+        if endpoint not in ('weather', 'forecast'):
+            self.stats.record(endpoint, 404)
+            return self.send_body(404, {'cod': '404', 'message': 'Not found'})
+        if place is None:
+            self.stats.record(endpoint, 404)
+            return self.send_body(404, {'cod': '404', 'message': 'city not found'})
+
+        self.stats.record(endpoint, 200)
+        build = current_weather if endpoint == 'weather' else forecast
+        self.send_body(200, build(*place, time.time()))
+
+def make_server(host='127.0.0.1', port=8001, latency=80.0, jitter=20.0, error_rate=0.0, rate_limit=0):
+    options = argparse.Namespace(latency=latency, jitter=jitter, error_rate=error_rate, rate_limit=rate_limit)
+    handler = type('FakeOpenWeatherHandler', (Handler,), {'options': options, 'stats': Stats()})
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=80, help='Mean response latency in ms')
+    parser.add_argument('--jitter', type=float, default=20, help='Latency standard deviation in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered with a 5xx')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Calls per minute before answering 429 (0: unlimited)')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate_limit)
+    print(f'Fake OpenWeather listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
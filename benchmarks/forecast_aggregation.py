@@ -0,0 +1,75 @@
+"""
+Micro-benchmark for forecast aggregation.
+
+Compares ``weather_app.forecast.aggregate_daily`` with the previous
+ForecastView grouping loop on a synthetic 40-entry forecast payload.
+
+    python -m benchmarks.forecast_aggregation [--number 20000]
+"""
+import argparse
+import os
+import random
+import timeit
+from datetime import datetime
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_project.settings')
+django.setup()
+
+from weather_app import utils  # noqa: E402
+from weather_app.forecast import aggregate_daily  # noqa: E402
+
+def make_payload(entries=40, start=1700000000, timezone=3600):
+    rng = random.Random(42)
+    items = []
+    for i in range(entries):
+        temp = rng.uniform(-5, 30)
+        item = {
+            'dt': start + i * 10800,
+            'main': {'temp': temp, 'temp_min': temp - 1, 'temp_max': temp + 1, 'humidity': rng.randint(30, 100)},
+            'weather': [rng.choice([
+                {'description': 'clear sky', 'icon': '01d'},
+                {'description': 'broken clouds', 'icon': '04n'},
+                {'description': 'light rain', 'icon': '10d'},
+            ])],
+            'wind': {'speed': rng.uniform(0, 15)},
+        }
+        if item['weather'][0]['icon'].startswith('10'):
+            item['rain'] = {'3h': rng.uniform(0, 5)}
+        items.append(item)
+    return {'cod': '200', 'city': {'timezone': timezone}, 'list': items}
+
+def legacy_group(forecast_data, units='imperial'):
+    """The grouping loop ForecastView used before aggregate_daily."""
+    daily_forecasts = {}
+    for item in forecast_data['list']:
+        date = datetime.fromtimestamp(item['dt']).strftime('%Y-%m-%d')
+        if date not in daily_forecasts:
+            daily_forecasts[date] = {
+                'date': datetime.fromtimestamp(item['dt']).strftime('%A, %B %d'),
+                'temp_min': float('inf'),
+                'temp_max': float('-inf'),
+                'icon': item['weather'][0]['icon'],
+                'description': item['weather'][0]['description'].capitalize(),
+                'humidity': item['main']['humidity'],
+                'wind_speed': item['wind']['speed']
+            }
+        daily_forecasts[date]['temp_min'] = min(daily_forecasts[date]['temp_min'],
+                                               float(utils.format_temperature(item['main']['temp_min'], units).split('°')[0]))
+        daily_forecasts[date]['temp_max'] = max(daily_forecasts[date]['temp_max'],
+                                               float(utils.format_temperature(item['main']['temp_max'], units).split('°')[0]))
+    return list(daily_forecasts.values())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='Iterations per implementation')
+    args = parser.parse_args()
+
+    payload = make_payload()
+    for name, func in [('legacy', legacy_group), ('aggregate_daily', aggregate_daily)]:
+        best = min(timeit.repeat(lambda: func(payload), number=args.number, repeat=5))
+        print(f'{name:>16}: {best / args.number * 1e6:8.2f} us per forecast')
+
+if __name__ == '__main__':
+    main()
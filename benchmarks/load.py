@@ -0,0 +1,219 @@
+"""
+Load driver for the weather pages.
+
+Sends concurrent requests to a running instance of the app and reports
+throughput, latency percentiles and upstream calls per request for each
+scenario. Results are saved as JSON under benchmarks/results/ so runs on
+different commits can be compared with ``--compare``.
+
+    python -m benchmarks.fake_openweather --port 8001 &
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8001/data/2.5 WEATHER_UPSTREAM_BUDGET=0 \\
+        gunicorn weather_project.wsgi --workers 4 &
+    python -m benchmarks.load [--url http://127.0.0.1:8000] [--concurrency 16]
+        [--requests 500] [--scenarios weather,forecast,location,favorites]
+        [--compare benchmarks/results/<earlier run>.json]
+
+Upstream calls are counted by the fake OpenWeather server (``--upstream``).
+With DEBUG=False the app redirects plain HTTP to HTTPS, so either put it
+behind a TLS proxy or benchmark with DEBUG=True.
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+SCENARIOS = ('weather', 'forecast', 'location', 'favorites')
+
+class Workload:
+    """Builds request URLs with a skewed city popularity, like real traffic."""
+
+    def __init__(self, cities, seed=1):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.cities = [f'Benchcity {i}' for i in range(cities)]
+        # Zipf-like weights: a few cities get most of the traffic
+        self.weights = [1 / (rank + 1) for rank in range(cities)]
+        self.coords = [(round(self.rng.uniform(-60, 70), 2), round(self.rng.uniform(-180, 180), 2))
+                       for _ in range(cities)]
+
+    def city(self):
+        with self.lock:
+            return self.rng.choices(self.cities, self.weights)[0]
+
+    def coord(self):
+        with self.lock:
+            return self.rng.choices(self.coords, self.weights)[0]
+
+    def path(self, scenario):
+        if scenario == 'weather':
+            return '/weather/', {'city': self.city()}
+        if scenario == 'forecast':
+            return '/forecast/', {'city': self.city()}
+        if scenario == 'location':
+            lat, lon = self.coord()
+            return '/get-location-weather/', {'lat': lat, 'lon': lon}
+        return '/', {}
+
+def log_in(base_url, favorites, workload):
+    """Register a fresh user with ``favorites`` favorite cities; return its cookies."""
+    session = requests.Session()
+    suffix = f'{int(time.time())}{random.randrange(1000)}'
+    email, password = f'bench{suffix}@example.com', 'benchpass123'
+
+    session.get(f'{base_url}/register/')
+    session.post(f'{base_url}/register/', data={
+        'csrfmiddlewaretoken': session.cookies.get('csrftoken'),
+        'email': email, 'username': f'bench{suffix}',
+        'password': password, 'confirm_password': password,
+    })
+    session.get(f'{base_url}/login/')
+    response = session.post(f'{base_url}/login/', data={
+        'csrfmiddlewaretoken': session.cookies.get('csrftoken'),
+        'username': email, 'password': password,
+    }, allow_redirects=False)
+    if response.status_code != 302:
+        raise SystemExit(f'Could not log in the benchmark user (HTTP {response.status_code})')
+
+    for city in workload.cities[:favorites]:
+        session.post(f'{base_url}/toggle-favorite/', json={'city': city})
+    return session.cookies.get_dict()
+
+def upstream_calls(upstream_url):
+    try:
+        return requests.get(f'{upstream_url}/__stats', timeout=5).json()['total']
+    except (requests.RequestException, ValueError, KeyError):
+        return None
+
+def run_scenario(scenario, args, workload, cookies):
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            if scenario == 'favorites':
+                local.session.cookies.update(cookies)
+        return local.session
+
+    def one_request(_):
+        path, params = workload.path(scenario)
+        started = time.perf_counter()
+        try:
+            response = session().get(f'{args.url}{path}', params=params, timeout=args.timeout)
+            status = response.status_code
+        except requests.RequestException:
+            status = 'error'
+        return time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one_request, range(args.warmup)))
+
+        calls_before = upstream_calls(args.upstream)
+        started = time.perf_counter()
+        results = list(executor.map(one_request, range(args.requests)))
+        elapsed = time.perf_counter() - started
+        calls_after = upstream_calls(args.upstream)
+
+    latencies = sorted(latency for latency, _ in results)
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    calls = None if calls_before is None or calls_after is None else calls_after - calls_before
+    return {
+        'requests': len(results),
+        'statuses': statuses,
+        'errors': sum(count for status, count in statuses.items() if not status.startswith(('2', '3'))),
+        'throughput': len(results) / elapsed,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'p50_ms': cuts[49] * 1000,
+        'p95_ms': cuts[94] * 1000,
+        'p99_ms': cuts[98] * 1000,
+        'upstream_calls_per_request': None if calls is None else calls / len(results),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def print_report(results, baseline=None):
+    columns = ('throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'upstream_calls_per_request')
+    print(f"{'scenario':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'upstream/req':>13} {'errors':>7}")
+    for scenario, result in results['scenarios'].items():
+        cells = []
+        for column in columns:
+            value = result[column]
+            cells.append('n/a' if value is None else f'{value:.2f}')
+        print(f'{scenario:<10} ' + ' '.join(f'{cell:>9}' for cell in cells[:4])
+              + f' {cells[4]:>13} {result["errors"]:>7}')
+
+        previous = (baseline or {}).get('scenarios', {}).get(scenario)
+        if previous:
+            deltas = []
+            for column in columns:
+                old, new = previous.get(column), result[column]
+                if old and new is not None:
+                    deltas.append(f'{(new - old) / old * 100:+.1f}%')
+                else:
+                    deltas.append('')
+            print(f"{'  vs ' + baseline['commit']:<10} " + ' '.join(f'{cell:>9}' for cell in deltas[:4])
+                  + f' {deltas[4]:>13}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the app under test')
+    parser.add_argument('--upstream', default='http://127.0.0.1:8001', help='Base URL of the fake OpenWeather server')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+    parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once')
+    parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests before each scenario')
+    parser.add_argument('--cities', type=int, default=50, help='Distinct cities in the workload')
+    parser.add_argument('--favorites', type=int, default=8, help='Favorite cities of the logged-in user')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--compare', type=Path, help='Earlier results file to compare against')
+    parser.add_argument('--no-save', action='store_true', help='Do not write a results file')
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+    args.upstream = args.upstream.rstrip('/')
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workload = Workload(args.cities)
+    cookies = log_in(args.url, args.favorites, workload) if 'favorites' in scenarios else {}
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {key: value for key, value in vars(args).items() if key not in ('compare', 'no_save')},
+        'scenarios': {},
+    }
+    for scenario in scenarios:
+        results['scenarios'][scenario] = run_scenario(scenario, args, workload, cookies)
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_report(results, baseline)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        path = RESULTS_DIR / f'{stamp}-{results["commit"]}.json'
+        path.write_text(json.dumps(results, indent=2))
+        print(f'Saved {path}')
+
+if __name__ == '__main__':
+    main()
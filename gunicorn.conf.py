@@ -0,0 +1,49 @@
+"""
+Gunicorn settings, loaded automatically from the working directory.
+
+The application is imported and warmed up once in the arbiter, then every
+worker is forked from it, so a new instance serves its first request without
+each worker importing Django on its own. Migrations and collectstatic run in
+the Procfile's release step, not on every boot.
+
+Each worker is a separate process, so Prometheus metrics are kept in files
+under PROMETHEUS_MULTIPROC_DIR and merged by the /metrics view.
+"""
+
+import os
+import shutil
+import tempfile
+
+preload_app = True
+# A fixed default rather than one per core: containers often report the host's
+# cores, and every worker holds its own connections and caches. Exported so
+# the settings split per-worker limits over the same count.
+os.environ.setdefault('WEB_CONCURRENCY', '3')
+workers = int(os.environ['WEB_CONCURRENCY'])
+# Stated explicitly since upstream calls are cut off below it
+# (WEATHER_UPSTREAM_DEADLINE) rather than the worker being killed mid-request
+timeout = 30
+
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'weather-prometheus'))
+
+def on_starting(server):
+    # Files left by a previous run would be merged into the new counts
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from weather_app.warmup import warm_up
+        warm_up()
+
+def post_worker_init(worker):
+    # Without preloading, each worker loads and warms up its own copy
+    if not worker.cfg.preload_app:
+        from weather_app.warmup import warm_up
+        warm_up()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
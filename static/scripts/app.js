@@ -7,25 +7,22 @@ document.addEventListener('DOMContentLoaded', function() {
         clearTimeout(timeoutId);
         const query = this.value;
 
-        if (query.length < 3) return;
+        if (query.length < 2) return;
 
         timeoutId = setTimeout(() => {
-            fetch(`https://api.openweathermap.org/geo/1.0/direct?q=${query}&limit=5&appid=${API_KEY}`)
+            fetch(`/api/cities/?q=${encodeURIComponent(query)}&limit=5`)
                 .then(response => response.json())
                 .then(data => {
                     cityDatalist.innerHTML = '';
-                    data.forEach(city => {
+                    data.results.forEach(city => {
                         const option = document.createElement('option');
-                        const cityText = city.state ? 
-                            `${city.name}, ${city.state}, ${city.country}` : 
-                            `${city.name}, ${city.country}`;
-                        option.value = city.name;
-                        option.textContent = cityText;
+                        option.value = `${city.name}, ${city.country}`;
+                        option.textContent = `${city.name}, ${city.country}`;
                         cityDatalist.appendChild(option);
                     });
                 })
                 .catch(error => console.error('Error fetching cities:', error));
-        }, 300);
+        }, 150);
     });
 
     // Location button functionality
@@ -104,6 +101,3 @@ function getCookie(name) {
     }
     return cookieValue;
 }
-
-// Set API key from Django template
-const API_KEY = document.currentScript.getAttribute('data-api-key');
@@ -1,4 +1,4 @@
-function initMap(apiKey, containerId, center = [0, 20], zoom = 2) {
+function initMap(containerId, center = [0, 20], zoom = 2) {
     // Convert center coordinates to OpenLayers format
     const mapCenter = ol.proj.fromLonLat(center);
 
@@ -12,7 +12,7 @@ function initMap(apiKey, containerId, center = [0, 20], zoom = 2) {
     // Create weather layers
     const cloudsLayer = new ol.layer.Tile({
         source: new ol.source.XYZ({
-            url: `https://tile.openweathermap.org/map/clouds_new/{z}/{x}/{y}.png?appid=${apiKey}`,
+            url: '/tiles/clouds/{z}/{x}/{y}.png',
             crossOrigin: 'anonymous'
         }),
         opacity: 0.6,
@@ -22,7 +22,7 @@ function initMap(apiKey, containerId, center = [0, 20], zoom = 2) {
 
     const precipitationLayer = new ol.layer.Tile({
         source: new ol.source.XYZ({
-            url: `https://tile.openweathermap.org/map/precipitation_new/{z}/{x}/{y}.png?appid=${apiKey}`,
+            url: '/tiles/precipitation/{z}/{x}/{y}.png',
             crossOrigin: 'anonymous'
         }),
         opacity: 0.6,
@@ -32,7 +32,7 @@ function initMap(apiKey, containerId, center = [0, 20], zoom = 2) {
 
     const temperatureLayer = new ol.layer.Tile({
         source: new ol.source.XYZ({
-            url: `https://tile.openweathermap.org/map/temp_new/{z}/{x}/{y}.png?appid=${apiKey}`,
+            url: '/tiles/temp/{z}/{x}/{y}.png',
             crossOrigin: 'anonymous'
         }),
         opacity: 0.4,
@@ -42,7 +42,7 @@ function initMap(apiKey, containerId, center = [0, 20], zoom = 2) {
 
     const windLayer = new ol.layer.Tile({
         source: new ol.source.XYZ({
-            url: `https://tile.openweathermap.org/map/wind_new/{z}/{x}/{y}.png?appid=${apiKey}`,
+            url: '/tiles/wind/{z}/{x}/{y}.png',
             crossOrigin: 'anonymous'
         }),
         opacity: 0.5,
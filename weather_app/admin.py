@@ -1,13 +1,19 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from django.db.models import Count
+from .models import City, Favorite, User, normalize_city_name
+
+class FavoriteInline(admin.TabularInline):
+    model = Favorite
+    extra = 0
+    autocomplete_fields = ('city',)
+    readonly_fields = ('created_at',)
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'is_staff', 'is_active')
     list_filter = ('is_staff', 'is_active')
     fieldsets = (
         (None, {'fields': ('email', 'username', 'password')}),
-        ('Favorites', {'fields': ('favorite_cities',)}),
         ('Permissions', {'fields': ('is_staff', 'is_active', 'is_superuser', 'groups', 'user_permissions')}),
     )
     add_fieldsets = (
@@ -18,5 +24,23 @@ class CustomUserAdmin(UserAdmin):
     )
     search_fields = ('email', 'username')
     ordering = ('email',)
+    inlines = (FavoriteInline,)
+
+class CityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'favorite_count', 'created_at')
+    search_fields = ('name', 'normalized_name')
+    readonly_fields = ('normalized_name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(favorite_count=Count('favorites'))
+
+    @admin.display(ordering='favorite_count')
+    def favorite_count(self, obj):
+        return obj.favorite_count
+
+    def save_model(self, request, obj, form, change):
+        obj.normalized_name = normalize_city_name(obj.name)
+        super().save_model(request, obj, form, change)
 
 admin.site.register(User, CustomUserAdmin)
+admin.site.register(City, CityAdmin)
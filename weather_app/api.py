@@ -0,0 +1,278 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.generic import View
+from . import caching, forecast, history, utils
+from .models import City, ObservationRollup, normalize_city_name
+from .views import VALID_UNITS, get_units
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Fields a current weather result can be trimmed to with ``?fields=``
+CURRENT_FIELDS = (
+    'city', 'country', 'lat', 'lon', 'observed_at', 'temp', 'feels_like',
+    'humidity', 'wind_speed', 'description', 'icon',
+)
+
+# Longest range served per history resolution, in days
+HISTORY_MAX_DAYS = {ObservationRollup.HOUR: 31, ObservationRollup.DAY: 3660}
+# Rollups are rewritten by a periodic job, so history can be reused for a while
+HISTORY_MAX_AGE = 300
+
+UNIT_LABELS = {
+    'imperial': {'temperature': '°F', 'wind_speed': 'mph', 'precipitation': 'in'},
+    'metric': {'temperature': '°C', 'wind_speed': 'm/s', 'precipitation': 'mm'},
+}
+
+def get_api_units(request):
+    """Units from ``?units=``, falling back to the visitor's preference."""
+    units = request.GET.get('units')
+    return units if units in VALID_UNITS else get_units(request)
+
+def parse_fields(request):
+    """Return the requested subset of ``CURRENT_FIELDS``, or raise ValueError."""
+    raw = request.GET.get('fields', '')
+    if not raw:
+        return CURRENT_FIELDS
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in CURRENT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def serialize_current(weather_data, units, fields=CURRENT_FIELDS):
+    """Compact JSON form of a current weather payload, in the requested units."""
+    values = {
+        'city': weather_data['name'],
+        'country': weather_data.get('sys', {}).get('country'),
+        'lat': weather_data['coord']['lat'],
+        'lon': weather_data['coord']['lon'],
+        'observed_at': weather_data['dt'],
+        'temp': round(utils.convert_temperature(weather_data['main']['temp'], units), 1),
+        'feels_like': round(utils.convert_temperature(weather_data['main']['feels_like'], units), 1),
+        'humidity': weather_data['main']['humidity'],
+        'wind_speed': round(utils.convert_wind_speed(weather_data['wind']['speed'], units), 1),
+        'description': weather_data['weather'][0]['description'],
+        'icon': weather_data['weather'][0]['icon'],
+    }
+    result = {field: values[field] for field in fields}
+    # Present only when upstream is down and a saved observation is returned
+    if 'last_updated' in weather_data:
+        result['last_updated'] = weather_data['last_updated']
+    return result
+
+def serialize_forecast(forecast_data, units):
+    """Daily summaries of a forecast payload, in the requested units."""
+    result = {
+        'city': forecast_data['city']['name'],
+        'country': forecast_data['city'].get('country'),
+        'lat': forecast_data['city']['coord']['lat'],
+        'lon': forecast_data['city']['coord']['lon'],
+        'days': [
+            {
+                'date': day['date'].isoformat(),
+                'temp_min': round(utils.convert_temperature(day['temp_min'], units), 1),
+                'temp_max': round(utils.convert_temperature(day['temp_max'], units), 1),
+                'temp_mean': round(utils.convert_temperature(day['temp_mean'], units), 1),
+                'humidity': day['humidity'],
+                'precipitation': round(utils.convert_precipitation(day['precipitation'], units), 2),
+                'wind_max': round(utils.convert_wind_speed(day['wind_max'], units), 1),
+                'description': day['description'],
+                'icon': day['icon'],
+            }
+            for day in forecast.aggregate_daily(forecast_data)
+        ],
+    }
+    if 'last_updated' in forecast_data:
+        result['last_updated'] = forecast_data['last_updated']
+    return result
+
+def parse_time(value):
+    """Parse an ISO date or datetime query value as an aware UTC datetime, or raise ValueError."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value}')
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+def serialize_rollup(rollup, units):
+    return {
+        'start': rollup['period_start'].isoformat(),
+        'temp_min': round(utils.convert_temperature(rollup['temp_min'], units), 1),
+        'temp_max': round(utils.convert_temperature(rollup['temp_max'], units), 1),
+        'temp_mean': round(utils.convert_temperature(rollup['temp_mean'], units), 1),
+        'humidity': round(rollup['humidity_mean']),
+        'wind_max': round(utils.convert_wind_speed(rollup['wind_max'], units), 1),
+        'samples': rollup['samples'],
+    }
+
+def upstream_error(data):
+    """JSON error response mirroring an upstream error payload."""
+    if utils.is_rate_limited(data):
+        response = JsonResponse({'error': data.get('message')}, status=503)
+        response['Retry-After'] = str(data.get('retry_after', 60))
+        return response
+    status = 404 if str(data.get('cod')) == '404' else 502
+    return JsonResponse({'error': data.get('message', 'Weather data unavailable')}, status=status)
+
+def json_response(payload, units, max_age):
+    response = JsonResponse({**payload, 'units': UNIT_LABELS[units]})
+    patch_cache_control(response, public=True, max_age=max_age)
+    # Units default to the preference cookie when not given explicitly
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+class CurrentWeatherAPIView(View):
+    """Current weather for ``?city=``."""
+
+    def get(self, request):
+        city = utils.sanitize_city_name(request.GET.get('city', '').strip())
+        if not city:
+            return JsonResponse({'error': 'City name is required'}, status=400)
+        try:
+            fields = parse_fields(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        units = get_api_units(request)
+        weather_data = utils.get_current_weather(city)
+        if weather_data.get('cod') != 200:
+            return upstream_error(weather_data)
+        return json_response(serialize_current(weather_data, units, fields), units,
+                             utils.expires_in('current', city))
+
+class LocationWeatherAPIView(View):
+    """Current weather for ``?lat=&lon=``."""
+
+    def get(self, request):
+        try:
+            lat = float(request.GET['lat'])
+            lon = float(request.GET['lon'])
+        except (KeyError, ValueError):
+            return JsonResponse({'error': 'Valid lat and lon are required'}, status=400)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return JsonResponse({'error': 'Coordinates out of range'}, status=400)
+        try:
+            fields = parse_fields(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        units = get_api_units(request)
+        weather_data = utils.get_location_weather(lat, lon)
+        if weather_data.get('cod') != 200:
+            return upstream_error(weather_data)
+        return json_response(serialize_current(weather_data, units, fields), units,
+                             utils.expires_in('location', utils.location_cell(lat, lon)))
+
+class ForecastAPIView(View):
+    """Daily forecast summaries for ``?city=``."""
+
+    def get(self, request):
+        city = utils.sanitize_city_name(request.GET.get('city', '').strip())
+        if not city:
+            return JsonResponse({'error': 'City name is required'}, status=400)
+
+        units = get_api_units(request)
+        forecast_data = utils.get_forecast(city)
+        if forecast_data.get('cod') != "200":
+            return upstream_error(forecast_data)
+        return json_response(serialize_forecast(forecast_data, units), units,
+                             utils.expires_in('forecast', city))
+
+class BatchWeatherAPIView(View):
+    """
+    Current weather for several cities in one call.
+
+    Cities are passed as repeated ``?city=`` parameters, up to
+    ``WEATHER_API_BATCH_MAX`` distinct ones (ignoring case and spacing), and
+    are looked up concurrently. Each result is
+    either the selected fields or an ``error`` for that city alone.
+    """
+
+    def get(self, request):
+        cities = {}
+        for city in request.GET.getlist('city'):
+            city = utils.sanitize_city_name(city.strip())
+            # Spellings that share a cache entry are looked up and counted once
+            if city:
+                cities.setdefault(caching.normalize_query(city), city)
+        cities = list(cities.values())
+        if not cities:
+            return JsonResponse({'error': 'At least one city is required'}, status=400)
+        if len(cities) > settings.WEATHER_API_BATCH_MAX:
+            return JsonResponse(
+                {'error': f'At most {settings.WEATHER_API_BATCH_MAX} cities per request'}, status=400)
+        try:
+            fields = parse_fields(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        units = get_api_units(request)
+        weather_by_city = utils.get_current_weather_many(cities)
+        results = []
+        for city in cities:
+            weather_data = weather_by_city[city]
+            if weather_data.get('cod') == 200:
+                result = serialize_current(weather_data, units, fields)
+            else:
+                result = {'error': weather_data.get('message', 'Weather data unavailable')}
+            results.append({'query': city, **result})
+
+        # Errors are never cached, so only successful lookups bound freshness
+        found = [city for city in cities if weather_by_city[city].get('cod') == 200]
+        max_age = utils.expires_in_many('current', found) if found else 0
+        return json_response({'results': results}, units, max_age)
+
+class HistoryAPIView(View):
+    """
+    Hourly or daily observation history for ``?city=``.
+
+    The range is given by ``?from=`` and ``?to=`` as ISO dates or datetimes
+    and defaults to the last seven days. ``?resolution=`` is ``hour`` or
+    ``day``; by default ranges over a week are served by day. Only rollups
+    are read, so the newest observations appear after the next rollup pass
+    (see ``history.rollup_if_due``).
+    """
+
+    def get(self, request):
+        city = utils.sanitize_city_name(request.GET.get('city', '').strip())
+        if not city:
+            return JsonResponse({'error': 'City name is required'}, status=400)
+        try:
+            end = parse_time(request.GET['to']) if 'to' in request.GET else timezone.now()
+            start = parse_time(request.GET['from']) if 'from' in request.GET else end - timedelta(days=7)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if start >= end:
+            return JsonResponse({'error': 'from must be before to'}, status=400)
+
+        default_resolution = ObservationRollup.HOUR if end - start <= timedelta(days=7) else ObservationRollup.DAY
+        resolution = request.GET.get('resolution', default_resolution)
+        if resolution not in HISTORY_MAX_DAYS:
+            return JsonResponse({'error': 'resolution must be hour or day'}, status=400)
+        if end - start > timedelta(days=HISTORY_MAX_DAYS[resolution]):
+            return JsonResponse(
+                {'error': f'At most {HISTORY_MAX_DAYS[resolution]} days per {resolution} request'}, status=400)
+
+        # History is recorded under the city name alone, without a country code
+        record = City.objects.filter(normalized_name=normalize_city_name(city.split(',')[0])).first()
+        if record is None:
+            return JsonResponse({'error': 'No history for this city'}, status=404)
+
+        units = get_api_units(request)
+        return json_response({
+            'city': record.name,
+            'resolution': resolution,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'points': [serialize_rollup(rollup, units)
+                       for rollup in history.get_rollups(record, resolution, start, end)],
+        }, units, HISTORY_MAX_AGE)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class WeatherAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "weather_app"
+
+    def ready(self):
+        # Connect the signal handlers that invalidate cached users
+        from . import auth  # noqa: F401
+        # Register the deployment checks
+        from . import checks  # noqa: F401
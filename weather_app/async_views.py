@@ -0,0 +1,219 @@
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.generic import View
+from django.shortcuts import render
+from django.contrib import messages
+from asgiref.sync import sync_to_async
+from . import caching, utils
+from .views import (
+    get_units, get_base_context, build_favorite_weather,
+    build_weather_context, build_forecast_context,
+    page_etag, get_not_modified, patch_validators,
+    rate_limited_context, mark_rate_limited,
+)
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Messages, auth and template rendering are synchronous in Django, so they run
+# in a worker thread while upstream calls stay on the event loop.
+arender = sync_to_async(render)
+amessage_error = sync_to_async(messages.error)
+apage_etag = sync_to_async(page_etag)
+aget_not_modified = sync_to_async(get_not_modified)
+apatch_validators = sync_to_async(patch_validators)
+
+class AsyncBaseContextMixin:
+    """Async counterpart of ``views.BaseContextMixin``."""
+
+    async def aget_context_data(self, **kwargs):
+        context = dict(kwargs)
+        units = get_units(self.request)
+        context.update(get_base_context(units))
+
+        user = await self.request.auser()
+        if user.is_authenticated:
+            favorite_cities = await sync_to_async(lambda: user.favorite_cities)()
+            weather_by_city = await utils.aget_current_weather_many(favorite_cities)
+            context['favorite_weather'] = build_favorite_weather(weather_by_city, units)
+        return context
+
+class AsyncWeatherView(AsyncBaseContextMixin, View):
+    async def get(self, request):
+        city = request.GET.get('city', '').strip()
+        units = get_units(request)
+
+        if not city:
+            return await arender(request, 'index.html', await self.aget_context_data())
+
+        try:
+            # Clean city name
+            city = utils.sanitize_city_name(city)
+            weather_data = await utils.aget_current_weather(city)
+
+            if utils.is_rate_limited(weather_data):
+                context = await self.aget_context_data(**rate_limited_context(weather_data))
+                return mark_rate_limited(await arender(request, 'city-not-found.html', context), weather_data)
+
+            if weather_data.get('cod') != 200:
+                context = await self.aget_context_data(
+                    error=weather_data.get('message', 'City not found'),
+                    suggestions=await utils.aget_city_suggestions(city),
+                )
+                return await arender(request, 'city-not-found.html', context)
+
+            etag = await apage_etag(request, weather_data['name'], weather_data['dt'], units,
+                                    weather_data.get('last_updated'))
+            not_modified = await aget_not_modified(request, etag, weather_data['dt'])
+            if not_modified is None:
+                context = await self.aget_context_data()
+                # Format coordinates for JavaScript
+                lon = float(weather_data['coord']['lon'])
+                lat = float(weather_data['coord']['lat'])
+                context.update(build_weather_context(weather_data, units, lon, lat,
+                                                     caching.make_key('current', city)))
+                response = await arender(request, 'weather.html', context)
+            else:
+                response = not_modified
+            max_age = await utils.aexpires_in('current', city)
+            return await apatch_validators(response, request, etag, max_age, weather_data['dt'])
+        except Exception as e:
+            logger.error(f"Weather error: {str(e)}")
+            await amessage_error(request, 'Error getting weather data. Please try again.')
+            context = await self.aget_context_data(
+                error='Error getting weather data. Please try again.',
+                suggestions=await utils.aget_city_suggestions(city),
+            )
+            return await arender(request, 'city-not-found.html', context)
+
+class AsyncLocationWeatherView(AsyncBaseContextMixin, View):
+    async def get(self, request):
+        lat = request.GET.get('lat')
+        lon = request.GET.get('lon')
+        units = get_units(request)
+
+        if not lat or not lon:
+            await amessage_error(request, 'Location data is required')
+            return await arender(request, 'index.html', await self.aget_context_data())
+
+        try:
+            weather_data = await utils.aget_location_weather(lat, lon)
+
+            if utils.is_rate_limited(weather_data):
+                context = await self.aget_context_data(**rate_limited_context(weather_data))
+                return mark_rate_limited(await arender(request, 'city-not-found.html', context), weather_data)
+
+            if weather_data.get('cod') != 200:
+                await amessage_error(request, 'Could not get weather for your location')
+                return await arender(request, 'city-not-found.html',
+                                     await self.aget_context_data(error='Could not get weather for your location'))
+
+            etag = await apage_etag(request, weather_data['name'], weather_data['dt'], units,
+                                    weather_data.get('last_updated'))
+            not_modified = await aget_not_modified(request, etag, weather_data['dt'])
+            if not_modified is None:
+                context = await self.aget_context_data()
+                context.update(build_weather_context(
+                    weather_data, units, float(lon), float(lat),
+                    caching.make_key('location', utils.location_cell(lat, lon))))
+                response = await arender(request, 'weather.html', context)
+            else:
+                response = not_modified
+            max_age = await utils.aexpires_in('location', utils.location_cell(lat, lon))
+            return await apatch_validators(response, request, etag, max_age, weather_data['dt'])
+        except Exception as e:
+            logger.error(f"Location weather error: {str(e)}")
+            await amessage_error(request, 'Error getting weather data. Please try again.')
+            return await arender(request, 'city-not-found.html',
+                                 await self.aget_context_data(error='Error getting weather data. Please try again.'))
+
+class AsyncForecastView(AsyncBaseContextMixin, View):
+    async def get(self, request):
+        city = request.GET.get('city', '').strip()
+        units = get_units(request)
+
+        if not city:
+            await amessage_error(request, 'Please enter a city name')
+            return await arender(request, 'index.html', await self.aget_context_data())
+
+        try:
+            # Clean city name
+            city = utils.sanitize_city_name(city)
+            forecast_data = await utils.aget_forecast(city)
+
+            if utils.is_rate_limited(forecast_data):
+                context = await self.aget_context_data(**rate_limited_context(forecast_data))
+                return mark_rate_limited(await arender(request, 'city-not-found.html', context), forecast_data)
+
+            if forecast_data.get('cod') != "200":
+                context = await self.aget_context_data(
+                    error=forecast_data.get('message', 'City not found'),
+                    suggestions=await utils.aget_city_suggestions(city),
+                )
+                return await arender(request, 'city-not-found.html', context)
+
+            etag = await apage_etag(request, forecast_data['city']['name'], forecast_data['list'][0]['dt'], units,
+                                    forecast_data.get('last_updated'))
+            not_modified = await aget_not_modified(request, etag)
+            if not_modified is None:
+                context = await self.aget_context_data()
+                context.update(build_forecast_context(forecast_data, units))
+                response = await arender(request, 'forecast.html', context)
+            else:
+                response = not_modified
+            max_age = await utils.aexpires_in('forecast', city)
+            return await apatch_validators(response, request, etag, max_age)
+        except Exception as e:
+            logger.error(f"Forecast error: {str(e)}")
+            await amessage_error(request, 'Error getting forecast data. Please try again.')
+            context = await self.aget_context_data(
+                error='Error getting forecast data. Please try again.',
+                suggestions=await utils.aget_city_suggestions(city),
+            )
+            return await arender(request, 'city-not-found.html', context)
+
+async def favorite_updates(cities, units):
+    """
+    Yield server-sent events for favorite cities whose cached weather changed.
+
+    Only the shared cache is read, never upstream; the favorites refresher
+    and page views keep it current. Every city is sent once on connect, then
+    again only when its observation time moves. The stream ends after
+    ``WEATHER_STREAM_DURATION`` and the browser reconnects by itself.
+    """
+    poll = settings.WEATHER_STREAM_POLL
+    deadline = time.monotonic() + settings.WEATHER_STREAM_DURATION
+    sent = {}
+    yield f'retry: {poll * 1000}\n\n'
+    while True:
+        weather_by_city = await utils.apeek_current_weather_many(cities)
+        for entry in build_favorite_weather(weather_by_city, units):
+            if sent.get(entry['city']) != entry['observed_at']:
+                sent[entry['city']] = entry['observed_at']
+                yield f'event: update\ndata: {json.dumps(entry)}\n\n'
+        if time.monotonic() >= deadline:
+            return
+        # Comment line so proxies do not close an idle connection
+        yield ': keep-alive\n\n'
+        await asyncio.sleep(poll)
+
+class FavoritesStreamView(View):
+    """Server-sent events with fresh weather for the user's favorite cities."""
+
+    async def get(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+
+        cities = await sync_to_async(lambda: user.favorite_cities)()
+        response = StreamingHttpResponse(
+            favorite_updates(cities, get_units(request)),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Ask nginx-style proxies not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
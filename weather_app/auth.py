@@ -1,24 +1,102 @@
+import time
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .caching import get_cache, is_shared
+
+def _user_key(user_id):
+    return f'weather:user:{user_id}'
+
+def _version_key(user_id):
+    return f'weather:user:{user_id}:version'
+
+def _new_version():
+    # Start from the clock so a version evicted from the cache can never
+    # come back as a value an old cached user was stored under
+    return time.time_ns()
+
+def invalidate_cached_user(user_id):
+    """Bump the user's cache version so any cached copy is ignored."""
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), _new_version(), None)
+
+def _get_user(user_id):
+    UserModel = get_user_model()
+    try:
+        return UserModel.objects.get(pk=user_id)
+    except UserModel.DoesNotExist:
+        return None
+
+def load_user(user_id):
+    """
+    Return the user with ``user_id``, or ``None``, from the shared cache.
+
+    The user and its cache version are read in one round trip. Saving or
+    deleting a user bumps the version, so a copy cached before the change,
+    including one written by a request that raced the save, is never served.
+    Only a cache shared by every worker sees those bumps, so with a
+    per-process cache, or ``WEATHER_USER_CACHE_TTL`` at 0, the user is read
+    from the database on every request.
+    """
+    if not settings.WEATHER_USER_CACHE_TTL or not is_shared():
+        return _get_user(user_id)
+
+    cache = get_cache()
+    user_key, version_key = _user_key(user_id), _version_key(user_id)
+    cached = cache.get_many([user_key, version_key])
+
+    version = cached.get(version_key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(version_key, version, None):
+            version = cache.get(version_key, version)
+
+    entry = cached.get(user_key)
+    if entry is not None and entry['version'] == version:
+        return entry['user']
+
+    user = _get_user(user_id)
+    if user is None:
+        return None
+    # Favorites are queried per request and must not be frozen in the cache
+    user.__dict__.pop('favorite_cities', None)
+    cache.set(user_key, {'version': version, 'user': user}, settings.WEATHER_USER_CACHE_TTL)
+    return user
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def _invalidate_on_change(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
 
 class EmailBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None or password is None:
+            return None
         UserModel = get_user_model()
-        try:
-            # Try to fetch the user by email first, then username
-            user = UserModel.objects.get(
-                Q(email=username) | Q(username=username)
-            )
-            if user.check_password(password):
-                return user
-        except UserModel.DoesNotExist:
+        username = username.strip()
+
+        # Emails are stored lowercased, so both lookups hit a unique index
+        user = None
+        if '@' in username:
+            user = UserModel.objects.filter(email=username.lower()).first()
+        if user is None:
+            user = UserModel.objects.filter(username=username).first()
+
+        if user is None:
+            # Hash anyway so response time does not reveal unknown accounts
+            UserModel().set_password(password)
             return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
         return None
 
     def get_user(self, user_id):
-        UserModel = get_user_model()
-        try:
-            return UserModel.objects.get(pk=user_id)
-        except UserModel.DoesNotExist:
-            return None
+        user = load_user(user_id)
+        # Deactivated users are logged out on their next request
+        return user if user is not None and self.user_can_authenticate(user) else None
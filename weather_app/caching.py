@@ -0,0 +1,387 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from . import metrics, ratelimit, snapshots
+
+logger = logging.getLogger(__name__)
+
+# How often a worker waiting on another worker's fetch re-checks the cache
+LOCK_POLL_INTERVAL = 0.05
+
+# Keys currently being refreshed by a background thread in this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# In-flight upstream fetches in this process, keyed by cache key
+_flights = {}
+_flights_lock = threading.Lock()
+
+# Backends whose entries are only visible to the process that wrote them
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+def get_cache():
+    """Return the cache backend used for upstream weather data."""
+    return caches[settings.WEATHER_CACHE_ALIAS]
+
+def is_shared():
+    """Return True if every worker process sees the same weather cache, e.g. Redis."""
+    return settings.CACHES[settings.WEATHER_CACHE_ALIAS]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+def normalize_query(value):
+    """Normalize a query part so equivalent lookups share a cache entry."""
+    return ' '.join(str(value).lower().split())
+
+def make_key(kind, *parts):
+    """Build a cache key for an upstream lookup from its normalized parts."""
+    raw = ':'.join(normalize_query(part) for part in parts)
+    # Hash the query so keys stay short and safe for every cache backend
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'weather:{kind}:{digest}'
+
+def _kind(key):
+    # 'weather:current:<digest>' -> 'current'
+    return key.split(':', 2)[1]
+
+def is_success(data):
+    """Return True for upstream payloads worth caching."""
+    return isinstance(data, dict) and str(data.get('cod')) == '200'
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+class Borrowed(dict):
+    """
+    A payload a fetcher copied from another cache entry instead of upstream.
+
+    It keeps that entry's ``fetched_at``, so the copy is stored as being just
+    as old and expires with it instead of living a full TTL longer.
+    """
+
+    def __init__(self, data, fetched_at):
+        super().__init__(data)
+        self.fetched_at = fetched_at
+
+def _new_entry(data, ttl):
+    """Return the cache entry for a fetched payload and the timeout to store it with."""
+    if isinstance(data, Borrowed):
+        fetched_at, data = data.fetched_at, dict(data)
+    else:
+        fetched_at = time.time()
+    timeout = ttl + settings.WEATHER_STALE_TTL - (time.time() - fetched_at)
+    return {'data': data, 'fetched_at': fetched_at}, max(1, int(timeout))
+
+def _snapshot_time(data):
+    return data.fetched_at if isinstance(data, Borrowed) else None
+
+def _store(key, fetcher, ttl):
+    data = fetcher()
+    if is_success(data):
+        entry, timeout = _new_entry(data, ttl)
+        get_cache().set(key, entry, timeout)
+        snapshots.save(key, entry['data'], _snapshot_time(data))
+        return entry['data']
+    return data
+
+def _wait_for_entry(key):
+    """Poll the cache until ``key`` is written or its lock is released."""
+    cache = get_cache()
+    deadline = time.monotonic() + settings.WEATHER_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        # The lock holder finished without caching anything (e.g. a 404)
+        if cache.get(_lock_key(key)) is None:
+            return None
+    return None
+
+def _store_locked(key, fetcher, ttl):
+    """
+    Fetch and store ``key`` while holding a short lock in the weather cache.
+
+    If another worker already holds the lock, wait for the entry it writes
+    instead of calling upstream as well. Fall back to fetching directly if
+    that worker caches nothing or takes longer than ``WEATHER_LOCK_TIMEOUT``.
+    The lock only reaches other workers when the cache is shared (see
+    ``is_shared``); with a per-process cache it coordinates this process's
+    threads and event loops only, and ``checks`` warns about it.
+    """
+    cache = get_cache()
+    lock_key = _lock_key(key)
+    if cache.add(lock_key, 1, settings.WEATHER_LOCK_TIMEOUT):
+        try:
+            return _store(key, fetcher, ttl)
+        finally:
+            cache.delete(lock_key)
+
+    entry = _wait_for_entry(key)
+    if entry is not None:
+        return entry['data']
+    return _store(key, fetcher, ttl)
+
+def _single_flight(key, fetcher, ttl):
+    """Let one thread per process fetch ``key`` while the others wait for it."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = {'done': threading.Event(), 'data': None}
+
+    if not leader:
+        flight['done'].wait(settings.WEATHER_LOCK_TIMEOUT)
+        if flight['data'] is not None:
+            return flight['data']
+        return _store(key, fetcher, ttl)
+
+    try:
+        flight['data'] = _store_locked(key, fetcher, ttl)
+        return flight['data']
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight['done'].set()
+
+def _refresh_in_background(key, fetcher, ttl):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        cache = get_cache()
+        lock_key = _lock_key(key)
+        try:
+            # Another worker is already refreshing this entry
+            if not cache.add(lock_key, 1, settings.WEATHER_LOCK_TIMEOUT):
+                return
+            try:
+                # The stale entry is still being served, so nobody is waiting
+                with ratelimit.priority(ratelimit.BACKGROUND):
+                    _store(key, fetcher, ttl)
+            finally:
+                cache.delete(lock_key)
+        except Exception as err:
+            logger.error(f'Background refresh failed for {key}: {err}')
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+            # Saving the snapshot opened a database connection for this thread
+            connections.close_all()
+
+    threading.Thread(target=run, name=f'refresh-{key}', daemon=True).start()
+
+def cached_fetch(key, fetcher, ttl):
+    """
+    Return the cached payload for ``key``, calling ``fetcher`` on a miss.
+
+    Entries younger than ``ttl`` are served as-is. Entries that are stale by
+    less than ``WEATHER_STALE_TTL`` are served immediately while a background
+    thread refreshes them. Error payloads are never cached. Concurrent misses
+    for the same key share a single upstream call, both within the process
+    and across workers sharing the cache. If upstream is unavailable, the
+    last good payload saved in the database is returned instead, marked with
+    ``last_updated``.
+    """
+    entry = get_cache().get(key)
+    if entry is not None:
+        age = time.time() - entry['fetched_at']
+        if age >= ttl:
+            metrics.record_cache_lookup(_kind(key), 'stale')
+            _refresh_in_background(key, fetcher, ttl)
+        else:
+            metrics.record_cache_lookup(_kind(key), 'hit')
+        return entry['data']
+    metrics.record_cache_lookup(_kind(key), 'miss')
+    data = _single_flight(key, fetcher, ttl)
+    if snapshots.is_outage(data):
+        return snapshots.fallback(key, data)
+    return data
+
+def refresh(key, fetcher, ttl):
+    """
+    Fetch ``key`` and overwrite its cache entry regardless of its age.
+
+    Used to keep entries warm ahead of expiry. Returns ``None`` without
+    calling upstream if another worker is already fetching the same key.
+    """
+    cache = get_cache()
+    lock_key = _lock_key(key)
+    if not cache.add(lock_key, 1, settings.WEATHER_LOCK_TIMEOUT):
+        return None
+    try:
+        return _store(key, fetcher, ttl)
+    finally:
+        cache.delete(lock_key)
+
+def expires_in(key, ttl):
+    """Return whole seconds until the entry for ``key`` is due for a refresh."""
+    entry = get_cache().get(key)
+    if entry is None:
+        return 0
+    return max(0, int(ttl - (time.time() - entry['fetched_at'])))
+
+def expires_in_many(keys, ttl):
+    """Return the time left on the soonest-due entry among ``keys``."""
+    entries = get_cache().get_many(keys)
+    if len(entries) < len(keys):
+        return 0
+    oldest = min(entry['fetched_at'] for entry in entries.values())
+    return max(0, int(ttl - (time.time() - oldest)))
+
+async def aexpires_in(key, ttl):
+    """Async version of ``expires_in``."""
+    entry = await get_cache().aget(key)
+    if entry is None:
+        return 0
+    return max(0, int(ttl - (time.time() - entry['fetched_at'])))
+
+def _fresh(entries, ttl):
+    now = time.time()
+    return {key: Borrowed(entry['data'], entry['fetched_at'])
+            for key, entry in entries.items() if now - entry['fetched_at'] < ttl}
+
+def peek_many(keys):
+    """Return ``{key: payload}`` for the keys already cached, without fetching."""
+    return {key: entry['data'] for key, entry in get_cache().get_many(keys).items()}
+
+def peek_fresh(keys, ttl):
+    """
+    Return ``{key: payload}`` for the keys cached within ``ttl``, without fetching.
+
+    Payloads are ``Borrowed``, so a fetcher that returns one has it cached with
+    its original fetch time.
+    """
+    return _fresh(get_cache().get_many(keys), ttl)
+
+async def apeek_fresh(keys, ttl):
+    """Async version of ``peek_fresh``."""
+    return _fresh(await get_cache().aget_many(keys), ttl)
+
+async def apeek_many(keys):
+    """Return ``{key: payload}`` for the keys already cached, without fetching."""
+    entries = await get_cache().aget_many(keys)
+    return {key: entry['data'] for key, entry in entries.items()}
+
+async def _astore(key, fetcher, ttl):
+    data = await fetcher()
+    if is_success(data):
+        entry, timeout = _new_entry(data, ttl)
+        await get_cache().aset(key, entry, timeout)
+        await snapshots.asave(key, entry['data'], _snapshot_time(data))
+        return entry['data']
+    return data
+
+async def _await_for_entry(key):
+    """Async version of ``_wait_for_entry``."""
+    cache = get_cache()
+    deadline = time.monotonic() + settings.WEATHER_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry
+        if await cache.aget(_lock_key(key)) is None:
+            return None
+    return None
+
+async def _astore_locked(key, fetcher, ttl):
+    """Async version of ``_store_locked``."""
+    cache = get_cache()
+    lock_key = _lock_key(key)
+    if await cache.aadd(lock_key, 1, settings.WEATHER_LOCK_TIMEOUT):
+        try:
+            return await _astore(key, fetcher, ttl)
+        finally:
+            await cache.adelete(lock_key)
+
+    entry = await _await_for_entry(key)
+    if entry is not None:
+        return entry['data']
+    return await _astore(key, fetcher, ttl)
+
+# In-flight async fetches, keyed by (event loop, cache key)
+_aflights = {}
+
+async def _asingle_flight(key, fetcher, ttl):
+    """Async version of ``_single_flight`` for tasks on the same event loop."""
+    flight_key = (asyncio.get_running_loop(), key)
+    flight = _aflights.get(flight_key)
+    if flight is not None:
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight), settings.WEATHER_LOCK_TIMEOUT)
+        except (Exception, asyncio.CancelledError):
+            # The leading task failed, was cancelled or is taking too long
+            return await _astore(key, fetcher, ttl)
+
+    flight = _aflights[flight_key] = asyncio.get_running_loop().create_future()
+    try:
+        data = await _astore_locked(key, fetcher, ttl)
+        flight.set_result(data)
+        return data
+    except Exception as err:
+        flight.set_exception(err)
+        # Nobody may be waiting on the future; mark the exception as retrieved
+        flight.exception()
+        raise
+    except asyncio.CancelledError:
+        flight.cancel()
+        raise
+    finally:
+        _aflights.pop(flight_key, None)
+
+# Strong references to running refresh tasks so they are not garbage collected
+_refresh_tasks = set()
+
+def _arefresh_in_background(key, fetcher, ttl):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    async def run():
+        cache = get_cache()
+        lock_key = _lock_key(key)
+        try:
+            if not await cache.aadd(lock_key, 1, settings.WEATHER_LOCK_TIMEOUT):
+                return
+            try:
+                with ratelimit.priority(ratelimit.BACKGROUND):
+                    await _astore(key, fetcher, ttl)
+            finally:
+                await cache.adelete(lock_key)
+        except Exception as err:
+            logger.error(f'Background refresh failed for {key}: {err}')
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    task = asyncio.get_running_loop().create_task(run())
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+async def acached_fetch(key, fetcher, ttl):
+    """Async version of ``cached_fetch``; ``fetcher`` returns an awaitable."""
+    entry = await get_cache().aget(key)
+    if entry is not None:
+        age = time.time() - entry['fetched_at']
+        if age >= ttl:
+            metrics.record_cache_lookup(_kind(key), 'stale')
+            _arefresh_in_background(key, fetcher, ttl)
+        else:
+            metrics.record_cache_lookup(_kind(key), 'hit')
+        return entry['data']
+    metrics.record_cache_lookup(_kind(key), 'miss')
+    data = await _asingle_flight(key, fetcher, ttl)
+    if snapshots.is_outage(data):
+        return await snapshots.afallback(key, data)
+    return data
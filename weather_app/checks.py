@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from . import caching
+
+SHARED_CACHE_HINT = 'Set REDIS_URL so every worker process shares the cache.'
+
+@register(deploy=True)
+def check_upstream_budget(app_configs, **kwargs):
+    """The upstream call budget is only enforced across workers through a shared cache."""
+    if not settings.WEATHER_UPSTREAM_BUDGET or caching.is_shared():
+        return []
+    return [Warning(
+        'WEATHER_UPSTREAM_BUDGET is counted in a per-process cache.',
+        hint=(f'Each worker gets 1/{settings.WEATHER_WORKER_PROCESSES} of the budget from '
+              f'WEB_CONCURRENCY; if that does not match the real worker count, the '
+              f'OpenWeather quota can be exceeded. {SHARED_CACHE_HINT}'),
+        id='weather_app.W001',
+    )]
+
+@register(deploy=True)
+def check_fetch_lock(app_configs, **kwargs):
+    """Identical upstream fetches are only coalesced across workers through a shared cache."""
+    if caching.is_shared():
+        return []
+    return [Warning(
+        'Concurrent fetches of the same city are only coalesced within each worker.',
+        hint=('The weather cache is per-process, so every worker may call OpenWeather '
+              f'for the same city at once. {SHARED_CACHE_HINT}'),
+        id='weather_app.W002',
+    )]
+
+@register(deploy=True)
+def check_favorites_refresher(app_configs, **kwargs):
+    """The favorites refresher warms a cache the web workers must be able to read."""
+    if caching.is_shared():
+        return []
+    return [Warning(
+        'The refresh_favorites command cannot warm a per-process cache.',
+        hint=f'It exits without refreshing until the web workers share its cache. {SHARED_CACHE_HINT}',
+        id='weather_app.W003',
+    )]
@@ -0,0 +1,65 @@
+from collections import Counter
+from datetime import date
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def aggregate_daily(forecast_data):
+    """
+    Summarize a 5-day / 3-hour forecast payload per local calendar day.
+
+    Entries are bucketed by the city's local day using the payload's UTC
+    ``timezone`` offset, in a single pass over the list. Values stay in the
+    canonical units the payload was fetched in (°C, m/s, mm). Each day is a
+    dict with ``date``, ``temp_min``, ``temp_max``, ``temp_mean``,
+    ``precipitation``, ``wind_max``, ``humidity`` and the dominant
+    condition's ``description`` and ``icon``.
+    """
+    offset = forecast_data.get('city', {}).get('timezone', 0) or 0
+    days = {}
+    for item in forecast_data['list']:
+        day = (item['dt'] + offset) // SECONDS_PER_DAY
+        main = item['main']
+        weather = item['weather'][0]
+        precipitation = item.get('rain', {}).get('3h', 0) + item.get('snow', {}).get('3h', 0)
+
+        bucket = days.get(day)
+        if bucket is None:
+            days[day] = bucket = {
+                'temp_min': main['temp_min'],
+                'temp_max': main['temp_max'],
+                'temp_sum': 0.0,
+                'humidity_sum': 0,
+                'count': 0,
+                'precipitation': 0.0,
+                'wind_max': 0.0,
+                'conditions': Counter(),
+            }
+        elif main['temp_min'] < bucket['temp_min']:
+            bucket['temp_min'] = main['temp_min']
+        if main['temp_max'] > bucket['temp_max']:
+            bucket['temp_max'] = main['temp_max']
+        bucket['temp_sum'] += main['temp']
+        bucket['humidity_sum'] += main['humidity']
+        bucket['count'] += 1
+        bucket['precipitation'] += precipitation
+        if item['wind']['speed'] > bucket['wind_max']:
+            bucket['wind_max'] = item['wind']['speed']
+        # Day and night variants of an icon ('04d', '04n') are the same condition
+        bucket['conditions'][(weather['description'], weather['icon'][:2])] += 1
+
+    summaries = []
+    for day, bucket in days.items():
+        description, icon_code = bucket['conditions'].most_common(1)[0][0]
+        summaries.append({
+            'date': date.fromordinal(EPOCH_ORDINAL + day),
+            'temp_min': bucket['temp_min'],
+            'temp_max': bucket['temp_max'],
+            'temp_mean': bucket['temp_sum'] / bucket['count'],
+            'precipitation': bucket['precipitation'],
+            'wind_max': bucket['wind_max'],
+            'humidity': round(bucket['humidity_sum'] / bucket['count']),
+            'description': description,
+            'icon': f'{icon_code}d',
+        })
+    return summaries
@@ -0,0 +1,154 @@
+import bisect
+import difflib
+import heapq
+import threading
+import unicodedata
+from array import array
+from collections import Counter, namedtuple
+from pathlib import Path
+
+from django.conf import settings
+
+# Bundled city list: name, country code, latitude, longitude, population
+DEFAULT_PATH = Path(__file__).resolve().parent / 'data' / 'cities.tsv'
+
+# Candidates pulled from the trigram index before they are scored
+CANDIDATE_POOL = 50
+
+# Prefixes up to this length get a precomputed result list, since their
+# ranges in the sorted name list can cover a large part of the gazetteer
+SHORT_PREFIX = 3
+MAX_COMPLETIONS = 10
+
+City = namedtuple('City', ['name', 'country', 'lat', 'lon', 'population'])
+
+def fold(text):
+    """Lowercase ``text`` and strip accents so 'São Paulo' matches 'sao paulo'."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+def trigrams(text):
+    """Return the set of padded character trigrams for a folded string."""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def word_starts(text):
+    """Return ``text`` and every suffix of it that starts at a word boundary."""
+    words = text.split(' ')
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+def read_cities(path):
+    """Read a gazetteer TSV file into a list of ``City`` tuples."""
+    cities = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            name, country, lat, lon, population = line.rstrip('\n').split('\t')
+            cities.append(City(name, country, float(lat), float(lon), int(population)))
+    return cities
+
+def write_cities(path, cities):
+    """Write ``City`` tuples to a gazetteer TSV file, most populous first."""
+    cities = sorted(cities, key=lambda city: -city.population)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# name\tcountry\tlat\tlon\tpopulation\n')
+        for city in cities:
+            f.write(f'{city.name}\t{city.country}\t{city.lat:.4f}\t{city.lon:.4f}\t{city.population}\n')
+
+class Gazetteer:
+    """
+    In-memory city index supporting fuzzy lookups by name.
+
+    Names are folded and split into trigrams; each trigram maps to a compact
+    array of city ids. A lookup only scores the cities sharing the most
+    trigrams with the query, so its cost depends on the posting lists touched
+    rather than on the size of the gazetteer. Candidates are scored with
+    ``difflib`` similarity, which unlike trigram overlap tolerates swapped
+    letters ('Lodnon', 'Pairs').
+    """
+
+    def __init__(self, cities):
+        self.cities = cities
+        self.folded = [fold(city.name) for city in cities]
+        self._grams = [trigrams(name) for name in self.folded]
+        self.index = {}
+        for city_id, grams in enumerate(self._grams):
+            for gram in grams:
+                self.index.setdefault(gram, array('I')).append(city_id)
+        self._build_prefix_index()
+
+    def _build_prefix_index(self):
+        # Every word start is indexed, so 'york' completes to 'New York'
+        entries = sorted(
+            (key, city_id)
+            for city_id, name in enumerate(self.folded)
+            for key in word_starts(name)
+        )
+        self._prefix_keys = [key for key, _ in entries]
+        self._prefix_ids = array('I', (city_id for _, city_id in entries))
+
+        by_population = sorted(range(len(self.cities)), key=lambda city_id: -self.cities[city_id].population)
+        self._short_prefixes = {}
+        for city_id in by_population:
+            for key in word_starts(self.folded[city_id]):
+                for length in range(1, min(SHORT_PREFIX, len(key)) + 1):
+                    bucket = self._short_prefixes.setdefault(key[:length], [])
+                    if len(bucket) < MAX_COMPLETIONS and city_id not in bucket:
+                        bucket.append(city_id)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def search(self, query, limit=5, cutoff=0.6):
+        """Return up to ``limit`` cities whose names best match ``query``."""
+        folded = fold(query)
+        if not folded:
+            return []
+        query_grams = trigrams(folded)
+
+        hits = Counter()
+        for gram in query_grams:
+            postings = self.index.get(gram)
+            if postings is not None:
+                hits.update(postings)
+
+        scored = []
+        matcher = difflib.SequenceMatcher(b=folded)
+        for city_id, _ in hits.most_common(CANDIDATE_POOL):
+            matcher.set_seq1(self.folded[city_id])
+            score = matcher.ratio()
+            if score >= cutoff:
+                scored.append((score, self.cities[city_id].population, city_id))
+
+        best = heapq.nlargest(limit, scored)
+        return [self.cities[city_id] for _, _, city_id in best]
+
+    def complete(self, prefix, limit=MAX_COMPLETIONS):
+        """Return up to ``limit`` cities whose name or a word in it starts with ``prefix``."""
+        folded = fold(prefix)
+        if not folded:
+            return []
+        limit = min(limit, MAX_COMPLETIONS)
+        if len(folded) <= SHORT_PREFIX:
+            return [self.cities[city_id] for city_id in self._short_prefixes.get(folded, [])[:limit]]
+
+        start = bisect.bisect_left(self._prefix_keys, folded)
+        # Any key starting with the prefix sorts before prefix + U+FFFF
+        end = bisect.bisect_right(self._prefix_keys, folded + '\uffff', lo=start)
+        city_ids = set(self._prefix_ids[start:end])
+        best = heapq.nlargest(limit, city_ids, key=lambda city_id: self.cities[city_id].population)
+        return [self.cities[city_id] for city_id in best]
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer():
+    """Return the process-wide gazetteer, loading it on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer(read_cities(settings.WEATHER_GAZETTEER_PATH))
+    return _gazetteer
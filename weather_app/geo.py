@@ -0,0 +1,95 @@
+import math
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def grid_cell(lat, lon, size=None):
+    """Return the ``(row, column)`` of the grid cell containing a coordinate."""
+    size = size or settings.WEATHER_LOCATION_GRID
+    return math.floor(float(lat) / size), math.floor(float(lon) / size)
+
+def cell_center(cell, size=None):
+    """Return the ``(lat, lon)`` at the middle of a grid cell, rounded for upstream."""
+    size = size or settings.WEATHER_LOCATION_GRID
+    row, column = cell
+    return round((row + 0.5) * size, 4), round((column + 0.5) * size, 4)
+
+def cell_id(cell):
+    """Stable text form of a cell, used in cache keys."""
+    return f'{settings.WEATHER_LOCATION_GRID}:{cell[0]}:{cell[1]}'
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two coordinates."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class SpatialIndex:
+    """
+    In-memory map from grid cells to the cache keys of known city observations.
+
+    Lets a coordinate lookup reuse a cached observation of a city nearby
+    instead of calling upstream. Holds at most ``max_entries`` cities and
+    forgets the least recently seen first.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.cells = {}
+        # Cache key -> (lat, lon, cell), in least recently seen order
+        self.entries = OrderedDict()
+
+    def add(self, key, lat, lon):
+        cell = grid_cell(lat, lon)
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self._unlink(key, previous[2])
+            self.entries[key] = (lat, lon, cell)
+            self.cells.setdefault(cell, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                oldest, (_, _, oldest_cell) = self.entries.popitem(last=False)
+                self._unlink(oldest, oldest_cell)
+
+    def _unlink(self, key, cell):
+        keys = self.cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.cells[cell]
+
+    def nearest(self, lat, lon, max_km):
+        """Cache keys of cities within ``max_km`` of a coordinate, nearest first."""
+        size = settings.WEATHER_LOCATION_GRID
+        row, column = grid_cell(lat, lon)
+        # Cells to search on each side; cells narrow towards the poles
+        rows = math.ceil(max_km / (size * KM_PER_DEGREE))
+        columns = min(math.ceil(rows / max(math.cos(math.radians(lat)), 0.01)), 360)
+        found = []
+        with self.lock:
+            for r in range(row - rows, row + rows + 1):
+                for c in range(column - columns, column + columns + 1):
+                    for key in self.cells.get((r, c), ()):
+                        city_lat, city_lon, _ = self.entries[key]
+                        distance = distance_km(lat, lon, city_lat, city_lon)
+                        if distance <= max_km:
+                            found.append((distance, key))
+        return [key for _, key in sorted(found)]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Return the process-wide spatial index of known city observations."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SpatialIndex(settings.WEATHER_LOCATION_INDEX_SIZE)
+    return _index
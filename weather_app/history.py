@@ -0,0 +1,250 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from . import caching, snapshots
+from .models import City, Observation, ObservationRollup, normalize_city_name
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FIELDS = ('temp_min', 'temp_max', 'temp_mean', 'humidity_mean', 'wind_max', 'samples')
+
+# Held in the weather cache for WEATHER_HISTORY_ROLLUP_INTERVAL after a rollup pass
+ROLLUP_MARKER_KEY = 'weather:history:rollup'
+
+class ObservationBuffer:
+    """
+    Collects observations in memory and writes them to the database in batches.
+
+    Entries are keyed on city and observation time, so an observation seen
+    several times before a flush is written once. A batch is written on a
+    background thread once it holds ``WEATHER_HISTORY_BATCH_SIZE`` entries or
+    its oldest entry has waited ``WEATHER_HISTORY_FLUSH_INTERVAL`` seconds,
+    whether or not more observations arrive.
+
+    History is best-effort: the buffer is flushed at a clean exit, but a
+    worker that is killed (SIGKILL, a gunicorn worker timeout, an OOM kill)
+    loses whatever it holds, i.e. up to a batch or an interval's worth.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.started = None
+        self.flushing = False
+        self.timer = None
+
+    def add(self, name, observed_at, temp, humidity, wind_speed):
+        normalized = normalize_city_name(name)
+        with self.lock:
+            self.pending[normalized, observed_at] = (name, temp, humidity, wind_speed)
+            if self.started is None:
+                self.started = time.monotonic()
+            # Threads do not survive a fork, so each worker starts its own timer
+            if self.timer is None or not self.timer.is_alive():
+                self.timer = threading.Thread(target=self._flush_periodically,
+                                              name='history-timer', daemon=True)
+                self.timer.start()
+            batch = self._take_if_due()
+        if batch:
+            self._start_flush(batch)
+
+    def _take_if_due(self):
+        """Take the pending batch if it is full or old enough; call with the lock held."""
+        if self.flushing or self.started is None:
+            return None
+        due = (len(self.pending) >= settings.WEATHER_HISTORY_BATCH_SIZE
+               or time.monotonic() - self.started >= settings.WEATHER_HISTORY_FLUSH_INTERVAL)
+        if not due:
+            return None
+        self.flushing = True
+        return self._take()
+
+    def _start_flush(self, batch):
+        threading.Thread(target=self._flush_in_background, args=(batch,),
+                         name='history-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        """Flush batches that came due while no new observations arrived."""
+        interval = settings.WEATHER_HISTORY_FLUSH_INTERVAL
+        while True:
+            with self.lock:
+                waited = 0 if self.started is None else time.monotonic() - self.started
+            time.sleep(max(1, interval - waited))
+            with self.lock:
+                batch = self._take_if_due()
+            if batch:
+                self._start_flush(batch)
+
+    def _take(self):
+        batch, self.pending, self.started = self.pending, {}, None
+        return batch
+
+    def _flush_in_background(self, batch):
+        try:
+            write_batch(batch)
+        except Exception as err:
+            logger.error(f'Could not write {len(batch)} observations: {err}')
+        try:
+            rollup_if_due()
+        except Exception as err:
+            logger.error(f'Could not roll up observation history: {err}')
+        finally:
+            with self.lock:
+                self.flushing = False
+            connections.close_all()
+
+    def flush(self):
+        """Write everything buffered so far on the calling thread."""
+        with self.lock:
+            batch = self._take()
+        if batch:
+            write_batch(batch)
+
+def write_batch(batch):
+    """Insert ``{(normalized name, dt): (name, temp, humidity, wind)}`` entries."""
+    names = {normalized: ' '.join(values[0].split()) for (normalized, _), values in batch.items()}
+    city_ids = dict(City.objects.filter(normalized_name__in=names)
+                    .values_list('normalized_name', 'pk'))
+    missing = [normalized for normalized in names if normalized not in city_ids]
+    if missing:
+        City.objects.bulk_create(
+            [City(name=names[normalized], normalized_name=normalized) for normalized in missing],
+            ignore_conflicts=True,
+        )
+        city_ids.update(City.objects.filter(normalized_name__in=missing)
+                        .values_list('normalized_name', 'pk'))
+
+    # An observation already written by another worker is skipped
+    Observation.objects.bulk_create([
+        Observation(
+            city_id=city_ids[normalized],
+            observed_at=datetime.fromtimestamp(observed_at, tz=dt_timezone.utc),
+            temp=temp, humidity=humidity, wind_speed=wind_speed,
+        )
+        for (normalized, observed_at), (_, temp, humidity, wind_speed) in batch.items()
+    ], ignore_conflicts=True)
+
+_buffer = ObservationBuffer()
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        _buffer.flush()
+    except DatabaseError as err:
+        logger.error(f'Could not write buffered observations at exit: {err}')
+
+def record(data):
+    """Queue a current weather payload fresh from upstream for the history table."""
+    # Saved snapshots served during an outage were recorded when first fetched
+    if not settings.WEATHER_HISTORY_ENABLED or data.get('cod') != 200 or 'last_updated' in data:
+        return
+    try:
+        _buffer.add(data['name'], data['dt'], data['main']['temp'],
+                    data['main']['humidity'], data['wind']['speed'])
+    except (KeyError, TypeError) as err:
+        logger.warning(f'Skipping observation without expected fields: {err}')
+
+def _resume_from(period, overlap):
+    """
+    Where a rollup pass of ``period`` should start, or ``None`` for the beginning.
+
+    The newest rollup may be partial and observations can arrive late, so the
+    pass recomputes everything from ``overlap`` before it.
+    """
+    latest = (ObservationRollup.objects.filter(period=period)
+              .aggregate(latest=Max('period_start'))['latest'])
+    return None if latest is None else latest - overlap
+
+def rollup_hours():
+    """Aggregate raw observations into hourly rollups; returns rows written."""
+    observations = Observation.objects.all()
+    since = _resume_from(ObservationRollup.HOUR, timedelta(hours=2))
+    if since is not None:
+        observations = observations.filter(observed_at__gte=since)
+    rows = (observations
+            .annotate(bucket=Trunc('observed_at', 'hour', tzinfo=dt_timezone.utc))
+            .values('city_id', 'bucket')
+            .annotate(temp_min=Min('temp'), temp_max=Max('temp'), temp_mean=Avg('temp'),
+                      humidity_mean=Avg('humidity'), wind_max=Max('wind_speed'),
+                      samples=Count('id')))
+    return _upsert(ObservationRollup.HOUR, rows)
+
+def rollup_days():
+    """Aggregate hourly rollups into daily rollups; returns rows written."""
+    hours = ObservationRollup.objects.filter(period=ObservationRollup.HOUR)
+    since = _resume_from(ObservationRollup.DAY, timedelta(days=1))
+    if since is not None:
+        hours = hours.filter(period_start__gte=since)
+    rows = (hours
+            .annotate(bucket=Trunc('period_start', 'day', tzinfo=dt_timezone.utc))
+            .values('city_id', 'bucket')
+            .annotate(temp_min=Min('temp_min'), temp_max=Max('temp_max'),
+                      # Weight each hour by its number of observations
+                      temp_mean=ExpressionWrapper(
+                          Sum(F('temp_mean') * F('samples')) / Sum('samples'), output_field=FloatField()),
+                      humidity_mean=ExpressionWrapper(
+                          Sum(F('humidity_mean') * F('samples')) / Sum('samples'), output_field=FloatField()),
+                      wind_max=Max('wind_max'), samples=Sum('samples')))
+    return _upsert(ObservationRollup.DAY, rows)
+
+def _upsert(period, rows):
+    rollups = [
+        ObservationRollup(city_id=row['city_id'], period=period, period_start=row['bucket'],
+                          **{field: row[field] for field in ROLLUP_FIELDS})
+        for row in rows
+    ]
+    ObservationRollup.objects.bulk_create(
+        rollups, batch_size=500, update_conflicts=True,
+        unique_fields=['city', 'period', 'period_start'], update_fields=ROLLUP_FIELDS,
+    )
+    return len(rollups)
+
+def prune(now=None):
+    """
+    Delete raw observations and hourly rollups past their retention.
+
+    Run after the rollups so nothing is deleted before it is summarized.
+    Returns ``(observations, hourly rollups)`` deleted.
+    """
+    now = now or timezone.now()
+    observations, _ = Observation.objects.filter(
+        observed_at__lt=now - timedelta(days=settings.WEATHER_HISTORY_RAW_DAYS)).delete()
+    hours, _ = ObservationRollup.objects.filter(
+        period=ObservationRollup.HOUR,
+        period_start__lt=now - timedelta(days=settings.WEATHER_HISTORY_HOURLY_DAYS),
+    ).delete()
+    return observations, hours
+
+def rollup_if_due():
+    """
+    Update the rollups and apply retention if no worker has done so lately.
+
+    Runs after each batch of observations is written, at most once every
+    ``WEATHER_HISTORY_ROLLUP_INTERVAL`` seconds across the workers sharing the
+    weather cache (once per worker with a per-process cache; passes are
+    idempotent). Also prunes old weather snapshots. Returns True if it ran.
+    """
+    interval = settings.WEATHER_HISTORY_ROLLUP_INTERVAL
+    if not interval or not caching.get_cache().add(ROLLUP_MARKER_KEY, 1, interval):
+        return False
+    hours, days = rollup_hours(), rollup_days()
+    observations, hourly = prune()
+    old_snapshots = snapshots.prune()
+    logger.info(f'Rolled up {hours} hours and {days} days; pruned {observations} observations, '
+                f'{hourly} hourly rollups and {old_snapshots} snapshots')
+    return True
+
+def get_rollups(city, period, start, end):
+    """Rollups of ``period`` for a city starting within ``[start, end)``, oldest first."""
+    return list(ObservationRollup.objects
+                .filter(city=city, period=period, period_start__gte=start, period_start__lt=end)
+                .order_by('period_start')
+                .values('period_start', *ROLLUP_FIELDS))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from weather_app.gazetteer import City, write_cities
+
+# Column positions in a GeoNames dump (e.g. cities15000.txt, cities500.txt)
+ASCII_NAME, LATITUDE, LONGITUDE, COUNTRY, POPULATION = 2, 4, 5, 8, 14
+
+class Command(BaseCommand):
+    help = 'Build the city gazetteer used for suggestions from a GeoNames cities dump.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Path to a GeoNames citiesNNN.txt file')
+        parser.add_argument('--output', default=str(settings.WEATHER_GAZETTEER_PATH),
+                            help='Where to write the gazetteer (default: WEATHER_GAZETTEER_PATH)')
+        parser.add_argument('--min-population', type=int, default=0,
+                            help='Skip places with fewer inhabitants')
+
+    def handle(self, *args, **options):
+        cities = {}
+        try:
+            with open(options['source'], encoding='utf-8') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    population = int(fields[POPULATION] or 0)
+                    if population < options['min_population']:
+                        continue
+                    city = City(fields[ASCII_NAME], fields[COUNTRY], float(fields[LATITUDE]),
+                                float(fields[LONGITUDE]), population)
+                    # Keep the most populous place per name and country
+                    key = (city.name, city.country)
+                    if key not in cities or cities[key].population < population:
+                        cities[key] = city
+        except (OSError, IndexError, ValueError) as err:
+            raise CommandError(f'Could not read {options["source"]}: {err}')
+
+        write_cities(options['output'], cities.values())
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(cities)} cities to {options["output"]}'))
@@ -0,0 +1,73 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from weather_app import caching, ratelimit, utils
+from weather_app.models import City
+
+logger = logging.getLogger(__name__)
+
+def favorite_cities():
+    """Return every city favorited by at least one user, most popular first."""
+    return list(City.objects.favorited().values_list('name', flat=True))
+
+class Command(BaseCommand):
+    help = "Keep every user's favorite cities warm in the shared weather cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single refresh pass and exit')
+        parser.add_argument('--interval', type=int, default=settings.WEATHER_REFRESH_INTERVAL,
+                            help='Seconds between refresh passes')
+        parser.add_argument('--jitter', type=int, default=settings.WEATHER_REFRESH_JITTER,
+                            help='Spread each pass over this many seconds')
+        parser.add_argument('--concurrency', type=int, default=settings.WEATHER_REFRESH_CONCURRENCY,
+                            help='Maximum concurrent upstream calls')
+
+    def refresh_city(self, city):
+        # Pool threads keep their own database connections between passes
+        close_old_connections()
+        try:
+            with ratelimit.priority(ratelimit.BACKGROUND):
+                weather = utils.refresh_current_weather(city)
+            if weather is not None and weather.get('cod') != 200:
+                logger.warning(f"Refresh failed for {city}: {weather.get('message')}")
+        except Exception as err:
+            logger.error(f'Refresh error for {city}: {err}')
+
+    def run_pass(self, executor, jitter):
+        cities = favorite_cities()
+        # Random start offsets keep upstream calls from arriving in one burst
+        schedule = sorted((random.uniform(0, jitter), city) for city in cities)
+        started = time.monotonic()
+        futures = []
+        for offset, city in schedule:
+            delay = started + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(self.refresh_city, city))
+        for future in futures:
+            future.result()
+        return len(cities)
+
+    def handle(self, *args, **options):
+        if not caching.is_shared():
+            # Entries warmed in this process's memory are never seen by the web workers.
+            # Exit cleanly so a process manager does not restart it in a loop.
+            self.stderr.write('refresh_favorites needs a cache shared with the web workers; '
+                              'set REDIS_URL. Nothing to do.')
+            return
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            while True:
+                # Drop connections the database closed while this process slept
+                close_old_connections()
+                started = time.monotonic()
+                count = self.run_pass(executor, options['jitter'])
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'Refreshed {count} favorite cities in {elapsed:.1f}s')
+                if options['once']:
+                    return
+                time.sleep(max(0, options['interval'] - elapsed))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from weather_app import history, snapshots
+
+class Command(BaseCommand):
+    help = ('Summarize observation history into hourly and daily rollups and apply retention '
+            'to observations and saved weather snapshots.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-prune', action='store_true',
+                            help='Only update rollups; keep raw observations, old hourly rollups and snapshots')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        hours = history.rollup_hours()
+        days = history.rollup_days()
+        self.stdout.write(f'Updated {hours} hourly and {days} daily rollups')
+        if not options['no_prune']:
+            observations, hourly = history.prune()
+            self.stdout.write(f'Pruned {observations} observations and {hourly} hourly rollups')
+            self.stdout.write(f'Pruned {snapshots.prune()} weather snapshots')
+        self.stdout.write(f'Done in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,67 @@
+import contextvars
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY,
+    generate_latest, multiprocess,
+)
+
+# Under gunicorn every worker process keeps its own counters. When
+# PROMETHEUS_MULTIPROC_DIR is set, prometheus_client writes them to files in
+# that directory and the /metrics view merges the files from every worker.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+REQUEST_DURATION = Histogram(
+    'weather_request_duration_seconds',
+    'Time spent handling a request, by URL name',
+    ['view', 'method', 'status'],
+)
+REQUEST_UPSTREAM_CALLS = Histogram(
+    'weather_request_upstream_calls',
+    'Upstream calls made while handling one request, by URL name',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50),
+)
+UPSTREAM_CALLS = Counter(
+    'weather_upstream_calls_total',
+    'Upstream calls by endpoint and HTTP status (or error/refused)',
+    ['endpoint', 'status'],
+)
+UPSTREAM_DURATION = Histogram(
+    'weather_upstream_call_duration_seconds',
+    'Upstream call latency by endpoint, retries included',
+    ['endpoint'],
+)
+CACHE_REQUESTS = Counter(
+    'weather_cache_requests_total',
+    'Cache lookups by kind and result (hit, stale, miss, or nearby for a city reused by a location lookup)',
+    ['kind', 'result'],
+)
+
+# Upstream calls made on behalf of the current request
+_upstream_calls = contextvars.ContextVar('upstream_calls', default=None)
+
+def start_request():
+    """Begin counting upstream calls for the current request."""
+    counter = [0]
+    _upstream_calls.set(counter)
+    return counter
+
+def record_upstream_call(endpoint, status, duration):
+    UPSTREAM_CALLS.labels(endpoint, status).inc()
+    UPSTREAM_DURATION.labels(endpoint).observe(duration)
+    counter = _upstream_calls.get()
+    if counter is not None:
+        counter[0] += 1
+
+def record_cache_lookup(kind, result):
+    CACHE_REQUESTS.labels(kind, result).inc()
+
+def render_latest():
+    """Return ``(body, content_type)`` with every metric in text format."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,43 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from . import metrics
+
+class MetricsMiddleware:
+    """
+    Records request latency and upstream calls per URL name.
+
+    Works in both sync and async stacks so async views are not pushed onto a
+    thread. Requests that match no URL are grouped under ``unmatched``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        upstream_calls = metrics.start_request()
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, started, upstream_calls)
+        return response
+
+    async def __acall__(self, request):
+        upstream_calls = metrics.start_request()
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, started, upstream_calls)
+        return response
+
+    def record(self, request, response, started, upstream_calls):
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unmatched'
+        metrics.REQUEST_DURATION.labels(view, request.method, response.status_code).observe(
+            time.perf_counter() - started)
+        metrics.REQUEST_UPSTREAM_CALLS.labels(view).observe(upstream_calls[0])
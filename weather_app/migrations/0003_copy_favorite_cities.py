@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+def normalize_city_name(name):
+    return ' '.join(name.lower().split())
+
+
+def copy_favorites_to_table(apps, schema_editor):
+    User = apps.get_model('weather_app', 'User')
+    City = apps.get_model('weather_app', 'City')
+    Favorite = apps.get_model('weather_app', 'Favorite')
+
+    cities = {}
+    favorites = []
+    for user_id, names in User.objects.values_list('id', 'favorite_cities').iterator():
+        seen = set()
+        for name in names or []:
+            key = normalize_city_name(name)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            if key not in cities:
+                cities[key], _ = City.objects.get_or_create(
+                    normalized_name=key, defaults={'name': ' '.join(name.split())}
+                )
+            favorites.append(Favorite(user_id=user_id, city=cities[key]))
+    Favorite.objects.bulk_create(favorites, batch_size=1000, ignore_conflicts=True)
+
+
+def copy_favorites_to_json(apps, schema_editor):
+    User = apps.get_model('weather_app', 'User')
+    Favorite = apps.get_model('weather_app', 'Favorite')
+
+    by_user = {}
+    for user_id, name in Favorite.objects.order_by('created_at').values_list('user_id', 'city__name'):
+        by_user.setdefault(user_id, []).append(name)
+    for user in User.objects.all():
+        user.favorite_cities = by_user.get(user.id, [])
+        user.save(update_fields=['favorite_cities'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("weather_app", "0002_city_favorite"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_favorites_to_table, copy_favorites_to_json),
+    ]
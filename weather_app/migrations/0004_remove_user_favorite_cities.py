@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-18 09:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("weather_app", "0003_copy_favorite_cities"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="user",
+            name="favorite_cities",
+        ),
+    ]
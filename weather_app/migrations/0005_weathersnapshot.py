@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("weather_app", "0004_remove_user_favorite_cities"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WeatherSnapshot",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("payload", models.JSONField()),
+                ("fetched_at", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.0.2 on 2026-10-18 09:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("weather_app", "0005_weathersnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ObservationRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("period_start", models.DateTimeField()),
+                ("temp_min", models.FloatField()),
+                ("temp_max", models.FloatField()),
+                ("temp_mean", models.FloatField()),
+                ("humidity_mean", models.FloatField()),
+                ("wind_max", models.FloatField()),
+                ("samples", models.PositiveIntegerField()),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="observation_rollups",
+                        to="weather_app.city",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Observation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("observed_at", models.DateTimeField()),
+                ("temp", models.FloatField()),
+                ("humidity", models.PositiveSmallIntegerField()),
+                ("wind_speed", models.FloatField()),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="observations",
+                        to="weather_app.city",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["observed_at"], name="observation_observed_at_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="observation",
+            constraint=models.UniqueConstraint(
+                fields=("city", "observed_at"), name="unique_city_observation"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="observationrollup",
+            index=models.Index(
+                fields=["period", "period_start"], name="rollup_period_start_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="observationrollup",
+            constraint=models.UniqueConstraint(
+                fields=("city", "period", "period_start"), name="unique_city_rollup"
+            ),
+        ),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.base_user import BaseUserManager
+from django.utils.functional import cached_property
 
 class CustomUserManager(BaseUserManager):
     def _create_user(self, email, username, password=None, **extra_fields):
@@ -31,29 +33,152 @@ class CustomUserManager(BaseUserManager):
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     username = models.CharField(max_length=80, unique=True)
-    favorite_cities = models.JSONField(default=list)
 
     objects = CustomUserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    @cached_property
+    def favorite_cities(self):
+        """Names of the user's favorite cities, in the order they were added."""
+        return list(self.favorites.order_by('created_at').values_list('city__name', flat=True))
+
+    def _clear_favorites_cache(self):
+        self.__dict__.pop('favorite_cities', None)
+
     def add_favorite_city(self, city):
-        if not self.favorite_cities:
-            self.favorite_cities = []
-        if city not in self.favorite_cities:
-            self.favorite_cities.append(city)
-            self.save()
+        with transaction.atomic():
+            Favorite.objects.get_or_create(user=self, city=City.objects.get_or_create_by_name(city))
+        self._clear_favorites_cache()
 
     def remove_favorite_city(self, city):
-        if self.favorite_cities and city in self.favorite_cities:
-            self.favorite_cities.remove(city)
-            self.save()
+        Favorite.objects.filter(user=self, city__normalized_name=normalize_city_name(city)).delete()
+        self._clear_favorites_cache()
+
+    def toggle_favorite_city(self, city):
+        """Add ``city`` to favorites, or remove it if present. Returns True if added."""
+        deleted, _ = Favorite.objects.filter(
+            user=self, city__normalized_name=normalize_city_name(city)
+        ).delete()
+        if not deleted:
+            self.add_favorite_city(city)
+        self._clear_favorites_cache()
+        return not deleted
 
     def save(self, *args, **kwargs):
         # Ensure email is normalized before saving
         if self.email:
             self.email = self.email.lower().strip()
-        if not self.favorite_cities:
-            self.favorite_cities = []
         super().save(*args, **kwargs)
+
+def normalize_city_name(name):
+    """Case- and whitespace-insensitive key used to match city names."""
+    return ' '.join(name.lower().split())
+
+class CityQuerySet(models.QuerySet):
+    def get_or_create_by_name(self, name):
+        city, _ = self.get_or_create(
+            normalized_name=normalize_city_name(name),
+            defaults={'name': ' '.join(name.split())},
+        )
+        return city
+
+    def favorited(self):
+        """Cities favorited by at least one user, most popular first."""
+        return (self.annotate(favorite_count=Count('favorites'))
+                .filter(favorite_count__gt=0)
+                .order_by('-favorite_count', 'name'))
+
+class City(models.Model):
+    name = models.CharField(max_length=120)
+    normalized_name = models.CharField(max_length=120, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = CityQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'cities'
+
+    def __str__(self):
+        return self.name
+
+class Favorite(models.Model):
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='favorites')
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='favorites')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'city'], name='unique_user_favorite_city'),
+        ]
+        indexes = [
+            # Serves a user's favorites in the order they were added
+            models.Index(fields=['user', 'created_at'], name='favorite_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.city}'
+
+class WeatherSnapshot(models.Model):
+    """Last successful upstream payload for a lookup, served during outages."""
+
+    # The shared cache key of the lookup, e.g. 'weather:current:<md5>'
+    key = models.CharField(max_length=64, primary_key=True)
+    payload = models.JSONField()
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.key} @ {self.fetched_at:%Y-%m-%d %H:%M}'
+
+class Observation(models.Model):
+    """One current weather observation for a city, in canonical (metric) units."""
+
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='observations')
+    observed_at = models.DateTimeField()
+    temp = models.FloatField()
+    humidity = models.PositiveSmallIntegerField()
+    wind_speed = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Also serves range reads for one city
+            models.UniqueConstraint(fields=['city', 'observed_at'], name='unique_city_observation'),
+        ]
+        indexes = [
+            # Rollups and retention scan every city by time
+            models.Index(fields=['observed_at'], name='observation_observed_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.city} @ {self.observed_at:%Y-%m-%d %H:%M}'
+
+class ObservationRollup(models.Model):
+    """Hourly or daily summary of a city's observations."""
+
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = [(HOUR, 'Hour'), (DAY, 'Day')]
+
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='observation_rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateTimeField()
+    temp_min = models.FloatField()
+    temp_max = models.FloatField()
+    temp_mean = models.FloatField()
+    humidity_mean = models.FloatField()
+    wind_max = models.FloatField()
+    samples = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also serves range reads for one city and period
+            models.UniqueConstraint(fields=['city', 'period', 'period_start'], name='unique_city_rollup'),
+        ]
+        indexes = [
+            # Finds where the last rollup pass stopped and what to prune
+            models.Index(fields=['period', 'period_start'], name='rollup_period_start_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.city} {self.period} @ {self.period_start:%Y-%m-%d %H:%M}'
@@ -0,0 +1,116 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+# Priority classes for upstream calls
+INTERACTIVE = 'interactive'  # a person is waiting on the page or API response
+BACKGROUND = 'background'    # favorites refresher and stale-entry refreshes
+AUXILIARY = 'auxiliary'      # map tiles and other nice-to-have lookups
+
+# Share of each window's budget a class may draw on. Lower classes stop early
+# so the rest of the window is kept for interactive requests.
+PRIORITY_SHARES = {
+    INTERACTIVE: 1.0,
+    BACKGROUND: 0.7,
+    AUXILIARY: 0.5,
+}
+
+_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+class BudgetExhaustedError(Exception):
+    """Raised when an upstream call would exceed the shared call budget."""
+
+    def __init__(self, retry_after):
+        super().__init__('Upstream call budget exhausted')
+        self.retry_after = retry_after
+
+@contextmanager
+def priority(name):
+    """Run upstream calls made inside the block under priority class ``name``."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def _window():
+    """Return the cache key of the current window and the seconds left in it."""
+    length = settings.WEATHER_UPSTREAM_BUDGET_WINDOW
+    now = time.time()
+    start = int(now // length) * length
+    return f'weather:budget:{start}', start + length - now
+
+def budget():
+    """
+    Calls this process may count against per window.
+
+    With a shared cache every worker draws on one counter. A per-process
+    cache gives each worker its own counter, so each may only use its
+    slice of the budget; ``checks`` warns about that setup.
+    """
+    if caching.is_shared():
+        return settings.WEATHER_UPSTREAM_BUDGET
+    return max(1, settings.WEATHER_UPSTREAM_BUDGET // settings.WEATHER_WORKER_PROCESSES)
+
+def _ceiling():
+    return int(budget() * PRIORITY_SHARES[_priority.get()])
+
+def acquire():
+    """
+    Take one call from the budget shared by every worker, or raise.
+
+    Windows are aligned to the clock so they match the provider's per-minute
+    accounting. Each call increments the window's counter in the shared
+    cache. A call over its class's ceiling gives its slot back and raises
+    ``BudgetExhaustedError`` carrying the seconds left in the window.
+    """
+    if not settings.WEATHER_UPSTREAM_BUDGET:
+        return
+    key, remaining = _window()
+    cache = caching.get_cache()
+    cache.add(key, 0, int(remaining) + 1)
+    try:
+        used = cache.incr(key)
+    except ValueError:
+        # The window expired between add() and incr()
+        return
+    if used > _ceiling():
+        cache.decr(key)
+        raise BudgetExhaustedError(int(remaining) + 1)
+
+async def aacquire():
+    """Async version of ``acquire``."""
+    if not settings.WEATHER_UPSTREAM_BUDGET:
+        return
+    key, remaining = _window()
+    cache = caching.get_cache()
+    await cache.aadd(key, 0, int(remaining) + 1)
+    try:
+        used = await cache.aincr(key)
+    except ValueError:
+        return
+    if used > _ceiling():
+        await cache.adecr(key)
+        raise BudgetExhaustedError(int(remaining) + 1)
+
+def exhaust():
+    """Spend the rest of the current window after upstream answers 429."""
+    if not settings.WEATHER_UPSTREAM_BUDGET:
+        return
+    key, remaining = _window()
+    logger.warning(f'Upstream rate limited us; pausing calls for {int(remaining) + 1}s')
+    caching.get_cache().set(key, budget(), int(remaining) + 1)
+
+async def aexhaust():
+    """Async version of ``exhaust``."""
+    if not settings.WEATHER_UPSTREAM_BUDGET:
+        return
+    key, remaining = _window()
+    logger.warning(f'Upstream rate limited us; pausing calls for {int(remaining) + 1}s')
+    await caching.get_cache().aset(key, budget(), int(remaining) + 1)
@@ -0,0 +1,108 @@
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+from .models import WeatherSnapshot
+
+logger = logging.getLogger(__name__)
+
+def is_outage(data):
+    """
+    Return True for errors caused by OpenWeather being unavailable.
+
+    Covers 5xx responses, timeouts, an open circuit breaker and the call
+    budget, but not lookups that upstream rejected, such as unknown cities.
+    """
+    try:
+        cod = int(data.get('cod'))
+    except (TypeError, ValueError):
+        return False
+    return cod == 429 or cod >= 500
+
+def last_updated(data):
+    """When a payload served from a snapshot was fetched, or ``None`` if it is live."""
+    if 'last_updated' not in data:
+        return None
+    return datetime.fromtimestamp(data['last_updated'], tz=dt_timezone.utc)
+
+def _new_snapshot(key, data, fetched_at):
+    fetched_at = datetime.fromtimestamp(fetched_at, tz=dt_timezone.utc) if fetched_at else timezone.now()
+    return [WeatherSnapshot(key=key, payload=data, fetched_at=fetched_at)]
+
+def _upsert_options():
+    return {'update_conflicts': True, 'unique_fields': ['key'], 'update_fields': ['payload', 'fetched_at']}
+
+def _servable():
+    snapshots = WeatherSnapshot.objects.all()
+    if settings.WEATHER_SNAPSHOT_MAX_AGE:
+        oldest = timezone.now() - timedelta(seconds=settings.WEATHER_SNAPSHOT_MAX_AGE)
+        snapshots = snapshots.filter(fetched_at__gte=oldest)
+    return snapshots
+
+def _marked(snapshot, key, error):
+    logger.warning(f'Serving snapshot of {key} from {snapshot.fetched_at:%Y-%m-%d %H:%M} '
+                   f'after upstream error: {error.get("message")}')
+    return {**snapshot.payload, 'last_updated': int(snapshot.fetched_at.timestamp())}
+
+def save(key, data, fetched_at=None):
+    """
+    Insert or replace the last good payload for a cache key.
+
+    ``fetched_at`` is a Unix timestamp for payloads that were not just
+    fetched, e.g. copied from another cache entry; it defaults to now.
+    """
+    try:
+        WeatherSnapshot.objects.bulk_create(_new_snapshot(key, data, fetched_at), **_upsert_options())
+    except DatabaseError as err:
+        logger.error(f'Could not save snapshot of {key}: {err}')
+
+def fallback(key, error):
+    """
+    Return the last good payload for ``key`` in place of an upstream error.
+
+    The payload gains a ``last_updated`` timestamp so pages can say how old it
+    is. Returns ``error`` unchanged if there is no snapshot recent enough.
+    """
+    try:
+        snapshot = _servable().filter(key=key).first()
+    except DatabaseError as err:
+        logger.error(f'Could not load snapshot of {key}: {err}')
+        return error
+    if snapshot is None:
+        return error
+    return _marked(snapshot, key, error)
+
+def prune(now=None):
+    """
+    Delete snapshots too old to be served; returns how many were deleted.
+
+    Every cache key, including each location grid cell, gets its own row, so
+    without pruning the table only grows. Nothing is deleted when
+    ``WEATHER_SNAPSHOT_MAX_AGE`` is 0.
+    """
+    if not settings.WEATHER_SNAPSHOT_MAX_AGE:
+        return 0
+    now = now or timezone.now()
+    deleted, _ = WeatherSnapshot.objects.filter(
+        fetched_at__lt=now - timedelta(seconds=settings.WEATHER_SNAPSHOT_MAX_AGE)).delete()
+    return deleted
+
+async def asave(key, data, fetched_at=None):
+    """Async version of ``save``."""
+    try:
+        await WeatherSnapshot.objects.abulk_create(_new_snapshot(key, data, fetched_at), **_upsert_options())
+    except DatabaseError as err:
+        logger.error(f'Could not save snapshot of {key}: {err}')
+
+async def afallback(key, error):
+    """Async version of ``fallback``."""
+    try:
+        snapshot = await _servable().filter(key=key).afirst()
+    except DatabaseError as err:
+        logger.error(f'Could not load snapshot of {key}: {err}')
+        return error
+    if snapshot is None:
+        return error
+    return _marked(snapshot, key, error)
@@ -1,3 +1,1494 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+import requests
+from django.contrib.sessions.models import Session
+from django.core.checks import run_checks
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from . import api, async_views, auth, caching, forecast, gazetteer, geo, history, metrics, ratelimit, snapshots, tiles, upstream, utils, views, warmup
+from .models import City, Observation, ObservationRollup, User, WeatherSnapshot
+
+def current_payload(city='Paris', temp=20.0, dt=1700000000):
+    """A successful current weather payload as OpenWeather returns it (metric)."""
+    return {
+        'cod': 200, 'name': city, 'dt': dt,
+        'coord': {'lon': 2.35, 'lat': 48.86},
+        'main': {'temp': temp, 'feels_like': temp, 'humidity': 50},
+        'wind': {'speed': 3.0},
+        'weather': [{'description': 'clear sky', 'icon': '01d'}],
+    }
+
+class CountingFetcher:
+    """Fetcher returning queued payloads and counting its calls."""
+
+    def __init__(self, *payloads, delay=0):
+        self.payloads = list(payloads)
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            payload = self.payloads[min(self.calls, len(self.payloads)) - 1]
+        time.sleep(self.delay)
+        return payload
+
+def join_refresh(key):
+    """Wait for the background refresh of ``key`` started in this process."""
+    for thread in threading.enumerate():
+        if thread.name == f'refresh-{key}':
+            thread.join(5)
+
+class WeatherCacheTestCase(TestCase):
+    """Starts from an empty weather cache with ``self.key`` for Paris."""
+
+    ttl = 600
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.key = caching.make_key('current', 'Paris')
+        # Snapshots are covered on their own; keep background threads off the database
+        patcher = mock.patch.object(snapshots, 'save')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+class CachedFetchTests(WeatherCacheTestCase):
+    def test_keys_ignore_case_and_spacing(self):
+        self.assertEqual(caching.make_key('current', '  new   YORK '), caching.make_key('current', 'New York'))
+        self.assertNotEqual(caching.make_key('current', 'Paris'), caching.make_key('forecast', 'Paris'))
+
+    def test_miss_fetches_once_then_hits(self):
+        fetcher = CountingFetcher(current_payload(temp=20.0))
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl)['main']['temp'], 20.0)
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl)['main']['temp'], 20.0)
+        self.assertEqual(fetcher.calls, 1)
+
+    def test_errors_are_not_cached(self):
+        error = {'cod': '404', 'message': 'city not found'}
+        fetcher = CountingFetcher(error)
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl), error)
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl), error)
+        self.assertEqual(fetcher.calls, 2)
+        self.assertIsNone(caching.get_cache().get(self.key))
+
+    def test_stale_entry_is_served_while_refreshed(self):
+        stale = {'data': current_payload(temp=10.0), 'fetched_at': time.time() - self.ttl - 1}
+        caching.get_cache().set(self.key, stale, 300)
+        fetcher = CountingFetcher(current_payload(temp=25.0))
+
+        # The stale payload comes back at once; the refresh happens behind it
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl)['main']['temp'], 10.0)
+        join_refresh(self.key)
+        self.assertEqual(fetcher.calls, 1)
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl)['main']['temp'], 25.0)
+        self.assertEqual(fetcher.calls, 1)
+
+    def test_failed_refresh_keeps_the_stale_entry(self):
+        stale = {'data': current_payload(temp=10.0), 'fetched_at': time.time() - self.ttl - 1}
+        caching.get_cache().set(self.key, stale, 300)
+        fetcher = CountingFetcher({'cod': 500, 'message': 'upstream down'})
+
+        caching.cached_fetch(self.key, fetcher, self.ttl)
+        join_refresh(self.key)
+        self.assertEqual(caching.get_cache().get(self.key)['data']['main']['temp'], 10.0)
+
+class SingleFlightTests(WeatherCacheTestCase):
+    def test_concurrent_misses_share_one_fetch(self):
+        fetcher = CountingFetcher(current_payload(temp=20.0), delay=0.2)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(caching.cached_fetch(self.key, fetcher, self.ttl)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(fetcher.calls, 1)
+        self.assertEqual([result['main']['temp'] for result in results], [20.0] * 5)
+
+    def test_waits_for_the_worker_holding_the_lock(self):
+        cache = caching.get_cache()
+        # Another worker is fetching this key and writes it shortly
+        cache.add(caching._lock_key(self.key), 1, 15)
+        entry = {'data': current_payload(temp=15.0), 'fetched_at': time.time()}
+        writer = threading.Timer(0.2, cache.set, args=(self.key, entry, 600))
+        writer.start()
+        fetcher = CountingFetcher(current_payload(temp=30.0))
+
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl)['main']['temp'], 15.0)
+        self.assertEqual(fetcher.calls, 0)
+        writer.join()
+
+    def test_fetches_itself_when_the_lock_holder_caches_nothing(self):
+        cache = caching.get_cache()
+        cache.add(caching._lock_key(self.key), 1, 15)
+        releaser = threading.Timer(0.2, cache.delete, args=(caching._lock_key(self.key),))
+        releaser.start()
+        fetcher = CountingFetcher(current_payload(temp=30.0))
+
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl)['main']['temp'], 30.0)
+        self.assertEqual(fetcher.calls, 1)
+        releaser.join()
+
+class SnapshotFallbackTests(TestCase):
+    ttl = 600
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.key = caching.make_key('current', 'Paris')
+        caching.cached_fetch(self.key, CountingFetcher(current_payload(temp=18.0)), self.ttl)
+        caching.get_cache().clear()
+
+    def test_outage_serves_the_last_good_payload(self):
+        data = caching.cached_fetch(self.key, CountingFetcher({'cod': 503, 'message': 'unavailable'}), self.ttl)
+        self.assertEqual(data['main']['temp'], 18.0)
+        self.assertIsNotNone(snapshots.last_updated(data))
+        # The fallback is not cached, so the next request tries upstream again
+        self.assertIsNone(caching.get_cache().get(self.key))
+
+    def test_rejected_lookups_are_not_replaced(self):
+        error = {'cod': '404', 'message': 'city not found'}
+        self.assertEqual(caching.cached_fetch(self.key, CountingFetcher(error), self.ttl), error)
+
+    @override_settings(WEATHER_SNAPSHOT_MAX_AGE=3600)
+    def test_snapshots_past_their_max_age_are_not_served(self):
+        WeatherSnapshot.objects.filter(key=self.key).update(fetched_at=timezone.now() - timedelta(hours=2))
+        error = {'cod': 503, 'message': 'unavailable'}
+        self.assertEqual(caching.cached_fetch(self.key, CountingFetcher(error), self.ttl), error)
+
+    @override_settings(WEATHER_SNAPSHOT_MAX_AGE=3600)
+    def test_prune_deletes_snapshots_past_their_max_age(self):
+        WeatherSnapshot.objects.create(key='weather:current:old', payload=current_payload(),
+                                       fetched_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(snapshots.prune(), 1)
+        self.assertEqual(list(WeatherSnapshot.objects.values_list('key', flat=True)), [self.key])
+
+    @override_settings(WEATHER_SNAPSHOT_MAX_AGE=0)
+    def test_prune_keeps_everything_without_a_max_age(self):
+        WeatherSnapshot.objects.update(fetched_at=timezone.now() - timedelta(days=365))
+        self.assertEqual(snapshots.prune(), 0)
+        self.assertEqual(WeatherSnapshot.objects.count(), 1)
+
+    def test_a_new_payload_replaces_the_snapshot(self):
+        caching.cached_fetch(self.key, CountingFetcher(current_payload(temp=22.0)), self.ttl)
+        self.assertEqual(WeatherSnapshot.objects.get(key=self.key).payload['main']['temp'], 22.0)
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.breaker = upstream.CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def wait_out_reset(self):
+        self.breaker._opened_at -= self.breaker.reset_timeout
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+        self.assertFalse(self.breaker.is_open)
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        with self.assertRaises(upstream.CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_success_resets_the_failure_count(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertFalse(self.breaker.is_open)
+
+    def test_lets_one_trial_through_after_the_reset_timeout(self):
+        self.open_breaker()
+        self.wait_out_reset()
+        self.breaker.before_call()
+        with self.assertRaises(upstream.CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_successful_trial_closes(self):
+        self.open_breaker()
+        self.wait_out_reset()
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.is_open)
+        self.breaker.before_call()
+
+    def test_failed_trial_reopens_for_another_timeout(self):
+        self.open_breaker()
+        self.wait_out_reset()
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        with self.assertRaises(upstream.CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_cancelled_trial_frees_the_slot(self):
+        self.open_breaker()
+        self.wait_out_reset()
+        self.breaker.before_call()
+        self.breaker.cancel_call()
+        self.assertTrue(self.breaker.is_open)
+        self.breaker.before_call()
+
+    def upstream_client(self, **kwargs):
+        client = upstream.UpstreamClient(retries=0, breaker=self.breaker, **kwargs)
+        client.session.get = mock.Mock()
+        return client
+
+    def test_client_releases_the_trial_on_unexpected_errors(self):
+        client = self.upstream_client()
+        client.session.get.side_effect = ValueError('bad chunk')
+        self.open_breaker()
+        self.wait_out_reset()
+        with self.assertRaises(ValueError):
+            client.get('http://upstream.test/weather')
+        # The trial counted as a failure instead of holding the slot forever
+        self.assertTrue(self.breaker.is_open)
+        self.wait_out_reset()
+        self.breaker.before_call()
+
+    def test_client_counts_server_errors_and_not_client_errors(self):
+        client = self.upstream_client()
+        client.session.get.return_value = mock.Mock(status_code=404)
+        for _ in range(3):
+            client.get('http://upstream.test/weather')
+        self.assertFalse(self.breaker.is_open)
+        client.session.get.return_value = mock.Mock(status_code=500)
+        for _ in range(3):
+            client.get('http://upstream.test/weather')
+        self.assertTrue(self.breaker.is_open)
+
+    def test_refused_attempts_do_not_count_as_failures(self):
+        limiter = mock.Mock(side_effect=RuntimeError('budget spent'))
+        client = self.upstream_client(limiter=limiter)
+        self.open_breaker()
+        self.wait_out_reset()
+        with self.assertRaises(RuntimeError):
+            client.get('http://upstream.test/weather')
+        client.session.get.assert_not_called()
+        # The trial slot was handed back for the next caller
+        self.breaker.before_call()
+
+class UnitConversionTests(SimpleTestCase):
+
+    def test_temperature(self):
+        self.assertAlmostEqual(utils.convert_temperature(100, 'imperial'), 212.0)
+        self.assertAlmostEqual(utils.convert_temperature(-40, 'imperial'), -40.0)
+        self.assertEqual(utils.convert_temperature('21.5', 'metric'), 21.5)
+        self.assertEqual(utils.format_temperature(0, 'imperial'), '32.0°F')
+        self.assertEqual(utils.format_temperature(21.46, 'metric'), '21.5°C')
+
+    def test_wind_speed(self):
+        self.assertAlmostEqual(utils.convert_wind_speed(10, 'imperial'), 22.369, places=3)
+        self.assertEqual(utils.format_wind_speed(10, 'imperial'), '22.4 mph')
+        self.assertEqual(utils.format_wind_speed(3.26, 'metric'), '3.3 m/s')
+
+    def test_precipitation(self):
+        self.assertAlmostEqual(utils.convert_precipitation(25.4, 'imperial'), 1.0)
+        self.assertEqual(utils.format_precipitation(12.7, 'imperial'), '0.50 in')
+        self.assertEqual(utils.format_precipitation(12.7, 'metric'), '12.7 mm')
+
+    def test_missing_values_format_as_unavailable(self):
+        self.assertEqual(utils.format_temperature(None), 'N/A')
+        self.assertEqual(utils.format_wind_speed('calm'), 'N/A')
+        self.assertEqual(utils.format_precipitation(None, 'metric'), 'N/A')
+
+    def test_one_cache_entry_serves_both_unit_systems(self):
+        self.assertEqual(utils._city_params('Paris')['units'], 'metric')
+
+class UnitsCookieTests(TestCase):
+
+    def request_with_cookie(self, value):
+        request = RequestFactory().get('/')
+        request.COOKIES[views.UNITS_COOKIE] = value
+        return request
+
+    def test_setting_units_stores_a_signed_cookie_without_a_session(self):
+        response = self.client.post('/set-units/', {'units': 'metric'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        cookie = response.cookies[views.UNITS_COOKIE]
+        self.assertNotEqual(cookie.value, 'metric')
+        self.assertTrue(cookie['httponly'])
+        self.assertEqual(Session.objects.count(), 0)
+        self.assertEqual(views.get_units(self.request_with_cookie(cookie.value)), 'metric')
+
+    def test_invalid_units_are_rejected(self):
+        response = self.client.post('/set-units/', {'units': 'kelvin'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(views.UNITS_COOKIE, response.cookies)
+
+    def test_missing_or_tampered_cookies_default_to_imperial(self):
+        self.assertEqual(views.get_units(RequestFactory().get('/')), 'imperial')
+        self.assertEqual(views.get_units(self.request_with_cookie('metric')), 'imperial')
+        # Swapping the value under a valid signature is rejected too
+        signed = self.client.post('/set-units/', {'units': 'imperial'},
+                                  content_type='application/json').cookies[views.UNITS_COOKIE].value
+        self.assertTrue(signed.startswith('imperial:'))
+        tampered = signed.replace('imperial', 'metric', 1)
+        self.assertEqual(views.get_units(self.request_with_cookie(tampered)), 'imperial')
+
+def forecast_item(when, temp, humidity=50, wind=2.0, icon='01d', description='clear sky', rain=None, snow=None):
+    """One 3-hour slot of a forecast payload; ``when`` is a UTC datetime."""
+    item = {
+        'dt': int(when.timestamp()),
+        'main': {'temp': temp, 'temp_min': temp - 1, 'temp_max': temp + 1, 'humidity': humidity},
+        'wind': {'speed': wind},
+        'weather': [{'description': description, 'icon': icon}],
+    }
+    if rain is not None:
+        item['rain'] = {'3h': rain}
+    if snow is not None:
+        item['snow'] = {'3h': snow}
+    return item
+
+class AggregateDailyTests(SimpleTestCase):
+
+    def utc(self, day, hour):
+        return datetime(2026, 3, day, hour, tzinfo=dt_timezone.utc)
+
+    def test_summarizes_each_day(self):
+        days = forecast.aggregate_daily({'city': {'timezone': 0}, 'list': [
+            forecast_item(self.utc(1, 9), 10, humidity=40, wind=3.0, rain=1.5),
+            forecast_item(self.utc(1, 12), 14, humidity=61, wind=7.5, snow=0.5),
+            forecast_item(self.utc(1, 15), 12, humidity=50, wind=5.0),
+            forecast_item(self.utc(2, 0), 4),
+        ]})
+        self.assertEqual([day['date'] for day in days], [date(2026, 3, 1), date(2026, 3, 2)])
+        first = days[0]
+        self.assertEqual((first['temp_min'], first['temp_max']), (9, 15))
+        self.assertAlmostEqual(first['temp_mean'], 12.0)
+        self.assertAlmostEqual(first['precipitation'], 2.0)
+        self.assertEqual(first['wind_max'], 7.5)
+        self.assertEqual(first['humidity'], 50)
+        self.assertEqual(days[1]['precipitation'], 0)
+
+    def test_days_follow_the_city_timezone(self):
+        items = [forecast_item(self.utc(1, 21), 10), forecast_item(self.utc(2, 3), 20)]
+        self.assertEqual(len(forecast.aggregate_daily({'city': {'timezone': 0}, 'list': items})), 2)
+        # At UTC+5 both slots fall on March 2nd
+        days = forecast.aggregate_daily({'city': {'timezone': 5 * 3600}, 'list': items})
+        self.assertEqual([day['date'] for day in days], [date(2026, 3, 2)])
+        # At UTC-5 both fall on March 1st
+        days = forecast.aggregate_daily({'city': {'timezone': -5 * 3600}, 'list': items})
+        self.assertEqual([day['date'] for day in days], [date(2026, 3, 1)])
+
+    def test_dominant_condition_merges_day_and_night_icons(self):
+        days = forecast.aggregate_daily({'list': [
+            forecast_item(self.utc(1, 0), 5, icon='04n', description='broken clouds'),
+            forecast_item(self.utc(1, 3), 5, icon='04n', description='broken clouds'),
+            forecast_item(self.utc(1, 12), 8, icon='10d', description='light rain'),
+            forecast_item(self.utc(1, 15), 8, icon='04d', description='broken clouds'),
+        ]})
+        self.assertEqual((days[0]['description'], days[0]['icon']), ('broken clouds', '04d'))
+
+class FavoriteMigrationTests(TransactionTestCase):
+    """Moving favorites from the JSON column to the Favorite table (0003, 0004) and back."""
+
+    json_state = [('weather_app', '0002_city_favorite')]
+    table_state = [('weather_app', '0004_remove_user_favorite_cities')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_forward_copies_favorites_into_the_table(self):
+        apps = self.migrate(self.json_state)
+        User = apps.get_model('weather_app', 'User')
+        alice = User.objects.create(username='alice', email='alice@example.com',
+                                    favorite_cities=['Paris', ' paris ', 'New  York', ''])
+        bob = User.objects.create(username='bob', email='bob@example.com', favorite_cities=['PARIS'])
+        User.objects.create(username='carol', email='carol@example.com', favorite_cities=[])
+
+        apps = self.migrate(self.table_state)
+        City = apps.get_model('weather_app', 'City')
+        Favorite = apps.get_model('weather_app', 'Favorite')
+        self.assertEqual(sorted(City.objects.values_list('normalized_name', flat=True)), ['new york', 'paris'])
+        self.assertEqual(City.objects.get(normalized_name='new york').name, 'New York')
+        self.assertEqual(sorted(Favorite.objects.filter(user_id=alice.pk).values_list('city__normalized_name', flat=True)),
+                         ['new york', 'paris'])
+        self.assertEqual(list(Favorite.objects.filter(user_id=bob.pk).values_list('city__normalized_name', flat=True)),
+                         ['paris'])
+        self.assertEqual(Favorite.objects.count(), 3)
+
+    def test_backward_restores_the_json_lists_in_order(self):
+        apps = self.migrate(self.table_state)
+        User = apps.get_model('weather_app', 'User')
+        City = apps.get_model('weather_app', 'City')
+        Favorite = apps.get_model('weather_app', 'Favorite')
+        alice = User.objects.create(username='alice', email='alice@example.com')
+        User.objects.create(username='bob', email='bob@example.com')
+        added = timezone.now()
+        for offset, name in enumerate(['Oslo', 'Lima', 'Rome']):
+            city = City.objects.create(name=name, normalized_name=name.lower())
+            favorite = Favorite.objects.create(user=alice, city=city)
+            Favorite.objects.filter(pk=favorite.pk).update(created_at=added + timedelta(minutes=offset))
+
+        apps = self.migrate(self.json_state)
+        User = apps.get_model('weather_app', 'User')
+        self.assertEqual(User.objects.get(username='alice').favorite_cities, ['Oslo', 'Lima', 'Rome'])
+        self.assertEqual(User.objects.get(username='bob').favorite_cities, [])
+
+# Pages render without running collectstatic first
+PAGE_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+@override_settings(STORAGES=PAGE_STORAGES)
+class WeatherPageValidatorTests(TestCase):
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.cache_current(current_payload('London', dt=1700000000))
+
+    def cache_current(self, data):
+        entry = {'data': data, 'fetched_at': time.time()}
+        caching.get_cache().set(caching.make_key('current', data['name']), entry, 600)
+
+    def get_page(self, **headers):
+        return self.client.get('/weather/', {'city': 'London'}, **headers)
+
+    def test_pages_carry_private_validators(self):
+        response = self.get_page()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get_page()['ETag']
+        response = self.get_page(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_anonymous_pages_revalidate_by_date(self):
+        last_modified = self.get_page()['Last-Modified']
+        self.assertEqual(self.get_page(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_new_observation_changes_the_etag(self):
+        etag = self.get_page()['ETag']
+        self.cache_current(current_payload('London', dt=1700000600))
+        response = self.get_page(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_units_change_the_etag(self):
+        etag = self.get_page()['ETag']
+        self.client.post('/set-units/', {'units': 'metric'}, content_type='application/json')
+        self.assertEqual(self.get_page(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_signed_in_pages_follow_the_favorites_sidebar(self):
+        user = User.objects.create_user(username='alice', email='alice@example.com', password='not-a-secret-42')
+        self.client.force_login(user)
+        response = self.get_page()
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        self.assertEqual(self.get_page(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # The sidebar is filled from the cache, never from upstream here
+        self.cache_current(current_payload('Paris', dt=1700000000))
+        user.toggle_favorite_city('Paris')
+        response = self.get_page(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # A fresher observation of a favorite changes the sidebar
+        self.cache_current(current_payload('Paris', dt=1700000600))
+        self.assertEqual(self.get_page(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_other_viewers_do_not_share_an_etag(self):
+        etag = self.get_page()['ETag']
+        user = User.objects.create_user(username='alice', email='alice@example.com', password='not-a-secret-42')
+        self.client.force_login(user)
+        self.assertEqual(self.get_page(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+@override_settings(WEATHER_UPSTREAM_BUDGET=10, WEATHER_UPSTREAM_BUDGET_WINDOW=60, WEATHER_WORKER_PROCESSES=1)
+class UpstreamBudgetTests(SimpleTestCase):
+
+    def setUp(self):
+        caching.get_cache().clear()
+        # Start of a window, so no test runs across a boundary by accident
+        self.now = 1800000000.0
+        patcher = mock.patch.object(ratelimit.time, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def spend(self, limit=100):
+        """Acquire until the budget refuses; returns the calls let through."""
+        for calls in range(limit):
+            try:
+                ratelimit.acquire()
+            except ratelimit.BudgetExhaustedError as err:
+                self.retry_after = err.retry_after
+                return calls
+        return limit
+
+    def test_refuses_calls_over_the_budget_until_the_window_ends(self):
+        self.assertEqual(self.spend(), 10)
+        self.assertEqual(self.retry_after, 61)
+        self.now += 45
+        self.assertEqual(self.spend(), 0)
+        self.assertEqual(self.retry_after, 16)
+        # The next window starts with a full budget
+        self.now += 15
+        self.assertEqual(self.spend(), 10)
+
+    def test_lower_priorities_stop_early(self):
+        with ratelimit.priority(ratelimit.BACKGROUND):
+            self.assertEqual(self.spend(), 7)
+        with ratelimit.priority(ratelimit.AUXILIARY):
+            self.assertEqual(self.spend(), 0)
+        # What is left is kept for interactive calls
+        self.assertEqual(self.spend(), 3)
+
+    def test_rate_limit_from_upstream_spends_the_window(self):
+        self.spend(limit=2)
+        ratelimit.exhaust()
+        self.assertEqual(self.spend(), 0)
+        self.now += 60
+        self.assertEqual(self.spend(), 10)
+
+    @override_settings(WEATHER_UPSTREAM_BUDGET=0)
+    def test_zero_disables_the_budget(self):
+        self.assertEqual(self.spend(limit=50), 50)
+
+    @override_settings(WEATHER_WORKER_PROCESSES=4)
+    def test_per_process_cache_splits_the_budget_between_workers(self):
+        self.assertEqual(self.spend(), 2)
+
+    @override_settings(WEATHER_WORKER_PROCESSES=4)
+    def test_shared_cache_uses_the_whole_budget(self):
+        with mock.patch.object(caching, 'is_shared', return_value=True):
+            self.assertEqual(self.spend(), 10)
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    def check_ids(self, **kwargs):
+        return {message.id for message in run_checks(**kwargs) if message.id.startswith('weather_app.')}
+
+    def test_only_reported_by_the_deployment_checks(self):
+        self.assertEqual(self.check_ids(), set())
+        self.assertEqual(self.check_ids(include_deployment_checks=True),
+                         {'weather_app.W001', 'weather_app.W002', 'weather_app.W003'})
+
+    def test_silent_with_a_shared_cache(self):
+        with mock.patch.object(caching, 'is_shared', return_value=True):
+            self.assertEqual(self.check_ids(include_deployment_checks=True), set())
+
+class CitySuggestionTests(TestCase):
+
+    def setUp(self):
+        caching.get_cache().clear()
+
+    def names(self, query):
+        return [city.name for city in gazetteer.get_gazetteer().search(query)]
+
+    def test_misspelled_names_are_matched(self):
+        for typo, city in [('Lodnon', 'London'), ('Pairs', 'Paris'), ('Sydeny', 'Sydney'),
+                           ('New Yrok', 'New York'), ('Los Angles', 'Los Angeles')]:
+            with self.subTest(typo=typo):
+                self.assertEqual(self.names(typo)[0], city)
+
+    def test_exact_and_accented_names_come_first(self):
+        self.assertEqual(self.names('london')[0], 'London')
+        self.assertEqual(self.names('São Paulo')[0], 'Sao Paulo')
+
+    def test_unrelated_names_match_nothing(self):
+        self.assertEqual(self.names('xqzzvw'), [])
+
+    def test_suggestions_come_from_the_gazetteer_first(self):
+        with mock.patch.object(utils, '_request_json') as request:
+            self.assertEqual(utils.get_city_suggestions('Lodnon')[0], 'London, GB')
+        request.assert_not_called()
+
+    def test_unknown_names_fall_back_to_geocoding_once(self):
+        places = [{'name': 'Xqzzvw', 'country': 'NZ', 'lat': -41.0, 'lon': 174.0}]
+        with mock.patch.object(utils, '_request_json', return_value=places) as request:
+            self.assertEqual(utils.get_city_suggestions('xqzzvw'), ['Xqzzvw, NZ'])
+            self.assertEqual(utils.get_city_suggestions('Xqzzvw'), ['Xqzzvw, NZ'])
+        self.assertEqual(request.call_count, 1)
+
+    def test_geocoding_errors_give_no_suggestions(self):
+        with mock.patch.object(utils, '_request_json', return_value={'cod': 503, 'message': 'down'}):
+            self.assertEqual(utils.get_city_suggestions('xqzzvw'), [])
+
+class UpstreamRetryTests(SimpleTestCase):
+
+    def upstream_client(self, **kwargs):
+        client = upstream.UpstreamClient(retries=2, backoff=0, **kwargs)
+        client.session.get = mock.Mock()
+        return client
+
+    def test_connection_errors_are_retried(self):
+        client = self.upstream_client()
+        client.session.get.side_effect = [requests.exceptions.ConnectTimeout(), mock.Mock(status_code=200)]
+        self.assertEqual(client.get('http://upstream.test/weather').status_code, 200)
+        self.assertEqual(client.session.get.call_count, 2)
+
+    def test_read_timeouts_are_not_retried(self):
+        client = self.upstream_client()
+        client.session.get.side_effect = requests.exceptions.ReadTimeout()
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            client.get('http://upstream.test/weather')
+        self.assertEqual(client.session.get.call_count, 1)
+
+    def test_retries_stop_at_the_deadline(self):
+        client = self.upstream_client(deadline=0)
+        client.session.get.return_value = mock.Mock(status_code=503)
+        self.assertEqual(client.get('http://upstream.test/weather').status_code, 503)
+        self.assertEqual(client.session.get.call_count, 1)
+
+    def test_attempts_never_wait_past_the_deadline(self):
+        client = self.upstream_client(deadline=4)
+        client.session.get.return_value = mock.Mock(status_code=200)
+        client.get('http://upstream.test/weather')
+        connect, read = client.session.get.call_args.kwargs['timeout']
+        self.assertEqual(connect, 3.05)
+        self.assertLessEqual(read, 4)
+
+class TileCacheTestCase(SimpleTestCase):
+    """Runs against a tile cache in a temporary directory."""
+
+    max_bytes = 1000
+    ttl = 600
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.tile_cache = tiles.TileCache(root, self.max_bytes, self.ttl)
+
+    def age(self, layer, z, x, y, seconds, accessed=None):
+        """Backdate a cached tile's fetch time (mtime) and last use (atime)."""
+        path = self.tile_cache.path(layer, z, x, y)
+        fetched = time.time() - seconds
+        os.utime(path, (fetched if accessed is None else accessed, fetched))
+
+class TileCacheTests(TileCacheTestCase):
+
+    def test_fresh_tiles_are_served_and_expired_ones_are_not(self):
+        self.tile_cache.store('clouds', 1, 0, 0, b'tile')
+        path, _ = self.tile_cache.lookup('clouds', 1, 0, 0)
+        self.assertEqual(path.read_bytes(), b'tile')
+        self.age('clouds', 1, 0, 0, self.ttl + 1)
+        self.assertIsNone(self.tile_cache.lookup('clouds', 1, 0, 0))
+        # Still on disk for when upstream cannot refresh it
+        self.assertIsNotNone(self.tile_cache.peek('clouds', 1, 0, 0))
+
+    def test_least_recently_used_tiles_are_evicted_past_the_size_limit(self):
+        now = time.time()
+        for y in range(4):
+            self.tile_cache.store('clouds', 2, 0, y, b'x' * 200)
+        # Tile 1 was used longest ago, then 2; tile 0 was used last
+        for y, last_used in [(0, now - 10), (1, now - 300), (2, now - 200), (3, now - 100)]:
+            self.age('clouds', 2, 0, y, 60, accessed=last_used)
+        self.tile_cache.lookup('clouds', 2, 0, 3)
+
+        # 1100 bytes is over the limit; evicting tile 1 brings it to 90%
+        self.tile_cache.store('clouds', 2, 1, 0, b'x' * 300)
+        kept = {y for y in range(4) if self.tile_cache.peek('clouds', 2, 0, y)}
+        self.assertEqual(kept, {0, 2, 3})
+        self.assertIsNotNone(self.tile_cache.peek('clouds', 2, 1, 0))
+
+        # A second write over the limit evicts tile 2, now the least recently used
+        self.tile_cache.store('clouds', 2, 1, 1, b'x' * 200)
+        kept = {y for y in range(4) if self.tile_cache.peek('clouds', 2, 0, y)}
+        self.assertEqual(kept, {0, 3})
+        self.assertLessEqual(self.tile_cache._scan_size(), self.max_bytes * tiles.EVICT_TO)
+
+    def test_etag_follows_fetch_time_and_size(self):
+        _, stat = self.tile_cache.store('clouds', 1, 0, 0, b'tile')
+        self.assertEqual(tiles.etag_for(stat), f'"{int(stat.st_mtime)}-4"')
+
+@override_settings(WEATHER_API_KEY='secret-api-key')
+class TileProxyTests(TileCacheTestCase):
+    url = '/tiles/clouds/3/2/1.png'
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(tiles, '_tile_cache', self.tile_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.upstream_get = mock.Mock(return_value=mock.Mock(status_code=200, content=b'png-bytes'))
+        patcher = mock.patch.object(upstream, 'get', self.upstream_get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_miss_fetches_once_and_caches(self):
+        for _ in range(2):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'png-bytes')
+        self.assertEqual(self.upstream_get.call_count, 1)
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_unknown_layers_and_coordinates_are_rejected(self):
+        self.assertEqual(self.client.get('/tiles/radar/3/2/1.png').status_code, 404)
+        self.assertEqual(self.client.get('/tiles/clouds/3/8/1.png').status_code, 404)
+        self.upstream_get.assert_not_called()
+
+    def test_api_key_never_reaches_the_client(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.upstream_get.call_args.kwargs['params'], {'appid': 'secret-api-key'})
+        self.assertNotIn(b'secret-api-key', response.content)
+        self.assertFalse(any('secret-api-key' in value for _, value in response.items()))
+
+    def test_expired_tile_is_served_when_refresh_fails(self):
+        self.client.get(self.url)
+        self.age('clouds', 3, 2, 1, self.ttl + 1)
+        self.upstream_get.side_effect = ratelimit.BudgetExhaustedError(30)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'png-bytes')
+
+    def test_missing_tile_is_a_bad_gateway_when_upstream_fails(self):
+        self.upstream_get.return_value = mock.Mock(status_code=500, content=b'',
+                                                   raise_for_status=mock.Mock(side_effect=Exception('500')))
+        self.assertEqual(self.client.get(self.url).status_code, 502)
+
+class UserCacheTestCase(TestCase):
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='first-pass-42')
+
+@override_settings(WEATHER_USER_CACHE_TTL=300)
+class SharedUserCacheTests(UserCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(auth, 'is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_user_is_read_once_then_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(auth.load_user(self.user.pk), self.user)
+            self.assertEqual(auth.load_user(self.user.pk), self.user)
+
+    def test_password_change_invalidates_the_cached_user(self):
+        auth.load_user(self.user.pk)
+        self.user.set_password('second-pass-42')
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertTrue(auth.load_user(self.user.pk).check_password('second-pass-42'))
+
+    def test_deactivated_users_are_logged_out(self):
+        backend = auth.EmailBackend()
+        self.assertEqual(backend.get_user(self.user.pk), self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+    def test_deleted_users_are_not_served_from_the_cache(self):
+        auth.load_user(self.user.pk)
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertIsNone(auth.load_user(user_id))
+
+    def test_favorites_are_not_frozen_in_the_cache(self):
+        self.user.toggle_favorite_city('Paris')
+        self.assertEqual(auth.load_user(self.user.pk).favorite_cities, ['Paris'])
+        self.user.toggle_favorite_city('Rome')
+        self.assertEqual(auth.load_user(self.user.pk).favorite_cities, ['Paris', 'Rome'])
+
+class UnsharedUserCacheTests(UserCacheTestCase):
+
+    @override_settings(WEATHER_USER_CACHE_TTL=300)
+    def test_per_process_cache_reads_the_database_every_time(self):
+        with self.assertNumQueries(2):
+            auth.load_user(self.user.pk)
+            auth.load_user(self.user.pk)
+        self.assertIsNone(caching.get_cache().get(auth._user_key(self.user.pk)))
+
+    @override_settings(WEATHER_USER_CACHE_TTL=0)
+    def test_zero_ttl_disables_the_cache(self):
+        with mock.patch.object(auth, 'is_shared', return_value=True), self.assertNumQueries(2):
+            auth.load_user(self.user.pk)
+            auth.load_user(self.user.pk)
+
+class EmailBackendTests(UserCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = auth.EmailBackend()
+
+    def test_email_or_username_with_the_right_password(self):
+        self.assertEqual(self.backend.authenticate(None, username='alice@example.com', password='first-pass-42'), self.user)
+        self.assertEqual(self.backend.authenticate(None, username=' Alice@Example.com ', password='first-pass-42'), self.user)
+        self.assertEqual(self.backend.authenticate(None, username='alice', password='first-pass-42'), self.user)
+
+    def test_wrong_passwords_and_unknown_accounts_are_rejected(self):
+        self.assertIsNone(self.backend.authenticate(None, username='alice@example.com', password='wrong'))
+        self.assertIsNone(self.backend.authenticate(None, username='alice', password='wrong'))
+        self.assertIsNone(self.backend.authenticate(None, username='bob@example.com', password='first-pass-42'))
+        self.assertIsNone(self.backend.authenticate(None, username='alice', password=None))
+
+    def test_inactive_users_cannot_sign_in(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.authenticate(None, username='alice', password='first-pass-42'))
+
+class RefreshFavoritesTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='alice', email='alice@example.com', password='first-pass-42').toggle_favorite_city('Paris')
+
+    def test_exits_cleanly_without_a_shared_cache(self):
+        stderr = io.StringIO()
+        with mock.patch.object(utils, 'refresh_current_weather') as refresh:
+            call_command('refresh_favorites', '--once', stderr=stderr)
+        refresh.assert_not_called()
+        self.assertIn('REDIS_URL', stderr.getvalue())
+
+    def test_each_pass_drops_stale_database_connections(self):
+        command = 'weather_app.management.commands.refresh_favorites'
+        with mock.patch.object(caching, 'is_shared', return_value=True), \
+                mock.patch.object(utils, 'refresh_current_weather', return_value=current_payload('Paris')) as refresh, \
+                mock.patch(f'{command}.close_old_connections') as close:
+            call_command('refresh_favorites', '--once', '--jitter', '0', stdout=io.StringIO())
+        refresh.assert_called_once_with('Paris')
+        self.assertEqual(close.call_count, 2)
+
+@override_settings(WEATHER_LOCATION_GRID=0.05)
+class GridTests(SimpleTestCase):
+
+    def test_nearby_coordinates_share_a_cell(self):
+        self.assertEqual(geo.grid_cell(48.8566, 2.3522), geo.grid_cell(48.8601, 2.3611))
+        self.assertNotEqual(geo.grid_cell(48.8566, 2.3522), geo.grid_cell(48.9066, 2.3522))
+
+    def test_cells_snap_down_on_both_sides_of_zero(self):
+        self.assertEqual(geo.grid_cell(0.01, -0.01), (0, -1))
+        self.assertEqual(geo.grid_cell(-33.8688, 151.2093), (-678, 3024))
+        self.assertEqual(geo.grid_cell('48.8566', '2.3522'), (977, 47))
+
+    def test_the_center_lies_inside_its_cell(self):
+        for lat, lon in ((48.8566, 2.3522), (-33.8688, 151.2093), (0.01, -0.01)):
+            cell = geo.grid_cell(lat, lon)
+            self.assertEqual(geo.grid_cell(*geo.cell_center(cell)), cell)
+        self.assertEqual(geo.cell_center((977, 47)), (48.875, 2.375))
+        self.assertEqual(geo.cell_center((0, 0), size=1), (0.5, 0.5))
+
+    def test_cell_ids_include_the_grid_size(self):
+        self.assertEqual(geo.cell_id((977, 47)), '0.05:977:47')
+
+@override_settings(WEATHER_LOCATION_GRID=0.05)
+class SpatialIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = geo.SpatialIndex(max_entries=10)
+        self.index.add('paris', 48.8566, 2.3522)
+        self.index.add('versailles', 48.8049, 2.1204)
+        self.index.add('lyon', 45.7640, 4.8357)
+
+    def test_nearest_first_within_the_radius(self):
+        self.assertEqual(self.index.nearest(48.86, 2.30, 25), ['paris', 'versailles'])
+        self.assertEqual(self.index.nearest(48.82, 2.15, 25), ['versailles', 'paris'])
+        self.assertEqual(self.index.nearest(48.86, 2.30, 5), ['paris'])
+        self.assertEqual(self.index.nearest(0, 0, 50), [])
+
+    def test_searches_neighbouring_cells(self):
+        # Paris is several cells away from a point 20 km south of it
+        self.assertNotEqual(geo.grid_cell(48.68, 2.3522), geo.grid_cell(48.8566, 2.3522))
+        self.assertEqual(self.index.nearest(48.68, 2.3522, 25), ['paris', 'versailles'])
+
+    def test_moving_a_key_replaces_its_position(self):
+        self.index.add('paris', 45.76, 4.84)
+        self.assertEqual(self.index.nearest(48.86, 2.30, 5), [])
+        self.assertEqual(self.index.nearest(45.76, 4.84, 5), ['paris', 'lyon'])
+
+    def test_forgets_the_least_recently_seen_city(self):
+        index = geo.SpatialIndex(max_entries=2)
+        index.add('paris', 48.8566, 2.3522)
+        index.add('versailles', 48.8049, 2.1204)
+        index.add('paris', 48.8566, 2.3522)
+        index.add('lyon', 45.7640, 4.8357)
+        self.assertEqual(index.nearest(48.86, 2.30, 25), ['paris'])
+        self.assertEqual(set(index.entries), {'paris', 'lyon'})
+
+@override_settings(WEATHER_LOCATION_NEARBY_KM=8, WEATHER_LOCATION_GRID=0.05)
+class NearbyLocationTests(WeatherCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(geo, '_index', geo.SpatialIndex(10))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fetched_at = time.time() - 300
+        caching.get_cache().set(self.key, {'data': current_payload('Paris'), 'fetched_at': self.fetched_at})
+        geo.get_index().add(self.key, 48.86, 2.35)
+
+    def test_reuses_a_nearby_city_without_refreshing_its_age(self):
+        with mock.patch.object(utils, '_request_json') as request, \
+                mock.patch.object(snapshots, 'save') as save:
+            self.assertEqual(utils.get_location_weather(48.87, 2.33)['name'], 'Paris')
+        request.assert_not_called()
+        key = caching.make_key('location', utils.location_cell(48.87, 2.33))
+        self.assertEqual(caching.get_cache().get(key)['fetched_at'], self.fetched_at)
+        self.assertEqual(caching.expires_in(key, self.ttl), caching.expires_in(self.key, self.ttl))
+        save.assert_called_once_with(key, current_payload('Paris'), self.fetched_at)
+
+    def test_calls_upstream_when_no_city_is_near(self):
+        with mock.patch.object(utils, '_request_json', return_value=current_payload('Lyon')) as request:
+            self.assertEqual(utils.get_location_weather(45.76, 4.84)['name'], 'Lyon')
+        request.assert_called_once()
+        key = caching.make_key('location', utils.location_cell(45.76, 4.84))
+        self.assertAlmostEqual(caching.get_cache().get(key)['fetched_at'], time.time(), delta=5)
+
+class ObservationBufferTests(SimpleTestCase):
+
+    def setUp(self):
+        self.buffer = history.ObservationBuffer()
+        self.written = []
+        self.flushed = threading.Event()
+        for name, side_effect in (('write_batch', self.write), ('rollup_if_due', None)):
+            patcher = mock.patch.object(history, name, side_effect=side_effect)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, batch):
+        self.written.append(batch)
+        self.flushed.set()
+
+    @override_settings(WEATHER_HISTORY_BATCH_SIZE=3, WEATHER_HISTORY_FLUSH_INTERVAL=60)
+    def test_flushes_a_full_batch_once(self):
+        self.buffer.add('Paris', 1700000000, 20.0, 50, 3.0)
+        self.buffer.add(' paris ', 1700000000, 21.0, 50, 3.0)
+        self.buffer.add('Rome', 1700000000, 25.0, 40, 2.0)
+        self.assertFalse(self.flushed.wait(0.2))
+        self.buffer.add('Oslo', 1700000000, 5.0, 70, 6.0)
+        self.assertTrue(self.flushed.wait(5))
+        self.assertEqual(len(self.written), 1)
+        self.assertEqual(self.written[0][('paris', 1700000000)], (' paris ', 21.0, 50, 3.0))
+        self.assertEqual(len(self.written[0]), 3)
+        self.assertEqual(self.buffer.pending, {})
+
+    @override_settings(WEATHER_HISTORY_BATCH_SIZE=100, WEATHER_HISTORY_FLUSH_INTERVAL=1)
+    def test_flushes_on_the_timer_without_new_observations(self):
+        self.buffer.add('Paris', 1700000000, 20.0, 50, 3.0)
+        self.assertTrue(self.flushed.wait(5))
+        self.assertEqual(list(self.written[0]), [('paris', 1700000000)])
+
+    @override_settings(WEATHER_HISTORY_BATCH_SIZE=100, WEATHER_HISTORY_FLUSH_INTERVAL=60)
+    def test_flush_writes_on_the_calling_thread(self):
+        self.buffer.add('Paris', 1700000000, 20.0, 50, 3.0)
+        self.buffer.flush()
+        self.assertEqual(len(self.written), 1)
+        self.buffer.flush()
+        self.assertEqual(len(self.written), 1)
+
+class HistoryRollupTests(TestCase):
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.start = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+
+    def observe(self, minutes, temp, humidity=50, wind=3.0, city='Paris'):
+        observed_at = int((self.start + timedelta(minutes=minutes)).timestamp())
+        history.write_batch({(city.lower(), observed_at): (city, temp, humidity, wind)})
+
+    def rollups(self, period):
+        return list(ObservationRollup.objects.filter(period=period).order_by('period_start')
+                    .values_list('period_start', 'temp_min', 'temp_max', 'temp_mean', 'samples'))
+
+    def test_hours_split_on_the_hour(self):
+        self.observe(0, 10.0)
+        self.observe(59, 14.0)
+        self.observe(60, 20.0)
+        self.assertEqual(history.rollup_hours(), 2)
+        hour = timedelta(hours=1)
+        self.assertEqual(self.rollups(ObservationRollup.HOUR),
+                         [(self.start, 10.0, 14.0, 12.0, 2), (self.start + hour, 20.0, 20.0, 20.0, 1)])
+
+    def test_days_weight_hours_by_their_samples(self):
+        for minutes, temp in ((0, 10.0), (30, 10.0), (50, 10.0), (23 * 60 + 59, 30.0), (24 * 60, 0.0)):
+            self.observe(minutes, temp)
+        history.rollup_hours()
+        self.assertEqual(history.rollup_days(), 2)
+        self.assertEqual(self.rollups(ObservationRollup.DAY),
+                         [(self.start, 10.0, 30.0, 15.0, 4), (self.start + timedelta(days=1), 0.0, 0.0, 0.0, 1)])
+
+    def test_late_observations_update_recent_rollups(self):
+        self.observe(0, 10.0)
+        history.rollup_hours()
+        self.observe(10, 20.0)
+        history.rollup_hours()
+        self.assertEqual(self.rollups(ObservationRollup.HOUR), [(self.start, 10.0, 20.0, 15.0, 2)])
+
+    @override_settings(WEATHER_HISTORY_RAW_DAYS=7, WEATHER_HISTORY_HOURLY_DAYS=90)
+    def test_prune_keeps_rows_at_the_retention_boundary(self):
+        self.observe(0, 10.0)
+        self.observe(1, 11.0)
+        history.rollup_hours()
+        history.rollup_days()
+        raw_cutoff = self.start + timedelta(days=7, minutes=1)
+        self.assertEqual(history.prune(now=raw_cutoff), (1, 0))
+        self.assertEqual(Observation.objects.get().temp, 11.0)
+        self.assertEqual(history.prune(now=self.start + timedelta(days=90)), (1, 0))
+        self.assertEqual(history.prune(now=self.start + timedelta(days=90, seconds=1)), (0, 1))
+        self.assertEqual(len(self.rollups(ObservationRollup.DAY)), 1)
+
+    @override_settings(WEATHER_HISTORY_ROLLUP_INTERVAL=3600)
+    def test_rollup_if_due_runs_once_per_interval(self):
+        self.observe(0, 10.0)
+        with mock.patch.object(snapshots, 'prune', return_value=0) as prune_snapshots:
+            self.assertTrue(history.rollup_if_due())
+            self.assertFalse(history.rollup_if_due())
+        prune_snapshots.assert_called_once_with()
+        # Summarized into a daily rollup, then pruned as past retention
+        self.assertEqual(len(self.rollups(ObservationRollup.DAY)), 1)
+        self.assertEqual(self.rollups(ObservationRollup.HOUR), [])
+        self.assertFalse(Observation.objects.exists())
+
+    @override_settings(WEATHER_HISTORY_ROLLUP_INTERVAL=0)
+    def test_rollup_if_due_can_be_left_to_cron(self):
+        self.observe(0, 10.0)
+        self.assertFalse(history.rollup_if_due())
+        self.assertEqual(ObservationRollup.objects.count(), 0)
+        self.assertEqual(City.objects.get().name, 'Paris')
+
+@override_settings(WEATHER_HISTORY_ENABLED=False, WEATHER_LOCATION_NEARBY_KM=0)
+class WeatherAPITests(WeatherCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.upstream = {'Paris': current_payload('Paris', temp=20.0), 'Rome': current_payload('Rome', temp=25.0)}
+        patcher = mock.patch.object(utils, '_request_json', side_effect=self.request_json)
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request_json(self, url, params, error_cod=500):
+        return self.upstream.get(params['q'], {'cod': '404', 'message': 'city not found'})
+
+    def test_current_weather_shape(self):
+        response = self.client.get('/api/weather/', {'city': 'Paris', 'units': 'imperial'})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(set(body), set(api.CURRENT_FIELDS) | {'units'})
+        self.assertEqual((body['city'], body['temp'], body['observed_at']), ('Paris', 68.0, 1700000000))
+        self.assertEqual(body['units'], {'temperature': '°F', 'wind_speed': 'mph', 'precipitation': 'in'})
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_fields_trim_the_result(self):
+        response = self.client.get('/api/weather/', {'city': 'Paris', 'fields': 'city, temp', 'units': 'metric'})
+        self.assertEqual(response.json(), {'city': 'Paris', 'temp': 20.0, 'units': {
+            'temperature': '°C', 'wind_speed': 'm/s', 'precipitation': 'mm'}})
+
+    def test_invalid_requests_are_rejected_without_calling_upstream(self):
+        for params, error in (
+            ({}, 'City name is required'),
+            ({'city': '  '}, 'City name is required'),
+            ({'city': '<>!'}, 'City name is required'),
+            ({'city': 'Paris', 'fields': 'temp,secret'}, 'Unknown fields: secret'),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get('/api/weather/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': error})
+        self.request.assert_not_called()
+
+    def test_upstream_errors_map_to_status_codes(self):
+        response = self.client.get('/api/weather/', {'city': 'Atlantis'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'city not found'})
+
+        self.upstream['Atlantis'] = {'cod': 429, 'message': 'Too many requests', 'retry_after': 30}
+        response = self.client.get('/api/weather/', {'city': 'Atlantis'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+        self.upstream['Atlantis'] = {'cod': 401, 'message': 'Invalid API key'}
+        self.assertEqual(self.client.get('/api/weather/', {'city': 'Atlantis'}).status_code, 502)
+
+    def test_batch_returns_one_result_per_distinct_city_in_order(self):
+        response = self.client.get('/api/weather/batch/', {
+            'city': ['Rome', 'Paris', ' rome', 'ROME'], 'fields': 'city,temp', 'units': 'metric'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'query': 'Rome', 'city': 'Rome', 'temp': 25.0},
+            {'query': 'Paris', 'city': 'Paris', 'temp': 20.0},
+        ])
+
+    def test_batch_reports_failed_cities_alongside_the_rest(self):
+        response = self.client.get('/api/weather/batch/', {'city': ['Paris', 'Atlantis'], 'fields': 'city'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'query': 'Paris', 'city': 'Paris'},
+            {'query': 'Atlantis', 'error': 'city not found'},
+        ])
+        self.assertNotIn('max-age=0', response['Cache-Control'])
+
+    def test_batch_with_only_failures_is_not_cached_by_clients(self):
+        response = self.client.get('/api/weather/batch/', {'city': 'Atlantis'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'query': 'Atlantis', 'error': 'city not found'}])
+        self.assertIn('max-age=0', response['Cache-Control'])
+
+    @override_settings(WEATHER_API_BATCH_MAX=2)
+    def test_batch_size_is_limited(self):
+        response = self.client.get('/api/weather/batch/', {'city': ['Paris', 'Rome', 'Oslo']})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'At most 2 cities per request'})
+        # Repeats count once
+        response = self.client.get('/api/weather/batch/', {'city': ['Paris', 'Rome', 'paris ']})
+        self.assertEqual(response.status_code, 200)
+        self.request.assert_called()
+
+    def test_batch_validation(self):
+        for params, error in (
+            ({}, 'At least one city is required'),
+            ({'city': ['', ' ', '!!']}, 'At least one city is required'),
+            ({'city': 'Paris', 'fields': 'nope'}, 'Unknown fields: nope'),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get('/api/weather/batch/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': error})
+        self.request.assert_not_called()
+
+class ToggleFavoriteTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='first-pass-42')
+        self.client.force_login(self.user)
+
+    def toggle(self, body):
+        return self.client.post('/toggle-favorite/', body, content_type='application/json')
+
+    def test_toggles_a_favorite(self):
+        self.assertEqual(self.toggle({'city': '  New   York '}).json(), {'status': 'added'})
+        self.assertEqual(self.user.favorite_cities, ['New York'])
+        self.assertEqual(self.toggle({'city': 'new york'}).json(), {'status': 'removed'})
+
+    def test_names_up_to_the_column_length_are_accepted(self):
+        self.assertEqual(self.toggle({'city': 'x' * 120}).status_code, 200)
+
+    def test_invalid_names_are_rejected(self):
+        for body in ({'city': 'x' * 121}, {'city': 'İ' * 61}, {'city': '   '}, {'city': 42}, {}, ['Paris']):
+            with self.subTest(body=body):
+                response = self.toggle(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.toggle('not json').status_code, 400)
+        self.assertEqual(City.objects.count(), 0)
+
+@override_settings(STORAGES=PAGE_STORAGES, WEATHER_LOCATION_NEARBY_KM=0, WEATHER_LOCATION_GRID=0.05)
+class LocationFragmentTests(TestCase):
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.cache_location(48.871, 2.331, current_payload('Paris', temp=20.0))
+
+    def cache_location(self, lat, lon, data):
+        entry = {'data': data, 'fetched_at': time.time()}
+        caching.get_cache().set(caching.make_key('location', utils.location_cell(lat, lon)), entry, 600)
+
+    def temperature(self, lat, lon):
+        response = self.client.get('/get-location-weather/', {'lat': lat, 'lon': lon})
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().split('class="temperature">')[1].split('<')[0]
+
+    def test_coordinates_in_one_grid_cell_share_the_details_fragment(self):
+        rendered = self.temperature(48.871, 2.331)
+        # Same observation time, so the fragment rendered for the cell is reused
+        self.cache_location(48.871, 2.331, current_payload('Paris', temp=30.0))
+        self.assertEqual(self.temperature(48.874, 2.339), rendered)
+
+    def test_other_cells_render_their_own_fragment(self):
+        self.cache_location(48.951, 2.331, current_payload('Paris', temp=30.0))
+        self.assertNotEqual(self.temperature(48.871, 2.331), self.temperature(48.951, 2.331))
+
+class CityAutocompleteTests(SimpleTestCase):
+
+    def setUp(self):
+        cities = [gazetteer.City(f'San Place {i}', 'XX', 0.0, 0.0, 1000 * i) for i in range(1, 15)]
+        cities += [
+            gazetteer.City('Santiago', 'CL', -33.45, -70.67, 6_000_000),
+            gazetteer.City('Sandnes', 'NO', 58.85, 5.74, 80_000),
+            gazetteer.City('New York', 'US', 40.71, -74.01, 8_000_000),
+            gazetteer.City('York', 'GB', 53.96, -1.08, 150_000),
+            gazetteer.City('São Paulo', 'BR', -23.55, -46.63, 12_000_000),
+        ]
+        patcher = mock.patch.object(gazetteer, '_gazetteer', gazetteer.Gazetteer(cities))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def complete(self, query, **params):
+        response = self.client.get('/api/cities/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [city['name'] for city in response.json()['results']]
+
+    def test_short_and_long_prefixes_are_ordered_by_population(self):
+        self.assertEqual(self.complete('sa', limit=3), ['São Paulo', 'Santiago', 'Sandnes'])
+        self.assertEqual(self.complete('sand'), ['Sandnes'])
+        self.assertEqual(self.complete('san p', limit=3), ['San Place 14', 'San Place 13', 'San Place 12'])
+
+    def test_prefixes_match_any_word_and_ignore_accents(self):
+        self.assertEqual(self.complete('york'), ['New York', 'York'])
+        self.assertEqual(self.complete('SAO'), ['São Paulo'])
+        self.assertEqual(self.complete('paulo'), ['São Paulo'])
+
+    def test_limit_is_capped(self):
+        self.assertEqual(len(self.complete('san', limit=50)), gazetteer.MAX_COMPLETIONS)
+        self.assertEqual(len(self.complete('san pl', limit=50)), gazetteer.MAX_COMPLETIONS)
+        self.assertEqual(self.complete('sa', limit=0), ['São Paulo'])
+        self.assertEqual(len(self.complete('san')), 5)
+
+    def test_invalid_limit_is_rejected(self):
+        response = self.client.get('/api/cities/', {'q': 'san', 'limit': 'many'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_names_fall_back_to_geocoding(self):
+        places = [{'name': f'Xqz {i}', 'country': 'NZ', 'lat': 0.0, 'lon': 0.0} for i in range(20)]
+        with mock.patch.object(utils, 'search_places', return_value=places) as search:
+            self.assertEqual(len(self.complete('xqz', limit=50)), gazetteer.MAX_COMPLETIONS)
+            self.assertEqual(self.complete('xq'), [])
+            self.assertEqual(self.complete('york'), ['New York', 'York'])
+        search.assert_called_once_with('xqz')
+
+class CrossWorkerLockTests(WeatherCacheTestCase):
+    """The short ``cache.add`` lock that keeps workers from fetching the same key at once."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(snapshots, 'asave')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lock_key = caching._lock_key(self.key)
+
+    def test_lock_is_released_after_a_fetch(self):
+        caching.cached_fetch(self.key, CountingFetcher(current_payload()), self.ttl)
+        self.assertIsNone(caching.get_cache().get(self.lock_key))
+
+    def test_lock_is_released_when_the_fetcher_fails(self):
+        def fail():
+            raise RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            caching.cached_fetch(self.key, fail, self.ttl)
+        self.assertIsNone(caching.get_cache().get(self.lock_key))
+
+    def test_refresh_skips_a_key_another_worker_is_fetching(self):
+        caching.get_cache().add(self.lock_key, 1, 15)
+        fetcher = CountingFetcher(current_payload())
+        self.assertIsNone(caching.refresh(self.key, fetcher, self.ttl))
+        self.assertEqual(fetcher.calls, 0)
+        caching.get_cache().delete(self.lock_key)
+        self.assertEqual(caching.refresh(self.key, fetcher, self.ttl)['name'], 'Paris')
+        self.assertEqual(fetcher.calls, 1)
+
+    def test_background_refresh_skips_a_key_another_worker_is_fetching(self):
+        stale = {'data': current_payload(temp=10.0), 'fetched_at': time.time() - self.ttl - 1}
+        caching.get_cache().set(self.key, stale, 600)
+        caching.get_cache().add(self.lock_key, 1, 15)
+        fetcher = CountingFetcher(current_payload(temp=30.0))
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl)['main']['temp'], 10.0)
+        join_refresh(self.key)
+        self.assertEqual(fetcher.calls, 0)
+        self.assertEqual(caching.get_cache().get(self.lock_key), 1)
+
+    @override_settings(WEATHER_LOCK_TIMEOUT=1)
+    def test_stops_waiting_for_a_lock_holder_that_never_finishes(self):
+        caching.get_cache().add(self.lock_key, 1, 15)
+        fetcher = CountingFetcher(current_payload(temp=30.0))
+        started = time.monotonic()
+        self.assertEqual(caching.cached_fetch(self.key, fetcher, self.ttl)['main']['temp'], 30.0)
+        self.assertLess(time.monotonic() - started, 3)
+        self.assertEqual(fetcher.calls, 1)
+
+    def test_async_fetch_waits_for_the_worker_holding_the_lock(self):
+        cache = caching.get_cache()
+        cache.add(self.lock_key, 1, 15)
+        entry = {'data': current_payload(temp=15.0), 'fetched_at': time.time()}
+        calls = []
+
+        async def fetcher():
+            calls.append(1)
+            return current_payload(temp=30.0)
+
+        async def run():
+            async def write_later():
+                await asyncio.sleep(0.2)
+                await cache.aset(self.key, entry, 600)
+            writer = asyncio.create_task(write_later())
+            data = await caching.acached_fetch(self.key, fetcher, self.ttl)
+            await writer
+            return data
+
+        self.assertEqual(asyncio.run(run())['main']['temp'], 15.0)
+        self.assertEqual(calls, [])
+
+@override_settings(WEATHER_STREAM_POLL=0, WEATHER_STREAM_DURATION=60)
+class FavoriteUpdatesTests(TestCase):
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='first-pass-42')
+        self.user.toggle_favorite_city('Paris')
+        self.user.toggle_favorite_city('Rome')
+
+    def cache_current(self, data):
+        entry = {'data': data, 'fetched_at': time.time()}
+        caching.get_cache().set(caching.make_key('current', data['name']), entry, 600)
+
+    def test_poll_returns_cached_favorites_only(self):
+        self.cache_current(current_payload('Paris', dt=1700000000))
+        self.client.force_login(self.user)
+        with mock.patch.object(utils, '_request_json') as request:
+            response = self.client.get('/favorites/updates/')
+        request.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual([update['city'] for update in response.json()['updates']], ['Paris'])
+
+    def test_poll_needs_a_signed_in_user(self):
+        self.assertEqual(self.client.get('/favorites/updates/').status_code, 401)
+
+    def test_stream_sends_each_city_once_then_only_changes(self):
+        self.cache_current(current_payload('Paris', dt=1700000000))
+
+        async def collect():
+            stream = async_views.favorite_updates(['Paris', 'Rome'], 'metric')
+            events = [await anext(stream), await anext(stream)]
+            self.assertEqual(await anext(stream), ': keep-alive\n\n')
+            # Nothing changed: the next poll only sends a keep-alive
+            self.assertEqual(await anext(stream), ': keep-alive\n\n')
+            self.cache_current(current_payload('Rome', dt=1700000600))
+            events.append(await anext(stream))
+            await stream.aclose()
+            return events
+
+        retry, paris, rome = asyncio.run(collect())
+        self.assertEqual(retry, 'retry: 0\n\n')
+        self.assertIn('"city": "Paris"', paris)
+        self.assertTrue(rome.startswith('event: update\n'))
+        self.assertIn('"observed_at": 1700000600', rome)
+
+class MetricsViewTests(SimpleTestCase):
+
+    @override_settings(WEATHER_METRICS_TOKEN='s3cret')
+    def test_token_is_required_when_set(self):
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}, {'HTTP_AUTHORIZATION': 's3cret'}):
+            with self.subTest(headers=headers):
+                response = self.client.get('/metrics', **headers)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.content, b'')
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'weather_request_duration_seconds', response.content)
+
+    @override_settings(WEATHER_METRICS_TOKEN=None)
+    def test_open_without_a_token(self):
+        metrics.record_cache_lookup('current', 'hit')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'weather_cache_requests_total{kind="current",result="hit"}', response.content)
+
+    @override_settings(WEATHER_METRICS_TOKEN=None)
+    def test_requests_are_timed_by_url_name(self):
+        self.client.get('/metrics')
+        body = self.client.get('/metrics').content
+        self.assertIn(b'weather_request_duration_seconds_count{method="GET",status="200",view="metrics"}', body)
+
+@override_settings(WEATHER_READINESS_TTL=0)
+class ReadinessTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, views.ReadinessView, 'last_result', None)
+        views.ReadinessView.last_result = None
+        for name, value in (('is_warm', True), ('warm_up_in_background', None)):
+            patcher = mock.patch.object(warmup, name, return_value=value)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def probe(self):
+        response = self.client.get('/readyz')
+        return response.status_code, response.json()
+
+    def test_ready_once_warm_with_database_and_cache(self):
+        self.assertEqual(self.probe(), (200, {'status': 'ready', 'checks': {
+            'warmup': 'ok', 'database': 'ok', 'cache': 'ok'}}))
+        self.warm_up_in_background.assert_not_called()
+
+    def test_not_ready_before_warm_up(self):
+        self.is_warm.return_value = False
+        status, body = self.probe()
+        self.assertEqual((status, body['checks']['warmup']), (503, 'pending'))
+        self.warm_up_in_background.assert_called_once_with()
+        self.is_warm.return_value = True
+        self.assertEqual(self.probe()[0], 200)
+
+    def test_not_ready_without_the_database(self):
+        with mock.patch.object(views.connection, 'cursor', side_effect=DatabaseError('down')):
+            status, body = self.probe()
+        self.assertEqual((status, body['status']), (503, 'unavailable'))
+        self.assertEqual(body['checks']['database'], 'unavailable')
+
+    def test_not_ready_without_the_cache(self):
+        broken = mock.Mock(get=mock.Mock(side_effect=ConnectionError('redis down')))
+        with mock.patch.object(caching, 'get_cache', return_value=broken):
+            status, body = self.probe()
+        self.assertEqual((status, body['checks']['cache']), (503, 'unavailable'))
+
+    @override_settings(WEATHER_READINESS_TTL=60)
+    def test_result_is_reused_for_the_ttl(self):
+        self.assertEqual(self.probe()[0], 200)
+        self.is_warm.return_value = False
+        self.assertEqual(self.probe()[0], 200)
+        views.ReadinessView.last_result = None
+        self.assertEqual(self.probe()[0], 503)
+
+class WarmUpTests(SimpleTestCase):
+
+    def setUp(self):
+        for name, value in (('_done', threading.Event()), ('_started', False)):
+            patcher = mock.patch.object(warmup, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_warm_up_marks_the_process_warm(self):
+        self.assertFalse(warmup.is_warm())
+        with mock.patch.object(warmup, 'staticfiles_storage'):
+            warmup.warm_up()
+        self.assertTrue(warmup.is_warm())
+
+    def test_background_warm_up_starts_once(self):
+        started = threading.Event()
+        with mock.patch.object(warmup, 'warm_up', side_effect=started.set) as warm_up:
+            warmup.warm_up_in_background()
+            warmup.warm_up_in_background()
+            self.assertTrue(started.wait(5))
+        warm_up.assert_called_once_with()
@@ -0,0 +1,153 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from . import metrics, ratelimit, upstream
+
+logger = logging.getLogger(__name__)
+
+TILE_URL = settings.OPENWEATHER_TILE_URL + '/{layer}/{z}/{x}/{y}.png'
+
+# Public layer names mapped to OpenWeather tile layers
+LAYERS = {
+    'clouds': 'clouds_new',
+    'precipitation': 'precipitation_new',
+    'temp': 'temp_new',
+    'wind': 'wind_new',
+}
+
+MAX_ZOOM = 18
+
+# Evict down to this fraction of the size limit so eviction is not run per write
+EVICT_TO = 0.9
+
+class TileCache:
+    """
+    Size-bounded on-disk LRU cache for map tiles.
+
+    Tiles live at ``<root>/<layer>/<z>/<x>/<y>.png``. A tile's mtime records
+    when it was fetched and is used for expiry; its atime is bumped on every
+    hit and is used to pick eviction victims. Several processes may share one
+    directory: each keeps an approximate size count and rescans the directory
+    before evicting.
+    """
+
+    def __init__(self, root, max_bytes, ttl):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._size = None
+
+    def path(self, layer, z, x, y):
+        return self.root / layer / str(z) / str(x) / f'{y}.png'
+
+    def lookup(self, layer, z, x, y):
+        """Return ``(path, stat)`` for a fresh cached tile, or ``None``."""
+        path = self.path(layer, z, x, y)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            metrics.record_cache_lookup('tile', 'miss')
+            return None
+        if time.time() - stat.st_mtime >= self.ttl:
+            metrics.record_cache_lookup('tile', 'stale')
+            return None
+        metrics.record_cache_lookup('tile', 'hit')
+        try:
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            pass
+        return path, stat
+
+    def peek(self, layer, z, x, y):
+        """Return ``(path, stat)`` for a cached tile whatever its age, or ``None``."""
+        path = self.path(layer, z, x, y)
+        try:
+            return path, path.stat()
+        except FileNotFoundError:
+            return None
+
+    def store(self, layer, z, x, y, content):
+        """Atomically write a tile and evict old tiles if over the limit."""
+        path = self.path(layer, z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            self._size += len(content)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path, path.stat()
+
+    def _tiles(self):
+        return (path for path in self.root.rglob('*.png') if path.is_file())
+
+    def _scan_size(self):
+        return sum(path.stat().st_size for path in self._tiles())
+
+    def _evict(self):
+        tiles = []
+        for path in self._tiles():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            tiles.append((stat.st_atime, stat.st_size, path))
+        tiles.sort()
+
+        size = sum(tile_size for _, tile_size, _ in tiles)
+        target = self.max_bytes * EVICT_TO
+        evicted = 0
+        for _, tile_size, path in tiles:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= tile_size
+            evicted += 1
+        self._size = size
+        logger.info(f'Evicted {evicted} map tiles, cache is now {size} bytes')
+
+def etag_for(stat):
+    """Build an ETag from a cached tile's fetch time and size."""
+    return f'"{int(stat.st_mtime)}-{stat.st_size}"'
+
+def fetch_tile(layer, z, x, y):
+    """Fetch a tile from OpenWeather, returning its bytes or ``None``."""
+    url = TILE_URL.format(layer=LAYERS[layer], z=z, x=x, y=y)
+    try:
+        with ratelimit.priority(ratelimit.AUXILIARY):
+            response = upstream.get(url, params={'appid': settings.WEATHER_API_KEY}, endpoint='tile')
+        response.raise_for_status()
+        return response.content
+    except Exception as err:
+        logger.error(f'Error fetching map tile {layer}/{z}/{x}/{y}: {err}')
+        return None
+
+_tile_cache = None
+_tile_cache_lock = threading.Lock()
+
+def get_tile_cache():
+    """Return the process-wide tile cache."""
+    global _tile_cache
+    if _tile_cache is None:
+        with _tile_cache_lock:
+            if _tile_cache is None:
+                _tile_cache = TileCache(
+                    settings.WEATHER_TILE_CACHE_DIR,
+                    settings.WEATHER_TILE_CACHE_MAX_BYTES,
+                    settings.WEATHER_TILE_TTL,
+                )
+    return _tile_cache
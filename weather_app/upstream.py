@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from . import metrics, ratelimit
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying; anything else is returned to the caller as-is
+RETRY_STATUSES = {502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is rejecting upstream calls."""
+
+class CircuitBreaker:
+    """
+    Stops calling upstream after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects calls for ``reset_timeout`` seconds. The first call after that is
+    let through as a trial; its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpenError('Upstream circuit breaker is open')
+            self._trial_in_flight = True
+
+    def cancel_call(self):
+        """Release the trial slot of a call abandoned before reaching upstream."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f'Opening upstream circuit breaker after {self._failures} failures')
+                self._opened_at = time.monotonic()
+
+def _can_retry(attempt, retries, deadline):
+    return attempt < retries and time.monotonic() < deadline
+
+def _remaining(deadline):
+    # Never hand a client a zero or negative timeout
+    return max(deadline - time.monotonic(), 0.1)
+
+class UpstreamClient:
+    """
+    Shared HTTP client for OpenWeather with pooling, timeouts and retries.
+
+    Only attempts that never reached upstream (connection errors, connect
+    timeouts) and 502/503/504 answers are retried; a read timeout already
+    cost a full ``read_timeout`` and is not repeated. A whole call, retries
+    included, is cut off after ``deadline`` seconds so it ends well within
+    the gunicorn worker timeout.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10, retries=2,
+                 backoff=0.3, pool_size=20, breaker=None, limiter=None, deadline=20):
+        self.timeout = (connect_timeout, read_timeout)
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        # Called before every attempt; raises to refuse the call
+        self.limiter = limiter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter keeps retries from different workers from lining up
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def get(self, url, params=None):
+        """
+        Send a GET request upstream and return the response.
+
+        Raises ``CircuitOpenError`` without touching the network while the
+        breaker is open, whatever the limiter raises when it refuses an
+        attempt, connection errors once the retries or the deadline are used
+        up, and read timeouts straight away. Every other error counts as a failure too, so a trial call
+        never leaves the breaker stuck open.
+        """
+        self.breaker.before_call()
+        deadline = time.monotonic() + self.deadline
+        in_limiter = False
+        try:
+            for attempt in range(self.retries + 1):
+                if self.limiter is not None:
+                    in_limiter = True
+                    self.limiter()
+                    in_limiter = False
+                remaining = _remaining(deadline)
+                timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+                try:
+                    response = self.session.get(url, params=params, timeout=timeout)
+                except requests.exceptions.ConnectionError:
+                    # Includes connect timeouts, but not read timeouts
+                    if not _can_retry(attempt, self.retries, deadline):
+                        raise
+                    self._sleep_before_retry(attempt)
+                    continue
+                if response.status_code in RETRY_STATUSES and _can_retry(attempt, self.retries, deadline):
+                    self._sleep_before_retry(attempt)
+                    continue
+                break
+        except Exception:
+            # A refused attempt never reached upstream, so it says nothing about it
+            if in_limiter:
+                self.breaker.cancel_call()
+            else:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Interrupted before an outcome; free the trial slot without a verdict
+            self.breaker.cancel_call()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+class AsyncUpstreamClient:
+    """Non-blocking counterpart of ``UpstreamClient`` built on httpx."""
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10, retries=2,
+                 backoff=0.3, pool_size=20, breaker=None, limiter=None, deadline=20):
+        self.timeout = (connect_timeout, read_timeout)
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        # Awaited before every attempt; raises to refuse the call
+        self.limiter = limiter
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def _sleep_before_retry(self, attempt):
+        await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    async def get(self, url, params=None):
+        """Async version of ``UpstreamClient.get``."""
+        self.breaker.before_call()
+        deadline = time.monotonic() + self.deadline
+        in_limiter = False
+        try:
+            for attempt in range(self.retries + 1):
+                if self.limiter is not None:
+                    in_limiter = True
+                    await self.limiter()
+                    in_limiter = False
+                remaining = _remaining(deadline)
+                timeout = httpx.Timeout(min(self.timeout[1], remaining), connect=min(self.timeout[0], remaining))
+                try:
+                    response = await self.client.get(url, params=params, timeout=timeout)
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    if not _can_retry(attempt, self.retries, deadline):
+                        raise
+                    await self._sleep_before_retry(attempt)
+                    continue
+                if response.status_code in RETRY_STATUSES and _can_retry(attempt, self.retries, deadline):
+                    await self._sleep_before_retry(attempt)
+                    continue
+                break
+        except Exception:
+            if in_limiter:
+                self.breaker.cancel_call()
+            else:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Includes asyncio.CancelledError when the client goes away
+            self.breaker.cancel_call()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+_breaker = None
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+
+def get_breaker():
+    """Return the circuit breaker shared by the sync and async clients."""
+    global _breaker
+    if _breaker is None:
+        with _client_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    failure_threshold=settings.WEATHER_UPSTREAM_BREAKER_THRESHOLD,
+                    reset_timeout=settings.WEATHER_UPSTREAM_BREAKER_RESET,
+                )
+    return _breaker
+
+def _client_options():
+    return {
+        'connect_timeout': settings.WEATHER_UPSTREAM_CONNECT_TIMEOUT,
+        'read_timeout': settings.WEATHER_UPSTREAM_READ_TIMEOUT,
+        'retries': settings.WEATHER_UPSTREAM_RETRIES,
+        'backoff': settings.WEATHER_UPSTREAM_BACKOFF,
+        'pool_size': settings.WEATHER_UPSTREAM_POOL_SIZE,
+        'deadline': settings.WEATHER_UPSTREAM_DEADLINE,
+        'breaker': get_breaker(),
+    }
+
+def get_client():
+    """Return the process-wide upstream client, creating it on first use."""
+    global _client
+    if _client is None:
+        options = _client_options()
+        with _client_lock:
+            if _client is None:
+                _client = UpstreamClient(limiter=ratelimit.acquire, **options)
+    return _client
+
+def get_async_client():
+    """Return the async upstream client for the running event loop."""
+    # httpx connection pools are bound to the loop that created them
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncUpstreamClient(limiter=ratelimit.aacquire, **_client_options())
+    return client
+
+def _endpoint_name(url):
+    # '.../data/2.5/weather' -> 'weather'
+    return urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1]
+
+def _error_status(err):
+    if isinstance(err, ratelimit.BudgetExhaustedError):
+        return 'refused'
+    if isinstance(err, CircuitOpenError):
+        return 'circuit_open'
+    return 'error'
+
+def get(url, params=None, endpoint=None):
+    """Send a GET request through the shared upstream client."""
+    endpoint = endpoint or _endpoint_name(url)
+    started = time.perf_counter()
+    try:
+        response = get_client().get(url, params=params)
+    except Exception as err:
+        metrics.record_upstream_call(endpoint, _error_status(err), time.perf_counter() - started)
+        raise
+    metrics.record_upstream_call(endpoint, response.status_code, time.perf_counter() - started)
+    if response.status_code == 429:
+        ratelimit.exhaust()
+    return response
+
+async def aget(url, params=None, endpoint=None):
+    """Send a GET request through the async upstream client."""
+    endpoint = endpoint or _endpoint_name(url)
+    started = time.perf_counter()
+    try:
+        response = await get_async_client().get(url, params=params)
+    except Exception as err:
+        metrics.record_upstream_call(endpoint, _error_status(err), time.perf_counter() - started)
+        raise
+    metrics.record_upstream_call(endpoint, response.status_code, time.perf_counter() - started)
+    if response.status_code == 429:
+        await ratelimit.aexhaust()
+    return response
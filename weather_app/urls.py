@@ -1,14 +1,40 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# Serve the weather pages from async views when running under an ASGI server
+if settings.WEATHER_ASYNC_VIEWS:
+    weather_view = async_views.AsyncWeatherView
+    forecast_view = async_views.AsyncForecastView
+    location_weather_view = async_views.AsyncLocationWeatherView
+else:
+    weather_view = views.WeatherView
+    forecast_view = views.ForecastView
+    location_weather_view = views.LocationWeatherView
 
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
     path('register/', views.RegisterView.as_view(), name='register'),
     path('login/', views.LoginView.as_view(), name='login'),
     path('logout/', views.CustomLogoutView.as_view(), name='logout'),
-    path('weather/', views.WeatherView.as_view(), name='weather'),
-    path('forecast/', views.ForecastView.as_view(), name='forecast'),
-    path('get-location-weather/', views.LocationWeatherView.as_view(), name='location_weather'),
+    path('weather/', weather_view.as_view(), name='weather'),
+    path('forecast/', forecast_view.as_view(), name='forecast'),
+    path('get-location-weather/', location_weather_view.as_view(), name='location_weather'),
     path('toggle-favorite/', views.ToggleFavoriteView.as_view(), name='toggle_favorite'),
+    path('favorites/updates/', views.FavoritesUpdatesView.as_view(), name='favorites_updates'),
     path('set-units/', views.SetUnitsView.as_view(), name='set_units'),
+    path('api/weather/', api.CurrentWeatherAPIView.as_view(), name='api_weather'),
+    path('api/weather/batch/', api.BatchWeatherAPIView.as_view(), name='api_weather_batch'),
+    path('api/location-weather/', api.LocationWeatherAPIView.as_view(), name='api_location_weather'),
+    path('api/forecast/', api.ForecastAPIView.as_view(), name='api_forecast'),
+    path('api/history/', api.HistoryAPIView.as_view(), name='api_history'),
+    path('api/cities/', views.CityAutocompleteView.as_view(), name='city_autocomplete'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+    path('readyz', views.ReadinessView.as_view(), name='readiness'),
+    path('tiles/<str:layer>/<int:z>/<int:x>/<int:y>.png', views.TileProxyView.as_view(), name='map_tile'),
 ]
+
+# A stream holds its connection open, which would tie up a whole sync worker
+if settings.WEATHER_ASYNC_VIEWS:
+    urlpatterns.append(
+        path('favorites/stream/', async_views.FavoritesStreamView.as_view(), name='favorites_stream'))
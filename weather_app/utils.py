@@ -1,124 +1,392 @@
 import os
+import asyncio
+import contextvars
+import httpx
 import requests
 import json
 import logging
-from difflib import get_close_matches
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from . import caching, gazetteer, geo, history, metrics, ratelimit, upstream
 
 logger = logging.getLogger(__name__)
 
-def get_current_weather(city, units='imperial'):
-    """Get current weather for a city."""
+# Upstream data is always fetched in metric and converted locally for display
+CANONICAL_UNITS = 'metric'
+
+CURRENT_WEATHER_URL = f'{settings.OPENWEATHER_BASE_URL}/weather'
+FORECAST_URL = f'{settings.OPENWEATHER_BASE_URL}/forecast'
+GEO_DIRECT_URL = f'{settings.OPENWEATHER_GEO_URL}/direct'
+
+RATE_LIMITED_MESSAGE = 'The weather service is busy right now. Please try again in a minute.'
+
+def _rate_limited(retry_after):
+    logger.warning(f'Upstream call budget exhausted, refusing call for {retry_after}s')
+    return {'cod': 429, 'message': RATE_LIMITED_MESSAGE, 'retry_after': retry_after}
+
+def is_rate_limited(data):
+    """Return True for error payloads caused by the upstream call limit."""
+    return str(data.get('cod')) == '429'
+
+def _request_json(url, params, error_cod=500):
+    """Send a GET request upstream and return the JSON body or an error dict."""
     try:
-        api_key = os.getenv('API_KEY')
-        url = f'http://api.openweathermap.org/data/2.5/weather'
-        params = {
-            'q': city,
-            'appid': api_key,
-            'units': units
-        }
-        response = requests.get(url, params=params)
+        response = upstream.get(url, params=params)
         response.raise_for_status()  # Raise exception for 4XX and 5XX status codes
         return response.json()
     except requests.exceptions.HTTPError as http_err:
         logger.error(f'HTTP error occurred: {http_err}')
         return {'cod': response.status_code, 'message': str(http_err)}
+    except ratelimit.BudgetExhaustedError as err:
+        return _rate_limited(err.retry_after)
     except Exception as err:
         logger.error(f'Error occurred: {err}')
-        return {'cod': 500, 'message': str(err)}
+        return {'cod': error_cod, 'message': str(err)}
 
-def get_location_weather(lat, lon, units='imperial'):
-    """Get weather for specific coordinates."""
+async def _arequest_json(url, params, error_cod=500):
+    """Async version of ``_request_json`` using the non-blocking client."""
     try:
-        api_key = os.getenv('API_KEY')
-        url = f'http://api.openweathermap.org/data/2.5/weather'
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': api_key,
-            'units': units
-        }
-        response = requests.get(url, params=params)
+        response = await upstream.aget(url, params=params)
         response.raise_for_status()
         return response.json()
-    except requests.exceptions.HTTPError as http_err:
+    except httpx.HTTPStatusError as http_err:
         logger.error(f'HTTP error occurred: {http_err}')
         return {'cod': response.status_code, 'message': str(http_err)}
+    except ratelimit.BudgetExhaustedError as err:
+        return _rate_limited(err.retry_after)
     except Exception as err:
         logger.error(f'Error occurred: {err}')
-        return {'cod': 500, 'message': str(err)}
+        return {'cod': error_cod, 'message': str(err)}
+
+def _city_params(city):
+    return {
+        'q': city,
+        'appid': os.getenv('API_KEY'),
+        'units': CANONICAL_UNITS
+    }
+
+def _location_params(lat, lon):
+    return {
+        'lat': lat,
+        'lon': lon,
+        'appid': os.getenv('API_KEY'),
+        'units': CANONICAL_UNITS
+    }
+
+def get_current_weather(city):
+    """Get current weather for a city, served from the shared cache when fresh."""
+    key = caching.make_key('current', city)
+    data = caching.cached_fetch(key, lambda: _fetch_current_weather(city), settings.WEATHER_CURRENT_TTL)
+    _remember_city(key, data)
+    return data
+
+def _remember_city(key, data):
+    """Index where a city observation lies so coordinate lookups nearby can reuse it."""
+    if settings.WEATHER_LOCATION_NEARBY_KM and data.get('cod') == 200:
+        geo.get_index().add(key, data['coord']['lat'], data['coord']['lon'])
+
+def _fetch_current_weather(city):
+    """Fetch current weather for a city from OpenWeather."""
+    data = _request_json(CURRENT_WEATHER_URL, _city_params(city))
+    history.record(data)
+    return data
+
+async def _afetch_current_weather(city):
+    """Async version of ``_fetch_current_weather``."""
+    data = await _arequest_json(CURRENT_WEATHER_URL, _city_params(city))
+    history.record(data)
+    return data
+
+def refresh_current_weather(city):
+    """Re-fetch current weather for a city into the shared cache, ignoring freshness."""
+    return caching.refresh(
+        caching.make_key('current', city),
+        lambda: _fetch_current_weather(city),
+        settings.WEATHER_CURRENT_TTL,
+    )
+
+async def aget_current_weather(city):
+    """Async version of ``get_current_weather``."""
+    key = caching.make_key('current', city)
+    data = await caching.acached_fetch(key, lambda: _afetch_current_weather(city), settings.WEATHER_CURRENT_TTL)
+    _remember_city(key, data)
+    return data
+
+def get_current_weather_many(cities):
+    """
+    Get current weather for several cities concurrently.
+
+    Returns a dict mapping each city to its payload. Lookups run on a bounded
+    thread pool, so the total latency tracks the slowest city rather than the
+    sum of all of them.
+    """
+    cities = list(dict.fromkeys(cities))
+    if len(cities) <= 1:
+        return {city: get_current_weather(city) for city in cities}
+
+    workers = min(len(cities), settings.WEATHER_FETCH_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Run each lookup in a copy of the caller's context so its call
+        # priority and per-request metrics carry over to the pool threads
+        futures = [
+            executor.submit(contextvars.copy_context().run, _get_current_weather_in_thread, city)
+            for city in cities
+        ]
+        return {city: future.result() for city, future in zip(cities, futures)}
 
-def get_forecast(city, units='imperial'):
-    """Get 5-day forecast for a city."""
+def _get_current_weather_in_thread(city):
     try:
-        api_key = os.getenv('API_KEY')
-        url = f'http://api.openweathermap.org/data/2.5/forecast'
-        params = {
-            'q': city,
-            'appid': api_key,
-            'units': units
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as http_err:
-        logger.error(f'HTTP error occurred: {http_err}')
-        return {'cod': response.status_code, 'message': str(http_err)}
-    except Exception as err:
-        logger.error(f'Error occurred: {err}')
-        return {'cod': '500', 'message': str(err)}
+        return get_current_weather(city)
+    finally:
+        # Close the connection a snapshot read or write opened in this pool thread
+        connections.close_all()
+
+async def aget_current_weather_many(cities):
+    """Async version of ``get_current_weather_many`` bounded by a semaphore."""
+    cities = list(dict.fromkeys(cities))
+    semaphore = asyncio.Semaphore(settings.WEATHER_FETCH_WORKERS)
+
+    async def fetch(city):
+        async with semaphore:
+            return await aget_current_weather(city)
+
+    results = await asyncio.gather(*(fetch(city) for city in cities))
+    return dict(zip(cities, results))
+
+def peek_observed_at_many(cities):
+    """Observation time of the cached current weather for each city, ``None`` if not cached."""
+    keys = {city: caching.make_key('current', city) for city in cities}
+    cached = caching.peek_many(list(keys.values()))
+    return {city: cached.get(key, {}).get('dt') for city, key in keys.items()}
+
+def peek_current_weather_many(cities):
+    """Cached current weather for the given cities, skipping any not in the cache."""
+    keys = {caching.make_key('current', city): city for city in cities}
+    cached = caching.peek_many(list(keys))
+    return {keys[key]: data for key, data in cached.items()}
+
+async def apeek_current_weather_many(cities):
+    """Async version of ``peek_current_weather_many``."""
+    keys = {caching.make_key('current', city): city for city in cities}
+    cached = await caching.apeek_many(list(keys))
+    return {keys[key]: data for key, data in cached.items()}
+
+def location_cell(lat, lon):
+    """Cache identity of the grid cell a coordinate is snapped to."""
+    return geo.cell_id(geo.grid_cell(lat, lon))
+
+def get_location_weather(lat, lon):
+    """
+    Get weather for specific coordinates, served from the shared cache when fresh.
+
+    Coordinates are snapped to a ``WEATHER_LOCATION_GRID`` cell, so everyone
+    within the same cell shares one cache entry.
+    """
+    cell = geo.grid_cell(lat, lon)
+    return caching.cached_fetch(
+        caching.make_key('location', geo.cell_id(cell)),
+        lambda: _fetch_location_weather(cell),
+        settings.WEATHER_CURRENT_TTL,
+    )
+
+def _nearby_city_keys(cell):
+    if not settings.WEATHER_LOCATION_NEARBY_KM:
+        return []
+    return geo.get_index().nearest(*geo.cell_center(cell), settings.WEATHER_LOCATION_NEARBY_KM)
+
+def _nearest_fresh(keys, cached):
+    for key in keys:
+        if key in cached:
+            metrics.record_cache_lookup('location', 'nearby')
+            return cached[key]
+    return None
+
+def _fetch_location_weather(cell):
+    """
+    Weather for a grid cell: a fresh cached observation of a city within
+    ``WEATHER_LOCATION_NEARBY_KM`` of its center, else OpenWeather's.
+    """
+    keys = _nearby_city_keys(cell)
+    if keys:
+        nearby = _nearest_fresh(keys, caching.peek_fresh(keys, settings.WEATHER_CURRENT_TTL))
+        if nearby is not None:
+            return nearby
+    return _request_json(CURRENT_WEATHER_URL, _location_params(*geo.cell_center(cell)))
+
+async def _afetch_location_weather(cell):
+    """Async version of ``_fetch_location_weather``."""
+    keys = _nearby_city_keys(cell)
+    if keys:
+        nearby = _nearest_fresh(keys, await caching.apeek_fresh(keys, settings.WEATHER_CURRENT_TTL))
+        if nearby is not None:
+            return nearby
+    return await _arequest_json(CURRENT_WEATHER_URL, _location_params(*geo.cell_center(cell)))
+
+async def aget_location_weather(lat, lon):
+    """Async version of ``get_location_weather``."""
+    cell = geo.grid_cell(lat, lon)
+    return await caching.acached_fetch(
+        caching.make_key('location', geo.cell_id(cell)),
+        lambda: _afetch_location_weather(cell),
+        settings.WEATHER_CURRENT_TTL,
+    )
+
+def get_forecast(city):
+    """Get 5-day forecast for a city, served from the shared cache when fresh."""
+    return caching.cached_fetch(
+        caching.make_key('forecast', city),
+        lambda: _fetch_forecast(city),
+        settings.WEATHER_FORECAST_TTL,
+    )
+
+def _fetch_forecast(city):
+    """Fetch 5-day forecast for a city from OpenWeather."""
+    return _request_json(FORECAST_URL, _city_params(city), error_cod='500')
+
+async def aget_forecast(city):
+    """Async version of ``get_forecast``."""
+    return await caching.acached_fetch(
+        caching.make_key('forecast', city),
+        lambda: _arequest_json(FORECAST_URL, _city_params(city), error_cod='500'),
+        settings.WEATHER_FORECAST_TTL,
+    )
+
+def _ttl(kind):
+    return settings.WEATHER_FORECAST_TTL if kind == 'forecast' else settings.WEATHER_CURRENT_TTL
+
+def expires_in(kind, *parts):
+    """
+    Seconds until a cached lookup is due for a refresh, e.g.
+    ``expires_in('current', city)`` or ``expires_in('location', location_cell(lat, lon))``.
+    """
+    return caching.expires_in(caching.make_key(kind, *parts), _ttl(kind))
+
+def expires_in_many(kind, queries):
+    """Seconds until the first of several cached lookups is due for a refresh."""
+    keys = [caching.make_key(kind, query) for query in queries]
+    return caching.expires_in_many(keys, _ttl(kind))
+
+async def aexpires_in(kind, *parts):
+    """Async version of ``expires_in``."""
+    return await caching.aexpires_in(caching.make_key(kind, *parts), _ttl(kind))
+
+def _geo_params(query):
+    return {
+        'q': query,
+        'limit': 5,
+        'appid': os.getenv('API_KEY'),
+    }
+
+def _places(data):
+    # The geocoding API answers with a bare list; wrap it so it caches like
+    # other payloads, including an empty result for an unknown name
+    if not isinstance(data, list):
+        return data
+    return {
+        'cod': 200,
+        'places': [
+            {'name': item['name'], 'country': item.get('country', ''), 'lat': item['lat'], 'lon': item['lon']}
+            for item in data
+        ],
+    }
+
+def search_places(query):
+    """
+    Cities matching ``query`` from OpenWeather's geocoding API, for names the
+    bundled gazetteer does not know. Cached, and drawn from the upstream
+    budget at auxiliary priority; returns ``[]`` when upstream is unavailable.
+    """
+    with ratelimit.priority(ratelimit.AUXILIARY):
+        data = caching.cached_fetch(
+            caching.make_key('geo', query),
+            lambda: _places(_request_json(GEO_DIRECT_URL, _geo_params(query))),
+            settings.WEATHER_GEO_TTL,
+        )
+    return data.get('places', []) if data.get('cod') == 200 else []
+
+async def asearch_places(query):
+    """Async version of ``search_places``."""
+    async def fetch():
+        return _places(await _arequest_json(GEO_DIRECT_URL, _geo_params(query)))
+
+    with ratelimit.priority(ratelimit.AUXILIARY):
+        data = await caching.acached_fetch(caching.make_key('geo', query), fetch, settings.WEATHER_GEO_TTL)
+    return data.get('places', []) if data.get('cod') == 200 else []
+
+def _suggestions(names):
+    return list(dict.fromkeys(names))  # Remove duplicates while preserving order
 
 def get_city_suggestions(city):
-    """Get similar city name suggestions."""
-    common_cities = [
-        'London', 'New York', 'Tokyo', 'Paris', 'Sydney', 'Singapore', 'Dubai',
-        'Berlin', 'Madrid', 'Rome', 'Moscow', 'Beijing', 'Mumbai', 'Seoul',
-        'Toronto', 'Los Angeles', 'Chicago', 'Miami', 'Vancouver', 'Melbourne',
-        'Amsterdam', 'Barcelona', 'Vienna', 'San Francisco', 'Seattle',
-        'Hong Kong', 'Bangkok', 'Istanbul', 'Rio de Janeiro', 'Mexico City'
-    ]
-    
-    # Get close matches from common cities
-    matches = get_close_matches(city, common_cities, n=5, cutoff=0.6)
-    
-    # If no matches found, try searching with OpenWeather API
-    if not matches:
-        try:
-            api_key = os.getenv('API_KEY')
-            url = 'http://api.openweathermap.org/geo/1.0/direct'
-            params = {
-                'q': city,
-                'limit': 5,
-                'appid': api_key
-            }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extract city names from API response
-            api_suggestions = [f"{item['name']}, {item.get('country', '')}" for item in data]
-            matches.extend(api_suggestions)
-            
-        except Exception as err:
-            logger.error(f'Error getting city suggestions: {err}')
-    
-    return list(dict.fromkeys(matches))  # Remove duplicates while preserving order
+    """Get similar city name suggestions from the bundled gazetteer, else from OpenWeather."""
+    matches = gazetteer.get_gazetteer().search(city, limit=5)
+    if matches:
+        return _suggestions(f"{match.name}, {match.country}" for match in matches)
+    return _suggestions(f"{place['name']}, {place['country']}" for place in search_places(city))
+
+async def aget_city_suggestions(city):
+    """Async version of ``get_city_suggestions``."""
+    matches = gazetteer.get_gazetteer().search(city, limit=5)
+    if matches:
+        return _suggestions(f"{match.name}, {match.country}" for match in matches)
+    return _suggestions(f"{place['name']}, {place['country']}" for place in await asearch_places(city))
 
 def sanitize_city_name(city):
     """Clean and validate city name."""
     if not city:
         return ''
     
-    # Remove special characters and extra spaces
-    clean_city = ''.join(c for c in city if c.isalnum() or c.isspace() or c == '-')
+    # Remove special characters and extra spaces; commas separate the country code
+    clean_city = ''.join(c for c in city if c.isalnum() or c.isspace() or c in '-,')
     clean_city = ' '.join(clean_city.split())
     
     return clean_city
 
+def convert_temperature(temp, units='imperial'):
+    """Convert a canonical (Celsius) temperature to the requested units."""
+    temp = float(temp)
+    if units == 'imperial':
+        return temp * 9 / 5 + 32
+    return temp
+
 def format_temperature(temp, units='imperial'):
-    """Format temperature with proper unit symbol."""
+    """Format a canonical (Celsius) temperature with proper unit symbol."""
     try:
-        temp = float(temp)
+        temp = convert_temperature(temp, units)
         unit_symbol = '°F' if units == 'imperial' else '°C'
         return f"{temp:.1f}{unit_symbol}"
     except (ValueError, TypeError):
         return 'N/A'
+
+def convert_wind_speed(speed, units='imperial'):
+    """Convert a canonical (m/s) wind speed to the requested units."""
+    speed = float(speed)
+    if units == 'imperial':
+        return speed * 2.2369362920544
+    return speed
+
+def format_wind_speed(speed, units='imperial'):
+    """Format a canonical (m/s) wind speed with proper unit label."""
+    try:
+        speed = convert_wind_speed(speed, units)
+        unit_label = 'mph' if units == 'imperial' else 'm/s'
+        return f"{speed:.1f} {unit_label}"
+    except (ValueError, TypeError):
+        return 'N/A'
+
+def convert_precipitation(amount, units='imperial'):
+    """Convert a canonical (mm) precipitation amount to the requested units."""
+    amount = float(amount)
+    if units == 'imperial':
+        return amount / 25.4
+    return amount
+
+def format_precipitation(amount, units='imperial'):
+    """Format a canonical (mm) precipitation amount with proper unit label."""
+    try:
+        amount = convert_precipitation(amount, units)
+        if units == 'imperial':
+            return f"{amount:.2f} in"
+        return f"{amount:.1f} mm"
+    except (ValueError, TypeError):
+        return 'N/A'
@@ -1,48 +1,201 @@
+from django.conf import settings
 from django.views.generic import View, TemplateView
 from django.contrib.auth.views import LoginView as BaseLoginView, LogoutView as BaseLogoutView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.cache import cache_control, never_cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_etags
 from django.urls import reverse_lazy, reverse
-from datetime import datetime
-from django.db import transaction
-from . import utils
-from .models import User
+from datetime import date, datetime
+from django.db import DatabaseError, connection, transaction
+from . import caching, forecast, gazetteer, metrics, snapshots, tiles, utils, warmup
+from .models import City, User, normalize_city_name
+import hashlib
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-def get_units_from_session(request):
-    """Helper function to get units from session with default to imperial."""
-    return request.session.get('units', 'imperial')
+# The units preference lives in a signed cookie rather than the session, so
+# reading or changing it never touches the session table
+UNITS_COOKIE = 'units'
+UNITS_COOKIE_SALT = 'weather_app.units'
+UNITS_COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+VALID_UNITS = ('imperial', 'metric')
+
+def get_units(request):
+    """Helper function to get units from the preference cookie with default to imperial."""
+    units = request.get_signed_cookie(UNITS_COOKIE, default=None, salt=UNITS_COOKIE_SALT)
+    return units if units in VALID_UNITS else 'imperial'
+
+def set_units_cookie(response, units):
+    response.set_signed_cookie(
+        UNITS_COOKIE, units,
+        salt=UNITS_COOKIE_SALT,
+        max_age=UNITS_COOKIE_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax',
+    )
+    return response
+
+def get_base_context(units):
+    """Context shared by every page, independent of the current user."""
+    return {
+        'current_date': datetime.now().strftime("%A, %B %d, %Y"),
+        'units': 'F' if units == 'imperial' else 'C',
+        # Lifetime of rendered fragments, whose keys include the observation time
+        'fragment_ttl': settings.WEATHER_FRAGMENT_TTL,
+        # Long-lived update streams are only opened when served by an ASGI worker;
+        # otherwise the favorites are polled
+        'live_favorites': settings.WEATHER_ASYNC_VIEWS,
+        'favorites_poll': settings.WEATHER_FAVORITES_POLL,
+    }
+
+def build_favorite_weather(weather_by_city, units):
+    """Build the favorites sidebar entries from a city -> payload mapping."""
+    favorite_weather = []
+    for city, weather in weather_by_city.items():
+        if weather.get('cod') == 200:
+            temp = utils.format_temperature(weather['main']['temp'], units)
+            favorite_weather.append({
+                'city': city,
+                'temp': temp.split('°')[0],  # Remove unit symbol as it's added in template
+                'status': weather['weather'][0]['description'].capitalize(),
+                'icon': weather['weather'][0]['icon'],
+                'observed_at': weather['dt'],
+            })
+    return favorite_weather
+
+def build_weather_context(weather_data, units, lon, lat, weather_key):
+    """
+    Build the weather.html context for a current weather payload.
+
+    ``weather_key`` is the cache key the payload was served under; it keys
+    the rendered details fragment, so every coordinate in one location grid
+    cell shares a single fragment.
+    """
+    return {
+        'title': weather_data['name'],
+        'status': weather_data['weather'][0]['description'].capitalize(),
+        'temp': utils.format_temperature(weather_data['main']['temp'], units).split('°')[0],
+        'feels_like': utils.format_temperature(weather_data['main']['feels_like'], units).split('°')[0],
+        'humidity': weather_data['main']['humidity'],
+        'wind_speed': utils.format_wind_speed(weather_data['wind']['speed'], units),
+        'icon': weather_data['weather'][0]['icon'],
+        'observed_at': weather_data['dt'],
+        # Set when upstream is down and a saved observation is shown instead
+        'last_updated': snapshots.last_updated(weather_data),
+        'map_center': json.dumps([lon, lat]),
+        'map_zoom': 10,
+        'weather_key': weather_key,
+    }
+
+def build_forecast_context(forecast_data, units):
+    """Build the forecast.html context for a forecast payload."""
+    daily_forecasts = []
+    for day in forecast.aggregate_daily(forecast_data):
+        daily_forecasts.append({
+            'date': day['date'].strftime('%A, %B %d'),
+            'temp_min': f"{utils.convert_temperature(day['temp_min'], units):.1f}",
+            'temp_max': f"{utils.convert_temperature(day['temp_max'], units):.1f}",
+            'temp_mean': f"{utils.convert_temperature(day['temp_mean'], units):.1f}",
+            'icon': day['icon'],
+            'description': day['description'].capitalize(),
+            'humidity': day['humidity'],
+            'precipitation': utils.format_precipitation(day['precipitation'], units),
+            'wind_speed': utils.format_wind_speed(day['wind_max'], units)
+        })
+
+    # Format coordinates for JavaScript
+    lon = float(forecast_data['city']['coord']['lon'])
+    lat = float(forecast_data['city']['coord']['lat'])
+    return {
+        'city': forecast_data['city']['name'],
+        'forecasts': daily_forecasts,
+        # Forecast payloads carry no issue time; the first slot changes every 3 hours
+        'observed_at': forecast_data['list'][0]['dt'],
+        'last_updated': snapshots.last_updated(forecast_data),
+        'map_center': json.dumps([lon, lat]),
+        'map_zoom': 10
+    }
+
+def page_etag(request, city, observed_at, units, last_updated=None):
+    """
+    Validator for a weather or forecast page.
+
+    Covers the observation, the units, the page date and what differs per
+    viewer: who is logged in, whether the city is one of their favorites and
+    the favorites sidebar, i.e. which cities it lists and how recent their
+    cached observations are. Pages served from a saved snapshot carry its
+    ``last_updated`` time as well.
+    """
+    user = request.user
+    if user.is_authenticated:
+        favorites = utils.peek_observed_at_many(user.favorite_cities)
+        sidebar = ','.join(f'{name}@{observed}' for name, observed in favorites.items())
+        viewer = f'{user.pk}:{int(city in user.favorite_cities)}:{sidebar}'
+    else:
+        viewer = 'anonymous'
+    raw = ':'.join(str(part) for part in (city, observed_at, units, date.today(), viewer, last_updated))
+    return f'"{hashlib.md5(raw.encode("utf-8")).hexdigest()}"'
+
+def _page_last_modified(request, last_modified):
+    # The observation time says nothing about a signed-in viewer's sidebar,
+    # so only the ETag can validate their pages
+    return None if request.user.is_authenticated else last_modified
+
+def get_not_modified(request, etag, last_modified=None):
+    """Return a 304 response if the client's copy is current, else ``None``."""
+    # Pending flash messages must be rendered, so the page cannot be reused
+    if messages.get_messages(request):
+        return None
+    return get_conditional_response(request, etag=etag,
+                                    last_modified=_page_last_modified(request, last_modified))
+
+def patch_validators(response, request, etag, max_age, last_modified=None):
+    """Add validators and a freshness lifetime to a weather page response."""
+    if messages.get_messages(request):
+        return response
+    response['ETag'] = etag
+    last_modified = _page_last_modified(request, last_modified)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Every page embeds the visitor's own CSRF token, so shared caches must
+    # never store it; only the JSON API is public
+    patch_cache_control(response, private=True, max_age=max_age)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+def rate_limited_context(data):
+    """Context for the error page shown when the upstream call budget is spent."""
+    return {'heading': 'Weather Service Busy', 'error': data.get('message')}
+
+def mark_rate_limited(response, data):
+    """Turn an error page into a 503 telling clients when to come back."""
+    response.status_code = 503
+    response['Retry-After'] = str(data.get('retry_after', 60))
+    return response
 
 class BaseContextMixin:
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs) if hasattr(super(), 'get_context_data') else {}
-        context['current_date'] = datetime.now().strftime("%A, %B %d, %Y")
-        
-        # Get units from session
-        units = get_units_from_session(self.request)
-        context['units'] = 'F' if units == 'imperial' else 'C'
+
+        # Get units from the preference cookie
+        units = get_units(self.request)
+        context.update(get_base_context(units))
         
         if self.request.user.is_authenticated:
-            favorite_weather = []
-            for city in self.request.user.favorite_cities:
-                weather = utils.get_current_weather(city, units)
-                if weather.get('cod') == 200:
-                    temp = utils.format_temperature(weather['main']['temp'], units)
-                    favorite_weather.append({
-                        'city': city,
-                        'temp': temp.split('°')[0],  # Remove unit symbol as it's added in template
-                        'status': weather['weather'][0]['description'].capitalize(),
-                        'icon': weather['weather'][0]['icon']
-                    })
-            context['favorite_weather'] = favorite_weather
+            weather_by_city = utils.get_current_weather_many(self.request.user.favorite_cities)
+            context['favorite_weather'] = build_favorite_weather(weather_by_city, units)
         return context
 
 @method_decorator(ensure_csrf_cookie, name='dispatch')
@@ -53,14 +206,11 @@ class SetUnitsView(View):
             data = json.loads(request.body)
             units = data.get('units')
             
-            if units not in ['imperial', 'metric']:
+            if units not in VALID_UNITS:
                 return JsonResponse({'error': 'Invalid units'}, status=400)
             
-            # Store units in session
-            request.session['units'] = units
-            logger.info(f"Units set to {units} for session")
-            
-            return JsonResponse({'status': 'success'})
+            logger.info(f"Units set to {units}")
+            return set_units_cookie(JsonResponse({'status': 'success'}), units)
         except json.JSONDecodeError:
             logger.error("Invalid JSON received in SetUnitsView")
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
@@ -70,10 +220,9 @@ class SetUnitsView(View):
 
     def get(self, request):
         units = request.GET.get('units')
-        if units in ['imperial', 'metric']:
-            request.session['units'] = units
-            logger.info(f"Units set to {units} for session")
-            return redirect(request.META.get('HTTP_REFERER', 'index'))
+        if units in VALID_UNITS:
+            logger.info(f"Units set to {units}")
+            return set_units_cookie(redirect(request.META.get('HTTP_REFERER', 'index')), units)
         return JsonResponse({'error': 'Invalid units'}, status=400)
 
 class IndexView(BaseContextMixin, TemplateView):
@@ -186,8 +335,6 @@ class RegisterView(BaseContextMixin, View):
                     username=username,
                     password=password
                 )
-                user.favorite_cities = []
-                user.save()
 
             messages.success(request, 'Registration successful! Please login.')
             return redirect('login')
@@ -213,7 +360,7 @@ class CustomLogoutView(View):
 class WeatherView(BaseContextMixin, View):
     def get(self, request):
         city = request.GET.get('city', '').strip()
-        units = get_units_from_session(request)
+        units = get_units(request)
 
         if not city:
             return render(request, 'index.html', self.get_context_data())
@@ -221,7 +368,12 @@ class WeatherView(BaseContextMixin, View):
         try:
             # Clean city name
             city = utils.sanitize_city_name(city)
-            weather_data = utils.get_current_weather(city, units)
+            weather_data = utils.get_current_weather(city)
+
+            if utils.is_rate_limited(weather_data):
+                context = self.get_context_data()
+                context.update(rate_limited_context(weather_data))
+                return mark_rate_limited(render(request, 'city-not-found.html', context), weather_data)
 
             if weather_data.get('cod') != 200:
                 # Get city suggestions
@@ -233,23 +385,20 @@ class WeatherView(BaseContextMixin, View):
                 })
                 return render(request, 'city-not-found.html', context)
 
-            context = self.get_context_data()
-            # Format coordinates for JavaScript
-            lon = float(weather_data['coord']['lon'])
-            lat = float(weather_data['coord']['lat'])
-            
-            context.update({
-                'title': weather_data['name'],
-                'status': weather_data['weather'][0]['description'].capitalize(),
-                'temp': utils.format_temperature(weather_data['main']['temp'], units).split('°')[0],
-                'feels_like': utils.format_temperature(weather_data['main']['feels_like'], units).split('°')[0],
-                'humidity': weather_data['main']['humidity'],
-                'wind_speed': f"{weather_data['wind']['speed']:.1f}",
-                'icon': weather_data['weather'][0]['icon'],
-                'map_center': json.dumps([lon, lat]),
-                'map_zoom': 10
-            })
-            return render(request, 'weather.html', context)
+            etag = page_etag(request, weather_data['name'], weather_data['dt'], units,
+                             weather_data.get('last_updated'))
+            not_modified = get_not_modified(request, etag, weather_data['dt'])
+            if not_modified is None:
+                context = self.get_context_data()
+                # Format coordinates for JavaScript
+                lon = float(weather_data['coord']['lon'])
+                lat = float(weather_data['coord']['lat'])
+                context.update(build_weather_context(weather_data, units, lon, lat,
+                                                     caching.make_key('current', city)))
+                response = render(request, 'weather.html', context)
+            else:
+                response = not_modified
+            return patch_validators(response, request, etag, utils.expires_in('current', city), weather_data['dt'])
         except Exception as e:
             logger.error(f"Weather error: {str(e)}")
             messages.error(request, 'Error getting weather data. Please try again.')
@@ -264,33 +413,38 @@ class LocationWeatherView(BaseContextMixin, View):
     def get(self, request):
         lat = request.GET.get('lat')
         lon = request.GET.get('lon')
-        units = get_units_from_session(request)
+        units = get_units(request)
 
         if not lat or not lon:
             messages.error(request, 'Location data is required')
             return render(request, 'index.html', self.get_context_data())
 
         try:
-            weather_data = utils.get_location_weather(lat, lon, units)
+            weather_data = utils.get_location_weather(lat, lon)
+
+            if utils.is_rate_limited(weather_data):
+                context = self.get_context_data()
+                context.update(rate_limited_context(weather_data))
+                return mark_rate_limited(render(request, 'city-not-found.html', context), weather_data)
 
             if weather_data.get('cod') != 200:
                 messages.error(request, 'Could not get weather for your location')
                 return render(request, 'city-not-found.html',
                             self.get_context_data(error='Could not get weather for your location'))
 
-            context = self.get_context_data()
-            context.update({
-                'title': weather_data['name'],
-                'status': weather_data['weather'][0]['description'].capitalize(),
-                'temp': utils.format_temperature(weather_data['main']['temp'], units).split('°')[0],
-                'feels_like': utils.format_temperature(weather_data['main']['feels_like'], units).split('°')[0],
-                'humidity': weather_data['main']['humidity'],
-                'wind_speed': f"{weather_data['wind']['speed']:.1f}",
-                'icon': weather_data['weather'][0]['icon'],
-                'map_center': json.dumps([float(lon), float(lat)]),
-                'map_zoom': 10
-            })
-            return render(request, 'weather.html', context)
+            etag = page_etag(request, weather_data['name'], weather_data['dt'], units,
+                             weather_data.get('last_updated'))
+            not_modified = get_not_modified(request, etag, weather_data['dt'])
+            if not_modified is None:
+                context = self.get_context_data()
+                context.update(build_weather_context(
+                    weather_data, units, float(lon), float(lat),
+                    caching.make_key('location', utils.location_cell(lat, lon))))
+                response = render(request, 'weather.html', context)
+            else:
+                response = not_modified
+            max_age = utils.expires_in('location', utils.location_cell(lat, lon))
+            return patch_validators(response, request, etag, max_age, weather_data['dt'])
         except Exception as e:
             logger.error(f"Location weather error: {str(e)}")
             messages.error(request, 'Error getting weather data. Please try again.')
@@ -300,7 +454,7 @@ class LocationWeatherView(BaseContextMixin, View):
 class ForecastView(BaseContextMixin, View):
     def get(self, request):
         city = request.GET.get('city', '').strip()
-        units = get_units_from_session(request)
+        units = get_units(request)
 
         if not city:
             messages.error(request, 'Please enter a city name')
@@ -309,7 +463,12 @@ class ForecastView(BaseContextMixin, View):
         try:
             # Clean city name
             city = utils.sanitize_city_name(city)
-            forecast_data = utils.get_forecast(city, units)
+            forecast_data = utils.get_forecast(city)
+
+            if utils.is_rate_limited(forecast_data):
+                context = self.get_context_data()
+                context.update(rate_limited_context(forecast_data))
+                return mark_rate_limited(render(request, 'city-not-found.html', context), forecast_data)
 
             if forecast_data.get('cod') != "200":
                 # Get city suggestions
@@ -321,38 +480,17 @@ class ForecastView(BaseContextMixin, View):
                 })
                 return render(request, 'city-not-found.html', context)
 
-            # Group forecast data by day
-            daily_forecasts = {}
-            for item in forecast_data['list']:
-                date = datetime.fromtimestamp(item['dt']).strftime('%Y-%m-%d')
-                if date not in daily_forecasts:
-                    daily_forecasts[date] = {
-                        'date': datetime.fromtimestamp(item['dt']).strftime('%A, %B %d'),
-                        'temp_min': float('inf'),
-                        'temp_max': float('-inf'),
-                        'icon': item['weather'][0]['icon'],
-                        'description': item['weather'][0]['description'].capitalize(),
-                        'humidity': item['main']['humidity'],
-                        'wind_speed': item['wind']['speed']
-                    }
-                
-                daily_forecasts[date]['temp_min'] = min(daily_forecasts[date]['temp_min'], 
-                                                       float(utils.format_temperature(item['main']['temp_min'], units).split('°')[0]))
-                daily_forecasts[date]['temp_max'] = max(daily_forecasts[date]['temp_max'], 
-                                                       float(utils.format_temperature(item['main']['temp_max'], units).split('°')[0]))
-
-            context = self.get_context_data()
-            # Format coordinates for JavaScript
-            lon = float(forecast_data['city']['coord']['lon'])
-            lat = float(forecast_data['city']['coord']['lat'])
-            
-            context.update({
-                'city': forecast_data['city']['name'],
-                'forecasts': list(daily_forecasts.values()),
-                'map_center': json.dumps([lon, lat]),
-                'map_zoom': 10
-            })
-            return render(request, 'forecast.html', context)
+            # Forecast slots lie in the future, so only an ETag is sent
+            etag = page_etag(request, forecast_data['city']['name'], forecast_data['list'][0]['dt'], units,
+                             forecast_data.get('last_updated'))
+            not_modified = get_not_modified(request, etag)
+            if not_modified is None:
+                context = self.get_context_data()
+                context.update(build_forecast_context(forecast_data, units))
+                response = render(request, 'forecast.html', context)
+            else:
+                response = not_modified
+            return patch_validators(response, request, etag, utils.expires_in('forecast', city))
         except Exception as e:
             logger.error(f"Forecast error: {str(e)}")
             messages.error(request, 'Error getting forecast data. Please try again.')
@@ -363,21 +501,160 @@ class ForecastView(BaseContextMixin, View):
             })
             return render(request, 'city-not-found.html', context)
 
+@method_decorator(cache_control(public=True, max_age=86400), name='dispatch')
+class CityAutocompleteView(View):
+    """
+    City name completions served from the local gazetteer. A name of three
+    or more letters it does not know is looked up with OpenWeather instead.
+    """
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        try:
+            limit = int(request.GET.get('limit', 5))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid limit'}, status=400)
+
+        limit = max(limit, 1)
+        results = [
+            {'name': city.name, 'country': city.country, 'lat': city.lat, 'lon': city.lon}
+            for city in gazetteer.get_gazetteer().complete(query, limit=limit)
+        ]
+        if not results and len(gazetteer.fold(query)) >= 3:
+            results = utils.search_places(query)[:min(limit, gazetteer.MAX_COMPLETIONS)]
+        return JsonResponse({'results': results})
+
+class TileProxyView(View):
+    """
+    Serves OpenWeather map overlay tiles through the local tile cache.
+
+    An expired tile is refetched, but served as it is if upstream fails or
+    the tile budget is spent, since an old overlay beats a missing one.
+    """
+
+    def get(self, request, layer, z, x, y):
+        if layer not in tiles.LAYERS or z > tiles.MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            raise Http404('Unknown tile')
+
+        tile_cache = tiles.get_tile_cache()
+        content = None
+        cached = tile_cache.lookup(layer, z, x, y)
+        if cached is None:
+            content = tiles.fetch_tile(layer, z, x, y)
+            if content is not None:
+                cached = tile_cache.store(layer, z, x, y, content)
+            else:
+                cached = tile_cache.peek(layer, z, x, y)
+                if cached is None:
+                    return HttpResponse(status=502)
+
+        path, stat = cached
+        etag = tiles.etag_for(stat)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            if content is None:
+                try:
+                    content = path.read_bytes()
+                except FileNotFoundError:
+                    # Evicted by another worker since the lookup
+                    content = tiles.fetch_tile(layer, z, x, y)
+                    if content is None:
+                        return HttpResponse(status=502)
+            response = HttpResponse(content, content_type='image/png')
+
+        response['ETag'] = etag
+        max_age = max(0, int(tile_cache.ttl - (time.time() - stat.st_mtime)))
+        patch_cache_control(response, public=True, max_age=max_age)
+        return response
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ToggleFavoriteView(LoginRequiredMixin, View):
     def post(self, request):
         try:
             data = json.loads(request.body)
-            city = data.get('city')
-            
+            city = data.get('city') if isinstance(data, dict) else None
+            city = ' '.join(city.split()) if isinstance(city, str) else ''
+
             if not city:
                 return JsonResponse({'error': 'City name is required'}, status=400)
+            max_length = City._meta.get_field('name').max_length
+            # Lowercasing can lengthen some names, and both forms are stored
+            if max(len(city), len(normalize_city_name(city))) > max_length:
+                return JsonResponse({'error': f'City name must be at most {max_length} characters'}, status=400)
 
-            if city in request.user.favorite_cities:
-                request.user.remove_favorite_city(city)
-                return JsonResponse({'status': 'removed'})
-            else:
-                request.user.add_favorite_city(city)
+            if request.user.toggle_favorite_city(city):
                 return JsonResponse({'status': 'added'})
+            return JsonResponse({'status': 'removed'})
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+@method_decorator(never_cache, name='dispatch')
+class FavoritesUpdatesView(View):
+    """
+    Cached weather for the user's favorite cities, polled by the index page
+    when the live stream is not served. Never calls upstream.
+    """
+
+    def get(self, request):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        weather_by_city = utils.peek_current_weather_many(request.user.favorite_cities)
+        return JsonResponse({'updates': build_favorite_weather(weather_by_city, get_units(request))})
+
+class MetricsView(View):
+    """Prometheus metrics for every worker process, in text format."""
+
+    def get(self, request):
+        token = settings.WEATHER_METRICS_TOKEN
+        if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+        body, content_type = metrics.render_latest()
+        return HttpResponse(body, content_type=content_type)
+
+@method_decorator(never_cache, name='dispatch')
+class ReadinessView(View):
+    """
+    Readiness probe: 200 once this worker has warmed up and can reach the
+    database and the shared cache, 503 with the failing checks otherwise.
+    A worker that no server hook warmed up starts its warm-up on the first
+    probe.
+
+    Never calls upstream. The result is reused for ``WEATHER_READINESS_TTL``
+    seconds, and both checks are bounded by the connection timeouts set for
+    the database and Redis in the settings.
+    """
+
+    # (checked at, response body, status) of this worker's last check
+    last_result = None
+
+    def get(self, request):
+        result = ReadinessView.last_result
+        if result is None or time.monotonic() - result[0] >= settings.WEATHER_READINESS_TTL:
+            result = ReadinessView.last_result = (time.monotonic(), *self.check())
+        _, body, status = result
+        return JsonResponse(body, status=status)
+
+    def check(self):
+        checks = {}
+        if warmup.is_warm():
+            checks['warmup'] = 'ok'
+        else:
+            warmup.warm_up_in_background()
+            checks['warmup'] = 'pending'
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            checks['database'] = 'ok'
+        except DatabaseError as e:
+            logger.error(f"Readiness database check failed: {str(e)}")
+            checks['database'] = 'unavailable'
+        try:
+            caching.get_cache().get('weather:readyz')
+            checks['cache'] = 'ok'
+        except Exception as e:
+            logger.error(f"Readiness cache check failed: {str(e)}")
+            checks['cache'] = 'unavailable'
+
+        ready = all(status == 'ok' for status in checks.values())
+        return {'status': 'ready' if ready else 'unavailable', 'checks': checks}, 200 if ready else 503
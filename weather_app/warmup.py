@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template import engines
+from django.template.loader import get_template
+from django.urls import get_resolver, reverse
+from . import gazetteer
+
+logger = logging.getLogger(__name__)
+
+# Set once warm-up has finished in this process; inherited by forked workers
+_done = threading.Event()
+_started = False
+_started_lock = threading.Lock()
+
+def template_names():
+    """Names of the templates in the project's template directories."""
+    names = set()
+    for engine in engines.all():
+        for directory in engine.dirs:
+            root = Path(directory)
+            names.update(str(path.relative_to(root)) for path in root.rglob('*.html'))
+    return sorted(names)
+
+def warm_up():
+    """
+    Do the first-request work ahead of time so a new worker serves quickly.
+
+    Resolves the URLconf, compiles every project template into the cached
+    template loader, loads the gazetteer and the static files manifest.
+    Called once in the gunicorn arbiter before workers are forked, so every
+    worker inherits the result. Touches neither the database nor the cache,
+    whose connections must not be shared between processes.
+    """
+    global _started
+    with _started_lock:
+        _started = True
+    started = time.monotonic()
+
+    get_resolver().url_patterns
+    reverse('index')  # Builds the reverse lookup tables
+
+    for name in template_names():
+        try:
+            get_template(name)
+        except Exception as err:
+            logger.error(f'Could not compile template {name}: {err}')
+
+    gazetteer.get_gazetteer()
+
+    try:
+        # Loads the manifest written by collectstatic
+        staticfiles_storage.url('styles/style.css')
+    except ValueError as err:
+        logger.warning(f'Static files manifest not loaded: {err}')
+
+    _done.set()
+    logger.info(f'Warm-up finished in {time.monotonic() - started:.2f}s')
+
+def is_warm():
+    """Return True once ``warm_up`` has finished in this process."""
+    return _done.is_set()
+
+def warm_up_in_background():
+    """
+    Start ``warm_up`` on a thread unless it has already been started.
+
+    Lets the readiness probe warm up processes whose server has no startup
+    hook for it, e.g. ``runserver``.
+    """
+    global _started
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
@@ -2,6 +2,8 @@
 ASGI config for weather_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with an ASGI server, e.g.
+``gunicorn weather_project.asgi:application -k uvicorn.workers.UvicornWorker``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -12,5 +14,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_project.settings")
+# Use the non-blocking weather views unless explicitly disabled
+os.environ.setdefault("WEATHER_ASYNC_VIEWS", "True")
 
 application = get_asgi_application()
@@ -29,6 +29,8 @@ if not DEBUG:
     CSRF_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SECURE = True
     SECURE_SSL_REDIRECT = True
+    # Load balancer health checks call the readiness probe over plain HTTP
+    SECURE_REDIRECT_EXEMPT = [r'^readyz$']
     SECURE_HSTS_SECONDS = 31536000  # 1 year
     SECURE_HSTS_INCLUDE_SUBDOMAINS = True
     SECURE_HSTS_PRELOAD = True
@@ -50,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so request timings include the rest of the middleware
+    'weather_app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -73,7 +77,6 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'weather_app.context_processors.weather_settings',
             ],
         },
     },
@@ -92,6 +95,10 @@ DATABASES = {
         'PASSWORD': os.getenv('PGPASSWORD', ''),
         'HOST': os.getenv('PGHOST', 'localhost'),
         'PORT': os.getenv('PGPORT', '5432'),
+        'OPTIONS': {
+            # Fail fast instead of hanging a worker (and the readiness probe)
+            'connect_timeout': int(os.getenv('PGCONNECT_TIMEOUT', '5')),
+        },
     }
 }
 
@@ -134,8 +141,14 @@ AUTHENTICATION_BACKENDS = [
     'weather_app.auth.EmailBackend',
 ]
 
+# How long an authenticated user is cached between requests (seconds).
+# Saving a user invalidates its cached copy in every worker, which needs the
+# shared Redis cache; with the per-process default the user is not cached.
+WEATHER_USER_CACHE_TTL = int(os.getenv('WEATHER_USER_CACHE_TTL', '300' if os.getenv('REDIS_URL') else '0'))
+
 # Messages
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+# Cookie first so flashing a message to an anonymous visitor does not create a session row
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
 
 # Internationalization
 LANGUAGE_CODE = 'en-us'
@@ -159,6 +172,135 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Weather API Key
 WEATHER_API_KEY = os.getenv('API_KEY')
 
+# OpenWeather endpoints; point these at benchmarks/fake_openweather.py to
+# run without the real service
+OPENWEATHER_BASE_URL = os.getenv('OPENWEATHER_BASE_URL', 'http://api.openweathermap.org/data/2.5').rstrip('/')
+OPENWEATHER_GEO_URL = os.getenv('OPENWEATHER_GEO_URL', 'http://api.openweathermap.org/geo/1.0').rstrip('/')
+OPENWEATHER_TILE_URL = os.getenv('OPENWEATHER_TILE_URL', 'https://tile.openweathermap.org/map').rstrip('/')
+
+# Cache
+# Use Redis when REDIS_URL is set so all workers share one cache
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'OPTIONS': {
+                # Seconds before an unreachable Redis raises instead of blocking
+                'socket_connect_timeout': float(os.getenv('REDIS_TIMEOUT', '2')),
+                'socket_timeout': float(os.getenv('REDIS_TIMEOUT', '2')),
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'weather-app',
+        }
+    }
+
+# Upstream weather caching (seconds)
+WEATHER_CACHE_ALIAS = 'default'
+WEATHER_CURRENT_TTL = int(os.getenv('WEATHER_CURRENT_TTL', '600'))
+WEATHER_FORECAST_TTL = int(os.getenv('WEATHER_FORECAST_TTL', '1800'))
+# How long an expired entry may still be served while it is refreshed
+WEATHER_STALE_TTL = int(os.getenv('WEATHER_STALE_TTL', '300'))
+# Longest a request waits on another request's in-flight fetch of the same key
+WEATHER_LOCK_TIMEOUT = int(os.getenv('WEATHER_LOCK_TIMEOUT', '15'))
+# Oldest last-known-good snapshot served when OpenWeather fails (0: no limit);
+# older ones are deleted with the observation history rollups (see below)
+WEATHER_SNAPSHOT_MAX_AGE = int(os.getenv('WEATHER_SNAPSHOT_MAX_AGE', '86400'))
+
+# How long rendered weather, forecast and favorites fragments are reused.
+# Fragments are keyed on the observation time, so new data is never hidden.
+WEATHER_FRAGMENT_TTL = int(os.getenv('WEATHER_FRAGMENT_TTL', '600'))
+
+# Location lookups are snapped to a grid of this many degrees (0.05 is about
+# 5 km) so nearby users share a cache entry. A cell with no entry yet reuses a
+# fresh city observation within WEATHER_LOCATION_NEARBY_KM (0 disables) of its
+# center, looked up in a per-process index of up to WEATHER_LOCATION_INDEX_SIZE cities.
+WEATHER_LOCATION_GRID = float(os.getenv('WEATHER_LOCATION_GRID', '0.05'))
+WEATHER_LOCATION_NEARBY_KM = float(os.getenv('WEATHER_LOCATION_NEARBY_KM', '8'))
+WEATHER_LOCATION_INDEX_SIZE = int(os.getenv('WEATHER_LOCATION_INDEX_SIZE', '5000'))
+
+# Maximum concurrent upstream lookups when fetching several cities at once
+WEATHER_FETCH_WORKERS = int(os.getenv('WEATHER_FETCH_WORKERS', '8'))
+
+# Most cities accepted by one /api/weather/batch/ request
+WEATHER_API_BATCH_MAX = int(os.getenv('WEATHER_API_BATCH_MAX', '50'))
+
+# Favorite cities refresher (manage.py refresh_favorites): seconds between
+# passes, random per-city start delay, and concurrent upstream calls. It
+# needs the Redis cache (REDIS_URL) shared with the web workers.
+WEATHER_REFRESH_INTERVAL = int(os.getenv('WEATHER_REFRESH_INTERVAL', '480'))
+WEATHER_REFRESH_JITTER = int(os.getenv('WEATHER_REFRESH_JITTER', '60'))
+WEATHER_REFRESH_CONCURRENCY = int(os.getenv('WEATHER_REFRESH_CONCURRENCY', '4'))
+
+# Serve weather pages from async views (enabled by weather_project.asgi)
+WEATHER_ASYNC_VIEWS = os.getenv('WEATHER_ASYNC_VIEWS', 'False') == 'True'
+
+# Live favorites stream (/favorites/stream/): seconds between cache checks,
+# and how long one connection stays open before the browser reconnects
+WEATHER_STREAM_POLL = int(os.getenv('WEATHER_STREAM_POLL', '15'))
+WEATHER_STREAM_DURATION = int(os.getenv('WEATHER_STREAM_DURATION', '300'))
+# The stream is only served with WEATHER_ASYNC_VIEWS; otherwise the index page
+# polls /favorites/updates/ every this many seconds (0 disables)
+WEATHER_FAVORITES_POLL = int(os.getenv('WEATHER_FAVORITES_POLL', '60'))
+
+# Observation history: buffered writes of fresh observations, and how long
+# raw rows and hourly rollups are kept. Web workers roll up and prune every
+# WEATHER_HISTORY_ROLLUP_INTERVAL seconds after writing observations; set it
+# to 0 to run manage.py rollup_observations from cron instead.
+# Observations still buffered when a worker is killed are not recorded.
+WEATHER_HISTORY_ENABLED = os.getenv('WEATHER_HISTORY_ENABLED', 'True') == 'True'
+WEATHER_HISTORY_BATCH_SIZE = int(os.getenv('WEATHER_HISTORY_BATCH_SIZE', '100'))
+WEATHER_HISTORY_FLUSH_INTERVAL = int(os.getenv('WEATHER_HISTORY_FLUSH_INTERVAL', '60'))
+WEATHER_HISTORY_RAW_DAYS = int(os.getenv('WEATHER_HISTORY_RAW_DAYS', '7'))
+WEATHER_HISTORY_HOURLY_DAYS = int(os.getenv('WEATHER_HISTORY_HOURLY_DAYS', '90'))
+WEATHER_HISTORY_ROLLUP_INTERVAL = int(os.getenv('WEATHER_HISTORY_ROLLUP_INTERVAL', '3600'))
+
+# Offline city list used for suggestions (rebuild with `manage.py build_gazetteer`).
+# The bundled list only has major cities; names it does not know are looked up
+# with OpenWeather's geocoding API and cached for WEATHER_GEO_TTL seconds.
+WEATHER_GAZETTEER_PATH = os.getenv('WEATHER_GAZETTEER_PATH', os.path.join(BASE_DIR, 'weather_app', 'data', 'cities.tsv'))
+WEATHER_GEO_TTL = int(os.getenv('WEATHER_GEO_TTL', '86400'))
+
+# Map tile proxy cache
+WEATHER_TILE_CACHE_DIR = os.getenv('WEATHER_TILE_CACHE_DIR', os.path.join(BASE_DIR, 'tile_cache'))
+WEATHER_TILE_CACHE_MAX_BYTES = int(os.getenv('WEATHER_TILE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+WEATHER_TILE_TTL = int(os.getenv('WEATHER_TILE_TTL', '600'))
+
+# Upstream HTTP client
+WEATHER_UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('WEATHER_UPSTREAM_CONNECT_TIMEOUT', '3.05'))
+WEATHER_UPSTREAM_READ_TIMEOUT = float(os.getenv('WEATHER_UPSTREAM_READ_TIMEOUT', '10'))
+WEATHER_UPSTREAM_RETRIES = int(os.getenv('WEATHER_UPSTREAM_RETRIES', '2'))
+# Longest one upstream call may take, retries included; keep it under the
+# gunicorn worker timeout (30s in gunicorn.conf.py)
+WEATHER_UPSTREAM_DEADLINE = float(os.getenv('WEATHER_UPSTREAM_DEADLINE', '20'))
+WEATHER_UPSTREAM_BACKOFF = float(os.getenv('WEATHER_UPSTREAM_BACKOFF', '0.3'))
+WEATHER_UPSTREAM_POOL_SIZE = int(os.getenv('WEATHER_UPSTREAM_POOL_SIZE', '20'))
+# Consecutive failures before the breaker opens, and seconds it stays open
+WEATHER_UPSTREAM_BREAKER_THRESHOLD = int(os.getenv('WEATHER_UPSTREAM_BREAKER_THRESHOLD', '5'))
+WEATHER_UPSTREAM_BREAKER_RESET = int(os.getenv('WEATHER_UPSTREAM_BREAKER_RESET', '30'))
+# Upstream calls allowed per clock-aligned window across all workers (0 disables).
+# Keep it a little under the plan's limit; background refreshes may use 70% of
+# it and map tiles 50%, so the rest is kept for interactive requests.
+# The budget is only shared across workers through the Redis cache (REDIS_URL).
+# Without it each worker counts on its own and gets an equal slice of the
+# budget, based on the worker count in WEB_CONCURRENCY.
+WEATHER_UPSTREAM_BUDGET = int(os.getenv('WEATHER_UPSTREAM_BUDGET', '55'))
+WEATHER_UPSTREAM_BUDGET_WINDOW = int(os.getenv('WEATHER_UPSTREAM_BUDGET_WINDOW', '60'))
+WEATHER_WORKER_PROCESSES = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+
+# Seconds each worker reuses its /readyz result, so frequent probes do not
+# query the database and cache every time
+WEATHER_READINESS_TTL = int(os.getenv('WEATHER_READINESS_TTL', '5'))
+
+# Bearer token required to read /metrics; leave unset to expose it openly
+# (e.g. when only reachable from the private network)
+WEATHER_METRICS_TOKEN = os.getenv('WEATHER_METRICS_TOKEN')
+
 # CSRF Settings
 CSRF_COOKIE_NAME = 'csrftoken'
 CSRF_HEADER_NAME = 'HTTP_X_CSRFTOKEN'